@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from .models import Coupon, CustomUser
 
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
@@ -21,4 +21,12 @@ class CustomUserAdmin(UserAdmin):
     search_fields = ('email', 'first_name', 'last_name')
     ordering = ('email',)
 
-admin.site.register(CustomUser, CustomUserAdmin)
\ No newline at end of file
+admin.site.register(CustomUser, CustomUserAdmin)
+
+
+@admin.register(Coupon)
+class CouponAdmin(admin.ModelAdmin):
+    list_display = ('code', 'discount_type', 'discount_value', 'min_order', 'times_used', 'usage_limit', 'valid_until', 'is_active')
+    list_filter = ('is_active', 'discount_type')
+    search_fields = ('code', 'description')
+    readonly_fields = ('times_used',)
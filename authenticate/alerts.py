@@ -0,0 +1,171 @@
+"""Price-drop and back-in-stock emails: fanning ProductEvent rows out to the shoppers watching each product."""
+import logging
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from customeradmin.models import Product, ProductEvent
+from .models import CartItem, WishlistItem
+
+logger = logging.getLogger(__name__)
+
+
+def claim_events(limit):
+    """
+    Take up to `limit` pending events, oldest first, and mark them processed.
+
+    Concurrent workers skip each other's locked rows. Events are marked before
+    their emails go out, so a crash mid-run drops alerts rather than repeating them.
+    """
+    with transaction.atomic():
+        events = list(
+            ProductEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+            .order_by('id')
+            .values_list('pk', 'product_id', 'kind', 'old_price')[:limit]
+        )
+        if events:
+            ProductEvent.objects.filter(pk__in=[pk for pk, *_ in events]).update(processed_at=timezone.now())
+    return events
+
+
+def coalesce_events(events):
+    """
+    One (kind, old_price) per product: the price before its first event, and a
+    restock outranks a price drop
+    """
+    changes = {}
+    for _, product_id, kind, old_price in events:
+        first = changes.get(product_id)
+        if first is None:
+            changes[product_id] = (kind, old_price)
+        elif kind == ProductEvent.BACK_IN_STOCK:
+            changes[product_id] = (kind, first[1])
+    return changes
+
+
+def current_alerts(changes):
+    """
+    {product_id: (kind, name, old_price, price)} for the changed products that
+    are still purchasable, priced as they are now. Price drops that have since
+    been reversed are dropped.
+    """
+    products = (
+        Product.customer_visible.filter(pk__in=list(changes), stock_quantity__gt=0)
+        .values_list('pk', 'name', 'effective_price')
+    )
+    alerts = {}
+    for pk, name, price in products:
+        kind, old_price = changes[pk]
+        if kind == ProductEvent.PRICE_DROP and (old_price is None or price >= old_price):
+            continue
+        alerts[pk] = (kind, name, old_price, price)
+    return alerts
+
+
+def watchers(product_ids):
+    """
+    (user_id, email, product_id) for every active shopper with one of the
+    products in their wishlist or cart, ordered by user so each shopper's rows
+    arrive together
+    """
+    wished = (
+        WishlistItem.objects.filter(
+            product_id__in=product_ids, wishlist__user__is_active=True, wishlist__user__is_blocked=False
+        )
+        .annotate(shopper_id=F('wishlist__user_id'), shopper_email=F('wishlist__user__email'))
+        .values_list('shopper_id', 'shopper_email', 'product_id')
+        .order_by()
+    )
+    carted = (
+        CartItem.objects.filter(
+            product_id__in=product_ids, cart__user__is_active=True, cart__user__is_blocked=False
+        )
+        .annotate(shopper_id=F('cart__user_id'), shopper_email=F('cart__user__email'))
+        .values_list('shopper_id', 'shopper_email', 'product_id')
+        .order_by()
+    )
+    return wished.union(carted).order_by('shopper_id', 'product_id')
+
+
+def alert_message(email, alerts):
+    """One email covering every alert for a shopper"""
+    lines = []
+    for kind, name, old_price, price in alerts:
+        if kind == ProductEvent.BACK_IN_STOCK:
+            lines.append(f"- {name} is back in stock at ₹{price}")
+        else:
+            lines.append(f"- {name} is now ₹{price} (was ₹{old_price})")
+    if len(alerts) == 1:
+        kind, name, _, _ = alerts[0]
+        subject = f"Sit Well – {name} is back in stock" if kind == ProductEvent.BACK_IN_STOCK else f"Sit Well – Price drop on {name}"
+    else:
+        subject = "Sit Well – Updates on items you saved"
+    body = "Hi,\nGood news about items in your wishlist or cart:\n\n" + "\n".join(lines) + "\n\nRegards,\nSit Well"
+    return EmailMessage(subject, body, settings.DEFAULT_FROM_EMAIL, [email])
+
+
+class AlertDispatcher:
+    """
+    Fans batches of ProductEvent rows out to shoppers.
+
+    A batch is coalesced per product and checked against current stock and
+    prices in one query. Watchers are then streamed from the database in
+    chunks, ordered by user, so each shopper gets one email covering all of
+    their products and a product watched by 100k users never has them all in
+    memory. Emails go out over one reused SMTP connection in groups.
+    """
+
+    def __init__(self, chunk_size=2000, send_batch=100):
+        self.chunk_size = chunk_size
+        self.send_batch = send_batch
+        self.events = 0
+        self.products = 0
+        self.sent = 0
+        self.failed = 0
+
+    def run(self, batch_size=1000):
+        # One SMTP session for the whole run, opened on the first send
+        connection = get_connection()
+        try:
+            while True:
+                events = claim_events(batch_size)
+                if not events:
+                    break
+                self.events += len(events)
+                self.dispatch(events, connection)
+        finally:
+            connection.close()
+
+    def dispatch(self, events, connection):
+        alerts = current_alerts(coalesce_events(events))
+        if not alerts:
+            return
+        self.products += len(alerts)
+
+        outbox = []
+        rows = watchers(list(alerts)).iterator(chunk_size=self.chunk_size)
+        for (_, email), group in groupby(rows, key=itemgetter(0, 1)):
+            outbox.append(alert_message(email, [alerts[product_id] for _, _, product_id in group]))
+            if len(outbox) >= self.send_batch:
+                self.send(outbox, connection)
+                outbox = []
+        if outbox:
+            self.send(outbox, connection)
+
+    def send(self, messages, connection):
+        try:
+            connection.open()
+            sent = connection.send_messages(messages) or 0
+        except Exception as e:
+            logger.error(f"Error sending product alerts: {str(e)}")
+            # Drop the broken SMTP session; the next group reconnects
+            connection.close()
+            sent = 0
+        self.sent += sent
+        self.failed += len(messages) - sent
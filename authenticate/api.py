@@ -0,0 +1,232 @@
+"""
+Read-only JSON catalog API: products with sparse fieldsets and cursor
+pagination, batch lookups by id, and categories. Rows are serialised
+straight from values(), without building model instances.
+"""
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db.models import OuterRef, Q, Subquery
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_GET
+
+from customeradmin.models import Product, ProductImage, category_facets
+
+
+# Public field name -> ORM lookup. main_image is an annotation and is only
+# joined in when asked for.
+PRODUCT_FIELDS = {
+    'id': 'pk',
+    'name': 'name',
+    'sku': 'sku',
+    'category': 'category__slug',
+    'brand': 'brand',
+    'short_description': 'short_description',
+    'price': 'price',
+    'effective_price': 'effective_price',
+    'final_price': 'final_price',
+    'discount_type': 'discount_type',
+    'discount_value': 'discount_value',
+    'stock_quantity': 'stock_quantity',
+    'status': 'status',
+    'popularity': 'popularity',
+    'created_at': 'created_at',
+    'main_image': 'main_image',
+}
+
+DEFAULT_FIELDS = ('id', 'name', 'category', 'brand', 'price', 'effective_price', 'main_image')
+
+# Sort name -> (field, descending); ties are broken by pk in the same direction
+SORTS = {
+    'newest': ('created_at', True),
+    'price_low': ('effective_price', False),
+    'price_high': ('effective_price', True),
+    'popularity': ('popularity', True),
+    'name': ('name', False),
+}
+
+PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+MAX_BATCH_IDS = 100
+
+# Catalog responses may be cached by browsers and shared caches for this long
+CACHE_SECONDS = 60
+
+
+class ApiError(ValueError):
+    pass
+
+
+def parse_fields(raw):
+    """The requested public field names, in order; raises ApiError for unknown ones"""
+    if not raw:
+        return list(DEFAULT_FIELDS)
+    fields = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in PRODUCT_FIELDS]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def parse_int(raw, name, default, maximum):
+    if raw in (None, ''):
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ApiError(f"{name} must be an integer")
+    if not 1 <= value <= maximum:
+        raise ApiError(f"{name} must be between 1 and {maximum}")
+    return value
+
+
+def encode_cursor(sort, value, pk):
+    payload = json.dumps([sort, value, pk], default=str).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def decode_cursor(raw, sort):
+    """(value, pk) to resume after, converted to the types of the sort field and pk"""
+    try:
+        cursor_sort, value, pk = json.loads(base64.urlsafe_b64decode(raw.encode()))
+    except (ValueError, TypeError):
+        raise ApiError("Invalid cursor")
+    if cursor_sort != sort:
+        raise ApiError("Cursor belongs to a different sort")
+    field, _ = SORTS[sort]
+    try:
+        value = Product._meta.get_field(field).to_python(value)
+        pk = Product._meta.pk.to_python(pk)
+    except (ValidationError, ValueError, TypeError):
+        raise ApiError("Invalid cursor")
+    if value is None or pk is None:
+        raise ApiError("Invalid cursor")
+    return value, pk
+
+
+def product_rows(queryset, fields, extra=()):
+    """
+    values() rows for the requested public fields (plus any `extra` lookups
+    used internally), with main_image turned into a URL
+    """
+    if 'main_image' in fields:
+        queryset = queryset.annotate(main_image=Subquery(
+            ProductImage.objects.filter(product=OuterRef('pk'))
+            .order_by('-is_primary', 'order', 'created_at')
+            .values('image')[:1]
+        ))
+    lookups = list(dict.fromkeys([PRODUCT_FIELDS[name] for name in fields] + list(extra)))
+    rows = list(queryset.values(*lookups))
+    if 'main_image' in fields:
+        storage = ProductImage._meta.get_field('image').storage
+        for row in rows:
+            row['main_image'] = storage.url(row['main_image']) if row['main_image'] else None
+    return rows
+
+
+def public(row, fields):
+    return {name: row[PRODUCT_FIELDS[name]] for name in fields}
+
+
+def error_response(error):
+    return JsonResponse({'success': False, 'error': str(error)}, status=400)
+
+
+@require_GET
+@cache_control(public=True, max_age=CACHE_SECONDS)
+def product_list_api(request):
+    """
+    GET /api/products/?fields=id,name&category=sofa&brand=&q=&min_price=&max_price=
+                      &sort=newest&limit=24&cursor=<next_cursor>
+    """
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+        limit = parse_int(request.GET.get('limit'), 'limit', PAGE_SIZE, MAX_PAGE_SIZE)
+        sort = request.GET.get('sort') or 'newest'
+        if sort not in SORTS:
+            raise ApiError(f"sort must be one of: {', '.join(SORTS)}")
+        field, descending = SORTS[sort]
+
+        products = Product.customer_visible.all()
+        category = request.GET.get('category')
+        if category:
+            products = products.filter(category__slug=category.lower())
+        brand = request.GET.get('brand')
+        if brand:
+            products = products.filter(brand__iexact=brand)
+        search = request.GET.get('q', '').strip()
+        if search:
+            products = products.filter(name__icontains=search)
+        for param, lookup in (('min_price', 'effective_price__gte'), ('max_price', 'effective_price__lte')):
+            if request.GET.get(param):
+                try:
+                    products = products.filter(**{lookup: Decimal(request.GET[param])})
+                except InvalidOperation:
+                    raise ApiError(f"{param} must be a number")
+
+        # Keyset pagination: resume strictly after the last row of the previous page
+        if request.GET.get('cursor'):
+            value, pk = decode_cursor(request.GET['cursor'], sort)
+            after = 'lt' if descending else 'gt'
+            products = products.filter(
+                Q(**{f'{field}__{after}': value}) | Q(**{field: value, f'pk__{after}': pk})
+            )
+        prefix = '-' if descending else ''
+        products = products.order_by(f'{prefix}{field}', f'{prefix}pk')[:limit + 1]
+
+        rows = product_rows(products, fields, extra=('pk', field))
+    except ApiError as e:
+        return error_response(e)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, last[field], last['pk'])
+    return JsonResponse({
+        'success': True,
+        'results': [public(row, fields) for row in rows],
+        'next_cursor': next_cursor,
+    })
+
+
+@require_GET
+@cache_control(public=True, max_age=CACHE_SECONDS)
+def product_batch_api(request):
+    """GET /api/products/batch/?ids=3,1,2&fields=... returns products in the order asked for"""
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in request.GET.get('ids', '').split(',') if pk.strip()))
+        except ValueError:
+            raise ApiError("ids must be a comma-separated list of integers")
+        if not ids:
+            raise ApiError("ids is required")
+        if len(ids) > MAX_BATCH_IDS:
+            raise ApiError(f"At most {MAX_BATCH_IDS} ids per request")
+        rows = product_rows(Product.customer_visible.filter(pk__in=ids), fields, extra=('pk',))
+    except ApiError as e:
+        return error_response(e)
+
+    by_id = {row['pk']: row for row in rows}
+    return JsonResponse({
+        'success': True,
+        'results': [public(by_id[pk], fields) for pk in ids if pk in by_id],
+        'missing': [pk for pk in ids if pk not in by_id],
+    })
+
+
+@require_GET
+@cache_control(public=True, max_age=CACHE_SECONDS)
+def category_list_api(request):
+    """GET /api/categories/: every listed category with its number of visible products"""
+    return JsonResponse({
+        'success': True,
+        'results': [
+            {'slug': facet['slug'], 'name': facet['name'], 'product_count': facet['product_count']}
+            for facet in category_facets()
+        ],
+    })
@@ -0,0 +1,252 @@
+"""
+Carts: applying lists of set, add and remove operations to saved carts and
+anonymous session carts, and evaluating a cart's lines in one query.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, ExpressionWrapper, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Least
+
+from customeradmin.models import Product, ProductImage, visible_category
+from .models import MAX_CART_QUANTITY, Cart, CartItem, WishlistItem
+from .pricing import QuoteLine
+
+
+OPERATIONS = ('set', 'add', 'remove')
+
+# Session key of an anonymous visitor's cart: {"<product_id>": quantity}
+SESSION_CART_KEY = 'cart'
+
+
+def parse_operations(raw):
+    """
+    Normalise request operations into (op, product_id, quantity) tuples.
+
+    Raises ValueError when the payload is malformed.
+    """
+    if not isinstance(raw, list):
+        raise ValueError("operations must be a list")
+    operations = []
+    for entry in raw:
+        if not isinstance(entry, dict):
+            raise ValueError("each operation must be an object")
+        op = entry.get('op')
+        if op not in OPERATIONS:
+            raise ValueError(f"unknown operation {op!r}")
+        try:
+            product_id = int(entry.get('product_id'))
+            quantity = int(entry.get('quantity', 1 if op == 'add' else 0))
+        except (TypeError, ValueError):
+            raise ValueError("product_id and quantity must be integers")
+        if op == 'set' and quantity < 0:
+            raise ValueError("quantity can't be negative")
+        operations.append((op, product_id, quantity))
+    return operations
+
+
+def resolve_operations(current, operations, clamp=False):
+    """
+    Work out what (op, product_id, quantity) operations do to a cart holding
+    `current` ({product_id: quantity}).
+
+    'set' replaces a line's quantity (0 removes it), 'add' adds to it (negative
+    steps down, never below 1) and 'remove' deletes it. Every product left in
+    the cart is checked with one IN query. A line that fails keeps its old
+    quantity, unless `clamp` is set, in which case a line over its limit is
+    cut down to the limit instead.
+
+    Returns ({product_id: new quantity, 0 when removed}, [(product_id, reason)]).
+    """
+    wanted = {}
+    for op, product_id, quantity in operations:
+        held = wanted.get(product_id, current.get(product_id, 0))
+        if op == 'remove':
+            wanted[product_id] = 0
+        elif op == 'set':
+            wanted[product_id] = quantity
+        else:
+            wanted[product_id] = max(held + quantity, 1 if held else 0)
+
+    products = {
+        pk: (name, stock)
+        for pk, name, stock in Product.customer_visible.filter(
+            pk__in=[pk for pk, quantity in wanted.items() if quantity > 0]
+        ).values_list('pk', 'name', 'stock_quantity')
+    }
+
+    changed = {}
+    failed = []
+    for product_id, quantity in wanted.items():
+        if quantity > 0:
+            if product_id not in products:
+                failed.append((product_id, 'This product is no longer available'))
+                continue
+            name, stock = products[product_id]
+            if stock <= 0:
+                failed.append((product_id, f'{name} is out of stock'))
+                continue
+            max_allowed = min(stock, MAX_CART_QUANTITY)
+            if quantity > max_allowed:
+                if not clamp:
+                    failed.append((product_id, f'Cannot add more than {max_allowed} items of {name}'))
+                    continue
+                quantity = max_allowed
+        if quantity != current.get(product_id, 0):
+            changed[product_id] = quantity
+    return changed, failed
+
+
+def apply_operations(cart, operations, clamp=False):
+    """
+    Apply operations (see resolve_operations) to a saved cart in one transaction.
+
+    Removed lines go in one DELETE and new or changed lines in one upsert.
+    Products whose quantity went up leave the wishlist, as with add_to_cart_view.
+    """
+    with transaction.atomic():
+        # Serialise concurrent edits of the same cart
+        Cart.objects.select_for_update().filter(pk=cart.pk).exists()
+        current = dict(cart.items.values_list('product_id', 'quantity'))
+        changed, failed = resolve_operations(current, operations, clamp)
+
+        removed = [pk for pk, quantity in changed.items() if quantity == 0]
+        if removed:
+            cart.items.filter(product_id__in=removed).delete()
+        kept = [CartItem(cart=cart, product_id=pk, quantity=quantity) for pk, quantity in changed.items() if quantity]
+        if kept:
+            CartItem.objects.bulk_create(
+                kept,
+                update_conflicts=True,
+                unique_fields=['cart', 'product'],
+                update_fields=['quantity', 'updated_at'],
+            )
+
+        raised = [pk for pk, quantity in changed.items() if quantity > current.get(pk, 0)]
+        if raised:
+            WishlistItem.objects.discard(cart.user_id, raised)
+
+    return changed, failed
+
+
+def session_cart(session):
+    """An anonymous visitor's cart as {product_id: quantity}"""
+    return {int(pk): quantity for pk, quantity in session.get(SESSION_CART_KEY, {}).items()}
+
+
+def apply_session_operations(session, operations):
+    """Apply operations (see resolve_operations) to an anonymous visitor's session cart"""
+    quantities = session_cart(session)
+    changed, failed = resolve_operations(quantities, operations)
+    quantities.update(changed)
+    session[SESSION_CART_KEY] = {str(pk): quantity for pk, quantity in quantities.items() if quantity}
+    return changed, failed
+
+
+def merge_session_cart(session, user):
+    """Add an anonymous visitor's cart to their saved cart, capping lines at what can be bought"""
+    quantities = session_cart(session)
+    if not quantities:
+        return
+    cart, created = Cart.objects.get_or_create(user=user)
+    apply_operations(cart, [('add', pk, quantity) for pk, quantity in quantities.items()], clamp=True)
+    session.pop(SESSION_CART_KEY, None)
+
+
+@dataclass(frozen=True)
+class CartEvaluation:
+    """
+    A cart's lines with availability and prices worked out in SQL. Each item
+    carries `available`, `max_quantity`, `line_total` and `main_image_url`.
+    """
+    items: tuple
+
+    @property
+    def available_items(self):
+        return [item for item in self.items if item.available]
+
+    @property
+    def unavailable_items(self):
+        return [item for item in self.items if not item.available]
+
+    @property
+    def total_items(self):
+        return sum(item.quantity for item in self.items)
+
+    @property
+    def total_amount(self):
+        return sum((item.line_total for item in self.items), Decimal('0.00'))
+
+    @property
+    def can_checkout(self):
+        return bool(self.items) and all(item.available for item in self.items)
+
+    @property
+    def quote_lines(self):
+        """Pricing input for the available lines, in a stable order for the quote hash"""
+        return tuple(
+            QuoteLine(item.product_id, item.product.name, item.product.price, item.product.effective_price, item.quantity)
+            for item in sorted(self.available_items, key=lambda item: item.product_id)
+        )
+
+
+def line_annotations(quantity, product=''):
+    """
+    Availability, purchase limit, line total and main image of a cart line,
+    where `product` is the lookup prefix of the product ('' on Product itself)
+    """
+    return {
+        'available': ExpressionWrapper(
+            visible_category(product) & Q(**{
+                f'{product}is_deleted': False,
+                f'{product}is_blocked': False,
+                f'{product}status': 'published',
+                f'{product}stock_quantity__gte': quantity,
+            }),
+            output_field=models.BooleanField(),
+        ),
+        'max_quantity': Least(F(f'{product}stock_quantity'), Value(MAX_CART_QUANTITY)),
+        'line_total': ExpressionWrapper(
+            quantity * F(f'{product}effective_price'),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        ),
+        'main_image': Subquery(
+            ProductImage.objects.filter(product=OuterRef(f'{product}pk'))
+            .order_by('-is_primary', 'order', 'created_at')
+            .values('image')[:1]
+        ),
+    }
+
+
+def with_image_urls(items):
+    """Set main_image_url on rows carrying the main_image annotation of line_annotations(); returns them as a tuple"""
+    storage = ProductImage._meta.get_field('image').storage
+    for item in items:
+        item.main_image_url = storage.url(item.main_image) if item.main_image else None
+    return tuple(items)
+
+
+def evaluate_cart(cart):
+    """Evaluate a saved cart in one query"""
+    items = cart.items.select_related('product').annotate(**line_annotations(F('quantity'), 'product__'))
+    return CartEvaluation(with_image_urls(list(items)))
+
+
+def evaluate_session_cart(session):
+    """Evaluate an anonymous visitor's session cart in one query"""
+    quantities = session_cart(session)
+    if not quantities:
+        return CartEvaluation(())
+    quantity = Case(
+        *[When(pk=pk, then=Value(q)) for pk, q in quantities.items()],
+        output_field=models.IntegerField(),
+    )
+    products = Product.objects.filter(pk__in=list(quantities)).annotate(**line_annotations(quantity)).order_by('name')
+    items = []
+    for product in products:
+        item = CartItem(product=product, quantity=quantities[product.pk])
+        for name in ('available', 'max_quantity', 'line_total', 'main_image'):
+            setattr(item, name, getattr(product, name))
+        items.append(item)
+    return CartEvaluation(with_image_urls(items))
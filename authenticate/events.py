@@ -0,0 +1,156 @@
+"""
+Storefront analytics: views push compact events into an in-process buffer,
+a background thread writes them in bulk, and the daily rollup folds them
+into ProductDailyStats.
+"""
+import atexit
+import logging
+import os
+import threading
+from datetime import datetime, time, timedelta
+
+from django.db import connection
+from django.db.models import Count, Exists, OuterRef, Sum
+from django.utils import timezone
+
+from customeradmin.models import Product
+from .models import ActivityEvent, ProductDailyStats
+
+logger = logging.getLogger(__name__)
+
+
+# Events held in memory per process; when full, new events are dropped and counted
+BUFFER_CAPACITY = 20000
+
+# How often the flusher writes the buffer out
+FLUSH_SECONDS = 5
+
+# Rows per INSERT
+WRITE_BATCH = 2000
+
+
+class EventBuffer:
+    """
+    A bounded, thread-safe list of (kind, product_id, quantity, occurred_at)
+    tuples. push() only appends under a lock, so it costs the request almost
+    nothing; a daemon thread started on first use swaps the list out every
+    FLUSH_SECONDS and bulk-inserts it. `dropped` and `failed` count events lost
+    to a full buffer or a failed write.
+    """
+
+    def __init__(self, capacity=BUFFER_CAPACITY, flush_seconds=FLUSH_SECONDS):
+        self.capacity = capacity
+        self.flush_seconds = flush_seconds
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._events = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = None
+        self._pid = None
+        self._flush_at_exit = False
+
+    def push(self, kind, product_id, quantity=1):
+        with self._lock:
+            if len(self._events) >= self.capacity:
+                self.dropped += 1
+                return False
+            self._events.append((kind, product_id, quantity, timezone.now()))
+            # A forked worker inherits the buffer but not the thread
+            if self._pid != os.getpid():
+                self._start()
+        return True
+
+    def _start(self):
+        self._pid = os.getpid()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stopped,), name='event-flusher', daemon=True)
+        self._thread.start()
+        # Whatever the daemon thread hasn't written yet goes out at exit
+        if not self._flush_at_exit:
+            atexit.register(self.flush)
+            self._flush_at_exit = True
+
+    def _run(self, stopped):
+        while not stopped.wait(self.flush_seconds):
+            self.flush()
+            # This thread's connection would otherwise stay open between flushes
+            connection.close()
+
+    def stop(self):
+        """Stop the flusher thread; events still buffered wait for flush() or the next push()"""
+        with self._lock:
+            thread, stopped = self._thread, self._stopped
+            self._thread = self._stopped = self._pid = None
+        if thread is not None:
+            stopped.set()
+            thread.join()
+
+    def flush(self):
+        """Write out everything buffered so far; returns how many events were written"""
+        with self._lock:
+            events, self._events = self._events, []
+        if not events:
+            return 0
+        try:
+            ActivityEvent.objects.bulk_create(
+                [
+                    ActivityEvent(kind=kind, product_id=product_id, quantity=quantity, occurred_at=occurred_at)
+                    for kind, product_id, quantity, occurred_at in events
+                ],
+                batch_size=WRITE_BATCH,
+            )
+        except Exception as e:
+            self.failed += len(events)
+            logger.error(f"Error writing {len(events)} analytics events: {str(e)}")
+            return 0
+        self.written += len(events)
+        return len(events)
+
+
+buffer = EventBuffer()
+
+
+def track(kind, product_ids, quantity=1):
+    """Record one event of `kind` for each product id"""
+    for product_id in product_ids:
+        buffer.push(kind, product_id, quantity)
+
+
+def rollup_events(day):
+    """
+    Set the impression, view and cart-add counters of every product active on
+    `day` from its ActivityEvent rows, in one GROUP BY and one upsert
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    rows = (
+        ActivityEvent.objects.filter(occurred_at__gte=start, occurred_at__lt=start + timedelta(days=1))
+        # Events can outlive a hard-deleted product; the counters can't
+        .filter(Exists(Product.all_objects.filter(pk=OuterRef('product_id'))))
+        .values('product_id', 'kind')
+        .annotate(events=Count('id'), units=Sum('quantity'))
+        .values_list('product_id', 'kind', 'events', 'units')
+    )
+    counters = {}
+    for product_id, kind, events, units in rows:
+        stats = counters.setdefault(product_id, ProductDailyStats(product_id=product_id, day=day))
+        if kind == ActivityEvent.IMPRESSION:
+            stats.impressions = events
+        elif kind == ActivityEvent.VIEW:
+            stats.views = events
+        elif kind == ActivityEvent.CART_ADD:
+            stats.cart_adds = units
+    ProductDailyStats.objects.bulk_create(
+        list(counters.values()),
+        update_conflicts=True,
+        unique_fields=['product', 'day'],
+        update_fields=['impressions', 'views', 'cart_adds'],
+        batch_size=WRITE_BATCH,
+    )
+
+
+def purge_events(before):
+    """Delete raw events older than `before` (a date); returns how many were deleted"""
+    cutoff = timezone.make_aware(datetime.combine(before, time.min))
+    return ActivityEvent.objects.filter(occurred_at__lt=cutoff).delete()[0]
@@ -0,0 +1,83 @@
+"""Checkout stock holds: reserving cart quantities while a customer checks out and claiming them at placement."""
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import Case, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from customeradmin.models import Product
+from .models import StockReservation
+
+
+# How long checkout holds a customer's cart quantities
+HOLD_MINUTES = 15
+
+
+def held_by_others(user):
+    """Units of the outer product held by other customers' unexpired reservations"""
+    held = (
+        StockReservation.objects.active()
+        .filter(product=OuterRef('pk'))
+        .exclude(user=user)
+        .values('product')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return Coalesce(Subquery(held, output_field=models.IntegerField()), Value(0))
+
+
+def reserve(user, quantities):
+    """
+    Hold {product_id: quantity} for the user for HOLD_MINUTES, replacing their earlier holds.
+
+    Only the products being reserved are locked. Returns {product_id: units available}
+    for the lines that can't be covered, in which case nothing is held.
+    """
+    with transaction.atomic():
+        rows = (
+            Product.all_objects.select_for_update(of=('self',))
+            .filter(pk__in=list(quantities), manage_stock=True)
+            .order_by('pk')
+            .annotate(held=held_by_others(user))
+            .values_list('pk', 'stock_quantity', 'held')
+        )
+        available = {pk: max(stock - held, 0) for pk, stock, held in rows}
+        shortfalls = {pk: units for pk, units in available.items() if units < quantities[pk]}
+        if shortfalls:
+            return shortfalls
+
+        expires_at = timezone.now() + timedelta(minutes=HOLD_MINUTES)
+        StockReservation.objects.filter(user=user).delete()
+        StockReservation.objects.bulk_create([
+            StockReservation(user=user, product_id=pk, quantity=quantities[pk], expires_at=expires_at)
+            for pk in available
+        ])
+    return {}
+
+
+def claim(user, quantities):
+    """
+    Take an order's quantities out of stock and release the user's holds.
+
+    One conditional UPDATE decrements every managed product that still has the
+    quantity on hand beyond other customers' holds. If any product falls short
+    nothing is decremented and False is returned.
+    """
+    ids = list(Product.all_objects.filter(pk__in=list(quantities), manage_stock=True).values_list('pk', flat=True))
+    with transaction.atomic():
+        wanted = Case(
+            *[When(pk=pk, then=Value(quantities[pk])) for pk in ids],
+            output_field=models.IntegerField(),
+        )
+        decremented = (
+            Product.all_objects.filter(pk__in=ids)
+            .filter(stock_quantity__gte=wanted + held_by_others(user))
+            .adjust_stock({pk: -quantities[pk] for pk in ids})
+        )
+        if decremented != len(ids):
+            transaction.set_rollback(True)
+            return False
+        StockReservation.objects.filter(user=user).delete()
+    return True
+
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from authenticate.models import CustomUser
+from customeradmin.utils import process_avatar
+
+
+class Command(BaseCommand):
+    help = 'Square-crop existing profile images and build their avatar variants'
+
+    def handle(self, *args, **options):
+        users = (
+            CustomUser.objects
+            .exclude(profile_image='')
+            .exclude(profile_image__isnull=True)
+            .filter(Q(avatar_small='') | Q(avatar_small__isnull=True))
+        )
+
+        processed = 0
+        failed = 0
+        for user in users.iterator(chunk_size=200):
+            try:
+                with user.profile_image.open('rb') as source:
+                    variants = process_avatar(source, CustomUser.AVATAR_SIZES)
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f"Skipped {user.email}: {e}"))
+                continue
+
+            for field, image in variants.items():
+                getattr(user, field).save(image.name, image, save=False)
+            user.save(update_fields=['profile_image'])
+            processed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Built avatars for {processed} users ({failed} skipped)"))
@@ -0,0 +1,65 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authenticate.shipments import TrackingIngestor, parse_event, stub_events
+from customeradmin.catalog import FORMATS, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Apply carrier tracking events (CSV or JSONL with tracking_number, status, occurred_at) to orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='CSV or JSONL carrier status file')
+        parser.add_argument('--format', choices=FORMATS, help='File format (defaults to the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Events matched and applied per batch')
+        parser.add_argument(
+            '--stub', action='store_true',
+            help='Instead of a file, advance every open tracked order by one carrier step (local testing)'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not path and not options['stub']:
+            raise CommandError("Give a carrier status file or --stub")
+
+        batch_size = max(1, options['batch_size'])
+        ingestor = TrackingIngestor()
+        invalid = 0
+
+        if options['stub']:
+            # Materialise first so transitions don't feed back into the query being read
+            records = [(line, row, None) for line, row in enumerate(stub_events(), 1)]
+            invalid += self.ingest(records, ingestor, batch_size)
+        else:
+            if not os.path.isfile(path):
+                raise CommandError(f"File not found: {path}")
+            with open(path, newline='', encoding='utf-8') as stream:
+                invalid += self.ingest(read_rows(stream, detect_format(path, options['format'])), ingestor, batch_size)
+
+        for tracking_number, reason in ingestor.errors:
+            self.stderr.write(f"[{tracking_number}]: {reason}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {ingestor.moved} orders, {ingestor.unchanged} already up to date, "
+            f"{ingestor.unmatched} unknown tracking numbers, {len(ingestor.errors)} rejected, {invalid} invalid events"
+        ))
+
+    def ingest(self, records, ingestor, batch_size):
+        invalid = 0
+        batch = []
+        for line, row, error in records:
+            if not error:
+                try:
+                    batch.append(parse_event(row))
+                except ValueError as e:
+                    error = str(e)
+            if error:
+                invalid += 1
+                self.stderr.write(f"line {line}: {error}")
+                continue
+            if len(batch) >= batch_size:
+                ingestor.apply(batch)
+                batch = []
+        if batch:
+            ingestor.apply(batch)
+        return invalid
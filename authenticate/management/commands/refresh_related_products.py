@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from authenticate.related import NEIGHBOURS, refresh_related_products
+
+
+class Command(BaseCommand):
+    help = 'Recompute the related products shown on product pages (run nightly from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--neighbours', type=int, default=NEIGHBOURS, help='Related products stored per product')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        written = refresh_related_products(max(1, options['neighbours']))
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {written} related product entries in {time.monotonic() - started:.1f}s"
+        ))
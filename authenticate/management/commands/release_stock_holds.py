@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from authenticate.models import StockReservation
+
+
+class Command(BaseCommand):
+    help = 'Delete expired checkout stock holds (run every few minutes from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Holds deleted per statement')
+
+    def handle(self, *args, **options):
+        # Expired holds already stop counting against stock; this just keeps the table small
+        batch_size = max(1, options['batch_size'])
+        released = 0
+        while True:
+            ids = list(StockReservation.objects.expired().values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            released += StockReservation.objects.filter(pk__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired stock holds"))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from authenticate.events import purge_events
+from authenticate.models import RollupState
+from authenticate.popularity import ROLLUP_NAME, rollup_popularity
+
+
+class Command(BaseCommand):
+    help = 'Roll finished days of storefront events and sales up into product popularity (run daily from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=30, help='Days of raw events kept after they are rolled up')
+
+    def handle(self, *args, **options):
+        days = rollup_popularity()
+        if days:
+            self.stdout.write(self.style.SUCCESS(f"Rolled up popularity for {len(days)} days ({days[0]} to {days[-1]})"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Popularity is already up to date"))
+
+        state = RollupState.objects.filter(name=ROLLUP_NAME).first()
+        if state:
+            # Only days already rolled up are ever purged
+            purged = purge_events(state.day - timedelta(days=max(0, options['keep_days']) - 1))
+            self.stdout.write(f"Purged {purged} raw events")
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from authenticate.alerts import AlertDispatcher
+from customeradmin.models import ProductEvent
+
+
+class Command(BaseCommand):
+    help = 'Email shoppers about price drops and restocks on products in their wishlist or cart (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Product events claimed per batch')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Watcher rows fetched from the database at a time')
+        parser.add_argument('--send-batch', type=int, default=100, help='Emails handed to the SMTP connection at a time')
+        parser.add_argument('--keep-days', type=int, default=30, help='Delete processed events older than this')
+
+    def handle(self, *args, **options):
+        dispatcher = AlertDispatcher(
+            chunk_size=max(1, options['chunk_size']),
+            send_batch=max(1, options['send_batch']),
+        )
+        dispatcher.run(batch_size=max(1, options['batch_size']))
+        cutoff = timezone.now() - timedelta(days=max(0, options['keep_days']))
+        purged, _ = ProductEvent.objects.filter(processed_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {dispatcher.events} events for {dispatcher.products} products: "
+            f"sent {dispatcher.sent} emails, {dispatcher.failed} failed, purged {purged} old events"
+        ))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:58
+
+import customeradmin.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authenticate', '0010_order_discount_amount_order_shipping_charge_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='profile_image',
+            field=models.ImageField(blank=True, null=True, storage=customeradmin.storage.ContentAddressedStorage(), upload_to='profile_images/'),
+        ),
+    ]
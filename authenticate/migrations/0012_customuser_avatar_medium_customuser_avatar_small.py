@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:59
+
+import customeradmin.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authenticate', '0011_alter_customuser_profile_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='avatar_medium',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=customeradmin.storage.ContentAddressedStorage(), upload_to='profile_images/'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='avatar_small',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=customeradmin.storage.ContentAddressedStorage(), upload_to='profile_images/'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authenticate', '0013_order_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='tracking_number',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.4 on 2026-10-19 11:18
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_coupons(apps, schema_editor):
+    """The coupons that used to be hardcoded in place_order_view"""
+    Coupon = apps.get_model('authenticate', 'Coupon')
+    Coupon.objects.bulk_create([
+        Coupon(code='SAVE10', description='10% off on orders above ₹500', discount_type='percentage',
+               discount_value=Decimal('10'), min_order=Decimal('500')),
+        Coupon(code='FLAT50', description='₹50 off on orders above ₹1000', discount_type='flat',
+               discount_value=Decimal('50'), min_order=Decimal('1000')),
+        Coupon(code='FIRSTORDER', description='15% off for first orders above ₹300', discount_type='percentage',
+               discount_value=Decimal('15'), min_order=Decimal('300'), per_user_limit=1),
+    ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authenticate', '0014_order_tracking_number_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Coupon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=30, unique=True)),
+                ('description', models.CharField(blank=True, max_length=200)),
+                ('discount_type', models.CharField(choices=[('percentage', 'Percentage'), ('flat', 'Flat Amount')], default='percentage', max_length=20)),
+                ('discount_value', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('min_order', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('valid_from', models.DateTimeField(blank=True, null=True)),
+                ('valid_until', models.DateTimeField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('usage_limit', models.PositiveIntegerField(blank=True, help_text='Total uses allowed; empty for unlimited', null=True)),
+                ('per_user_limit', models.PositiveIntegerField(blank=True, help_text='Uses allowed per customer; empty for unlimited', null=True)),
+                ('times_used', models.PositiveIntegerField(default=0, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['code'],
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='coupon_code',
+            field=models.CharField(blank=True, default='', max_length=30),
+        ),
+        migrations.CreateModel(
+            name='CouponUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('times_used', models.PositiveIntegerField(default=0)),
+                ('coupon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usages', to='authenticate.coupon')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coupon_usages', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('coupon', 'user'), name='unique_coupon_usage')],
+            },
+        ),
+        migrations.RunPython(seed_coupons, migrations.RunPython.noop),
+    ]
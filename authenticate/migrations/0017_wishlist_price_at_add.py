@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-19 11:27
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_price_at_add(apps, schema_editor):
+    """Existing wishlist items start from today's price"""
+    WishlistItem = apps.get_model('authenticate', 'WishlistItem')
+    Product = apps.get_model('customeradmin', 'Product')
+    WishlistItem.objects.filter(price_at_add__isnull=True).update(
+        price_at_add=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('effective_price')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authenticate', '0016_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wishlistitem',
+            name='price_at_add',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_price_at_add, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-19 11:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authenticate', '0018_related_products'),
+        ('customeradmin', '0008_product_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('day', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('cart_adds', models.PositiveIntegerField(default=0)),
+                ('units_sold', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='customeradmin.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='authenticat_day_c52335_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'day'), name='unique_product_day')],
+            },
+        ),
+    ]
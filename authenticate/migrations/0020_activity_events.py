@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-19 11:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authenticate', '0019_product_daily_stats'),
+        ('customeradmin', '0008_product_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productdailystats',
+            name='impressions',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Listing impression'), (2, 'Product view'), (3, 'Add to cart')])),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('occurred_at', models.DateTimeField()),
+                ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='customeradmin.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['occurred_at'], name='authenticat_occurre_648e7f_idx')],
+            },
+        ),
+    ]
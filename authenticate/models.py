@@ -1,8 +1,13 @@
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models.functions import RowNumber, Upper
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 import re
 from django.utils import timezone
 from customeradmin.models import Product
+from customeradmin.storage import content_addressed_storage
+from customeradmin.utils import process_avatar
 import random
 import string 
 from decimal import Decimal
@@ -46,7 +51,9 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     blocked_at = models.DateTimeField(null=True, blank=True)
     blocked_by = models.CharField(max_length=100, null=True, blank=True)
     
-    profile_image = models.ImageField(upload_to='profile_images/', blank=True, null=True)
+    profile_image = models.ImageField(upload_to='profile_images/', storage=content_addressed_storage, blank=True, null=True)
+    avatar_medium = models.ImageField(upload_to='profile_images/', storage=content_addressed_storage, blank=True, null=True, editable=False)
+    avatar_small = models.ImageField(upload_to='profile_images/', storage=content_addressed_storage, blank=True, null=True, editable=False)
     date_of_birth = models.DateField(blank=True, null=True)
     bio = models.TextField(max_length=500, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -57,9 +64,22 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
     objects = CustomUserManager()
 
+    # Square edge length in pixels for the stored profile image and its variants
+    AVATAR_SIZES = {
+        'profile_image': 512,
+        'avatar_medium': 240,
+        'avatar_small': 72,
+    }
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name', 'phone_number']
 
+    class Meta:
+        indexes = [
+            # icontains compiles to UPPER(col) LIKE UPPER(%s); this trigram index serves it
+            GinIndex(OpClass(Upper('email'), name='gin_trgm_ops'), name='customuser_email_trgm'),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -79,13 +99,43 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         self.blocked_by = None
         self.save()
 
+    @property
+    def avatar_medium_url(self):
+        """Sidebar/profile sized avatar, falling back to the original upload"""
+        image = self.avatar_medium or self.profile_image
+        return image.url if image else None
+
+    @property
+    def avatar_small_url(self):
+        """Navigation bar sized avatar, falling back to the original upload"""
+        image = self.avatar_small or self.avatar_medium or self.profile_image
+        return image.url if image else None
+
     def clean_phone_number(self):
         """Remove all non-digit characters from phone number"""
         if self.phone_number:
             self.phone_number = re.sub(r'[^\d]', '', self.phone_number)
+
+    def process_profile_image(self):
+        """Square-crop a newly uploaded profile image and build its avatar variants"""
+        if not self.profile_image:
+            self.avatar_medium = None
+            self.avatar_small = None
+            return
+        if self.profile_image._committed:
+            return
+
+        variants = process_avatar(self.profile_image, self.AVATAR_SIZES)
+        self.profile_image = variants['profile_image']
+        self.avatar_medium = variants['avatar_medium']
+        self.avatar_small = variants['avatar_small']
     
     def save(self, *args, **kwargs):
         self.clean_phone_number()
+        self.process_profile_image()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'profile_image' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'avatar_medium', 'avatar_small'}
         super().save(*args, **kwargs)
 
 
@@ -125,6 +175,93 @@ class UserAddress(models.Model):
         super().save(*args, **kwargs)
 
 
+# Line items shown on each order card in the order history pages
+ORDER_PREVIEW_ITEMS = 2
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_item_summary(self, preview=ORDER_PREVIEW_ITEMS):
+        """
+        Annotate item_count and prefetch the first `preview` items of every
+        order into `preview_items`, so a page of orders costs two queries.
+        """
+        ranked_items = OrderItem.objects.annotate(
+            position=models.Window(
+                RowNumber(),
+                partition_by=models.F('order_id'),
+                order_by=[models.F('created_at').asc(), models.F('id').asc()],
+            )
+        ).filter(position__lte=preview)
+        return self.annotate(item_count=models.Count('items')).prefetch_related(
+            models.Prefetch('items', queryset=ranked_items, to_attr='preview_items')
+        )
+
+    def transition(self, new_status, changed_by='admin', notes=None):
+        """
+        Move every order in the queryset to `new_status` in one transaction.
+
+        The orders are locked and checked against Order.TRANSITIONS and
+        Order.TRANSITION_GUARDS in a single query. Valid ones are moved with one
+        UPDATE, stock is restored set-based where the target status requires it,
+        and their OrderStatusHistory rows are bulk inserted.
+
+        Returns (moved_ids, failures) where failures maps order id -> reason.
+        """
+        if new_status not in dict(Order.ORDER_STATUS_CHOICES):
+            raise ValueError(f"Unknown order status: {new_status}")
+
+        guard_fields = list(Order.TRANSITION_GUARDS.get(new_status, ({}, ''))[0])
+        now = timezone.now()
+        with transaction.atomic():
+            rows = self.select_for_update().order_by('pk').values_list('pk', 'status', *guard_fields)
+
+            moved = {}
+            failures = {}
+            for pk, old_status, *guard_values in rows:
+                error = Order.transition_error(old_status, new_status, dict(zip(guard_fields, guard_values)))
+                if error:
+                    failures[pk] = error
+                else:
+                    moved[pk] = old_status
+            if not moved:
+                return [], failures
+
+            fields = {'status': new_status, 'updated_at': now}
+            timestamp, actor, reason = Order.TRANSITION_STAMPS.get(new_status, (None, None, None))
+            if timestamp:
+                fields[timestamp] = now
+            if actor:
+                fields[actor] = changed_by
+            if reason:
+                fields[reason] = notes
+            if new_status == 'cancelled':
+                fields['can_cancel'] = False
+            Order.objects.filter(pk__in=list(moved)).update(**fields)
+
+            if new_status in Order.RESTOCK_STATUSES:
+                restock = (
+                    OrderItem.objects
+                    .filter(order_id__in=list(moved), is_cancelled=False, product__manage_stock=True)
+                    .values('product_id')
+                    .annotate(quantity=models.Sum('quantity'))
+                    .values_list('product_id', 'quantity')
+                )
+                Product.all_objects.adjust_stock(dict(restock))
+
+            OrderStatusHistory.objects.bulk_create([
+                OrderStatusHistory(
+                    order_id=pk,
+                    old_status=old_status,
+                    new_status=new_status,
+                    changed_by=changed_by,
+                    notes=notes,
+                )
+                for pk, old_status in moved.items()
+            ])
+
+        return list(moved), failures
+
+
 class Order(models.Model):
     ORDER_STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -136,6 +273,38 @@ class Order(models.Model):
         ('refunded', 'Refunded'),
     ]
     
+    # Pricing rules applied by pricing.build_quote() when an order is quoted and placed
+    TAX_RATE = Decimal('0.18')
+    SHIPPING_CHARGE = Decimal('50.00')
+    FREE_SHIPPING_THRESHOLD = Decimal('1000.00')
+    
+    # Statuses each status may move to; cancelled and refunded are final
+    TRANSITIONS = {
+        'pending': ('confirmed', 'processing', 'cancelled'),
+        'confirmed': ('processing', 'shipped', 'cancelled'),
+        'processing': ('shipped', 'cancelled'),
+        'shipped': ('delivered',),
+        'delivered': ('refunded',),
+        'cancelled': (),
+        'refunded': (),
+    }
+    
+    # Field values an order must have to enter a status, with the error shown otherwise
+    TRANSITION_GUARDS = {
+        'cancelled': ({'can_cancel': True}, "This order is marked as not cancellable."),
+    }
+    
+    # (timestamp, actor, reason) fields stamped when an order enters a status
+    TRANSITION_STAMPS = {
+        'shipped': ('shipped_at', None, None),
+        'delivered': ('delivered_at', None, None),
+        'cancelled': ('cancelled_at', 'cancelled_by', 'cancellation_reason'),
+        'refunded': ('returned_at', 'returned_by', 'return_reason'),
+    }
+    
+    # Entering these statuses puts the items' quantities back into stock
+    RESTOCK_STATUSES = {'cancelled', 'refunded'}
+    
     PAYMENT_STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('paid', 'Paid'),
@@ -160,6 +329,7 @@ class Order(models.Model):
     discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     shipping_charge = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    coupon_code = models.CharField(max_length=30, blank=True, default='')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     
     shipping_address = models.ForeignKey('UserAddress', on_delete=models.SET_NULL, null=True, blank=True)
@@ -177,7 +347,7 @@ class Order(models.Model):
     cancelled_by = models.CharField(max_length=50, blank=True, null=True)
     
     # Shipping details
-    tracking_number = models.CharField(max_length=100, blank=True, null=True)
+    tracking_number = models.CharField(max_length=100, blank=True, null=True, db_index=True)
     shipping_carrier = models.CharField(max_length=100, blank=True, null=True)
     
     # Return fields
@@ -185,8 +355,14 @@ class Order(models.Model):
     returned_at = models.DateTimeField(null=True, blank=True)
     returned_by = models.CharField(max_length=50, blank=True, null=True)
     
+    objects = OrderQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            GinIndex(OpClass(Upper('order_number'), name='gin_trgm_ops'), name='order_number_trgm'),
+        ]
     
     def __str__(self):
         return f"Order {self.order_number} - {self.user.email}"
@@ -196,82 +372,70 @@ class Order(models.Model):
             self.order_number = 'ORD' + ''.join(random.choices(string.digits, k=8))
         super().save(*args, **kwargs)
     
-    # ✅ ADD THIS METHOD
-    def calculate_totals(self):
-        """Calculate subtotal, discount, tax, shipping, and total"""
-        self.subtotal = Decimal('0.00')
-        original_total = Decimal('0.00')
-        
-        for item in self.items.all():
-            self.subtotal += item.total_price
-            
-            if item.product:
-                original_price = item.product.price
-                original_total += original_price * item.quantity
-        
-        self.discount_amount = original_total - self.subtotal
-        self.tax_amount = self.subtotal * Decimal('0.18')
-        
-        if self.subtotal >= Decimal('500.00'):
-            self.shipping_charge = Decimal('0.00')
-        else:
-            self.shipping_charge = Decimal('50.00')
-        
-        self.total_amount = self.subtotal + self.tax_amount + self.shipping_charge
-        
-        self.save(update_fields=['subtotal', 'discount_amount', 'tax_amount', 'shipping_charge', 'total_amount'])
-        
-        return {
-            'subtotal': self.subtotal,
-            'discount_amount': self.discount_amount,
-            'tax_amount': self.tax_amount,
-            'shipping_charge': self.shipping_charge,
-            'total_amount': self.total_amount
-        }
-    
+    @classmethod
+    def shipping_for(cls, subtotal):
+        """Shipping charged on an order with this subtotal"""
+        return Decimal('0.00') if subtotal >= cls.FREE_SHIPPING_THRESHOLD else cls.SHIPPING_CHARGE
+
+    @property
+    def more_item_count(self):
+        """Items not shown in the preview (requires with_item_summary())"""
+        return max(self.item_count - len(self.preview_items), 0)
+
     @property
     def can_be_cancelled(self):
         """Check if order can be cancelled"""
         cancellable_statuses = ['pending', 'confirmed']
         return self.status in cancellable_statuses and self.can_cancel
-    
+
     @property
     def can_be_returned(self):
         """Check if order can be returned (only if delivered)"""
         return self.status == 'delivered'
+
+    @classmethod
+    def transition_error(cls, old_status, new_status, values):
+        """Reason an order in `old_status` with guard field `values` can't enter `new_status`, or None"""
+        if old_status == new_status:
+            return f"Order is already {new_status}."
+        if new_status not in cls.TRANSITIONS.get(old_status, ()):
+            return f"Cannot move an order from {old_status} to {new_status}."
+        guard, message = cls.TRANSITION_GUARDS.get(new_status, ({}, ''))
+        if any(values.get(field) != expected for field, expected in guard.items()):
+            return message
+        return None
+    
+    def can_transition_to(self, new_status):
+        guard = self.TRANSITION_GUARDS.get(new_status, ({}, ''))[0]
+        values = {field: getattr(self, field) for field in guard}
+        return self.transition_error(self.status, new_status, values) is None
+    
+    def transition_to(self, new_status, changed_by='admin', notes=None):
+        """Move this order to `new_status` through the state machine, raising ValueError if not allowed"""
+        moved, failures = Order.objects.filter(pk=self.pk).transition(new_status, changed_by, notes)
+        if not moved:
+            raise ValueError(failures.get(self.pk, "Order not found."))
+        self.refresh_from_db()
     
     def cancel_order(self, reason=None, cancelled_by='user'):
         """Cancel the order"""
-        if self.can_be_cancelled:
-            self.status = 'cancelled'
-            self.can_cancel = False
-            self.cancelled_at = timezone.now()
-            self.cancellation_reason = reason
-            self.cancelled_by = cancelled_by
-            self.save()
-            
-            for item in self.items.all():
-                if item.product:
-                    item.product.stock_quantity += item.quantity
-                    item.product.save()
-            return True
-        return False
+        if not self.can_be_cancelled:
+            return False
+        try:
+            self.transition_to('cancelled', changed_by=cancelled_by, notes=reason)
+        except ValueError:
+            return False
+        return True
     
     def return_order(self, reason, returned_by='user'):
         """Return the order (only if delivered)"""
-        if self.can_be_returned:
-            self.status = 'refunded'
-            self.return_reason = reason
-            self.returned_at = timezone.now()
-            self.returned_by = returned_by
-            self.save()
-            
-            for item in self.items.all():
-                if item.product:
-                    item.product.stock_quantity += item.quantity
-                    item.product.save()
-            return True
-        return False
+        if not self.can_be_returned:
+            return False
+        try:
+            self.transition_to('refunded', changed_by=returned_by, notes=reason)
+        except ValueError:
+            return False
+        return True
 
 
 class OrderItem(models.Model):
@@ -333,6 +497,144 @@ class OrderStatusHistory(models.Model):
         return f"{self.order.order_number}: {self.old_status} -> {self.new_status}"
 
 
+
+class CouponQuerySet(models.QuerySet):
+    def active(self, now=None):
+        """Coupons that can be applied right now (usage caps are checked on redeem)"""
+        now = now or timezone.now()
+        return self.filter(
+            models.Q(valid_from__isnull=True) | models.Q(valid_from__lte=now),
+            models.Q(valid_until__isnull=True) | models.Q(valid_until__gt=now),
+            is_active=True,
+        )
+
+    def redeem(self, code, user):
+        """
+        Count one use of an active coupon by a user. Returns False when the coupon
+        has expired or its global or per-user cap has been reached.
+
+        Both caps are claimed with conditional F() increments, so only the coupon's
+        row and this user's usage row are locked: two checkouts racing for the last
+        use can't both win, and nothing else waits on them.
+        """
+        with transaction.atomic():
+            coupon = self.active().filter(code=code).values_list('pk', 'per_user_limit').first()
+            if coupon is None:
+                return False
+            pk, per_user_limit = coupon
+
+            claimed = self.filter(pk=pk).filter(
+                models.Q(usage_limit__isnull=True) | models.Q(times_used__lt=models.F('usage_limit'))
+            ).update(times_used=models.F('times_used') + 1)
+            if not claimed:
+                return False
+
+            usage, _ = CouponUsage.objects.get_or_create(coupon_id=pk, user=user)
+            counted = CouponUsage.objects.filter(pk=usage.pk)
+            if per_user_limit is not None:
+                counted = counted.filter(times_used__lt=per_user_limit)
+            if not counted.update(times_used=models.F('times_used') + 1):
+                # Give the global use back along with everything else in this block
+                transaction.set_rollback(True)
+                return False
+            return True
+
+
+class Coupon(models.Model):
+    DISCOUNT_TYPE_CHOICES = [
+        ('percentage', 'Percentage'),
+        ('flat', 'Flat Amount'),
+    ]
+
+    code = models.CharField(max_length=30, unique=True)
+    description = models.CharField(max_length=200, blank=True)
+    discount_type = models.CharField(max_length=20, choices=DISCOUNT_TYPE_CHOICES, default='percentage')
+    discount_value = models.DecimalField(max_digits=10, decimal_places=2)
+    min_order = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    valid_from = models.DateTimeField(null=True, blank=True)
+    valid_until = models.DateTimeField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    usage_limit = models.PositiveIntegerField(null=True, blank=True, help_text="Total uses allowed; empty for unlimited")
+    per_user_limit = models.PositiveIntegerField(null=True, blank=True, help_text="Uses allowed per customer; empty for unlimited")
+    times_used = models.PositiveIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CouponQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['code']
+
+    def __str__(self):
+        return self.code
+
+    def save(self, *args, **kwargs):
+        self.code = self.code.strip().upper()
+        super().save(*args, **kwargs)
+
+
+class CouponUsage(models.Model):
+    """How many times one customer has used one coupon"""
+    coupon = models.ForeignKey(Coupon, on_delete=models.CASCADE, related_name='usages')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='coupon_usages')
+    times_used = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['coupon', 'user'], name='unique_coupon_usage'),
+        ]
+
+    def __str__(self):
+        return f"{self.coupon.code} x{self.times_used} by {self.user.email}"
+
+
+
+class StockReservationQuerySet(models.QuerySet):
+    def active(self, now=None):
+        return self.filter(expires_at__gt=now or timezone.now())
+
+    def expired(self, now=None):
+        return self.filter(expires_at__lte=now or timezone.now())
+
+
+class StockReservation(models.Model):
+    """Units of a product held for one customer while they check out"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey('customeradmin.Product', on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = StockReservationQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_stock_reservation'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'expires_at']),
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held for {self.user_id} until {self.expires_at}"
+
+
+# Most units of one product a cart may hold
+MAX_CART_QUANTITY = 10
+
+
+def cart_items_total(items):
+    """Sum quantity * stored effective price over a CartItem queryset in one query"""
+    total = items.aggregate(
+        total=models.Sum(
+            models.F('quantity') * models.F('product__effective_price'),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
+    )['total']
+    return total or Decimal('0.00')
+
+
 class Cart(models.Model):
     """User's shopping cart"""
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='cart')
@@ -350,15 +652,12 @@ class Cart(models.Model):
     @property
     def total_amount(self):
         """Calculate total cart amount"""
-        total = 0
-        for item in self.items.all():
-            total += item.subtotal
-        return total
+        return cart_items_total(self.items.all())
     
     @property
     def is_valid_for_checkout(self):
         """Check if cart can proceed to checkout"""
-        return all(item.is_available for item in self.items.all())
+        return all(item.is_available for item in self.items.select_related('product__category'))
 
 
 class CartItem(models.Model):
@@ -379,21 +678,22 @@ class CartItem(models.Model):
     @property
     def subtotal(self):
         """Calculate subtotal for this cart item (using discounted price)"""
-        return self.quantity * self.product.get_discounted_price()
+        return self.quantity * self.product.effective_price
     
     @property
     def is_available(self):
-        """Check if product is available for purchase"""
+        """Check if product is available for purchase (carts.line_annotations is the SQL version)"""
         return (
+            not self.product.is_deleted and
+            not self.product.is_blocked and
             self.product.status == 'published' and
             self.product.stock_quantity >= self.quantity and
-            not getattr(self.product.category, 'is_blocked', False)
+            self.product.category.is_visible
         )
     
     @property
     def max_quantity_allowed(self):
         """Maximum quantity that can be ordered"""
-        MAX_CART_QUANTITY = 10
         return min(self.product.stock_quantity, MAX_CART_QUANTITY)
     
     def clean(self):
@@ -414,11 +714,49 @@ class Wishlist(models.Model):
         return f"Wishlist for {self.user.email}"
 
 
+# How long a user's wishlisted product ids stay cached. Writes through
+# WishlistItem.objects.discard() and authenticate.wishlists drop the entry, so
+# this only bounds staleness on cache backends not shared between processes.
+WISHLIST_CACHE_SECONDS = 300
+
+
+def wishlist_cache_key(user_id):
+    return f'wishlist:product_ids:{user_id}'
+
+
+class WishlistItemQuerySet(models.QuerySet):
+    def product_ids(self, user_id):
+        """
+        Ids of the products on a user's wishlist as a frozenset, for marking
+        hearts on listing pages. Cached as a sorted tuple of ints.
+        """
+        key = wishlist_cache_key(user_id)
+        ids = cache.get(key)
+        if ids is None:
+            ids = tuple(sorted(self.filter(wishlist__user_id=user_id).values_list('product_id', flat=True)))
+            cache.set(key, ids, WISHLIST_CACHE_SECONDS)
+        return frozenset(ids)
+
+    def discard(self, user_id, product_ids):
+        """Take products off a user's wishlist in one DELETE; returns how many were removed"""
+        product_ids = list(product_ids)
+        if not product_ids:
+            return 0
+        deleted, _ = self.filter(wishlist__user_id=user_id, product_id__in=product_ids).delete()
+        if deleted:
+            cache.delete(wishlist_cache_key(user_id))
+        return deleted
+
+
 class WishlistItem(models.Model):
     """Individual items in wishlist"""
     wishlist = models.ForeignKey(Wishlist, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey('customeradmin.Product', on_delete=models.CASCADE)
+    # Effective price when the product was wishlisted, for the price-drop flag
+    price_at_add = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     added_at = models.DateTimeField(auto_now_add=True)
+
+    objects = WishlistItemQuerySet.as_manager()
     
     class Meta:
         unique_together = ('wishlist', 'product')
@@ -426,3 +764,80 @@ class WishlistItem(models.Model):
     
     def __str__(self):
         return f"{self.product.name} in {self.wishlist.user.email}'s wishlist"
+
+
+class RelatedProduct(models.Model):
+    """A precomputed neighbour of a product for its detail page, rebuilt by refresh_related_products"""
+    product = models.ForeignKey('customeradmin.Product', on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey('customeradmin.Product', on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['product', 'rank']
+        constraints = [
+            # Also the index the detail page reads a product's list through
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_related_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.related_id} is #{self.rank} related to {self.product_id}"
+
+
+class ProductDailyStats(models.Model):
+    """One product's storefront activity and sales on one day, the input to the popularity rollup"""
+    product = models.ForeignKey('customeradmin.Product', on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    impressions = models.PositiveIntegerField(default=0)
+    views = models.PositiveIntegerField(default=0)
+    cart_adds = models.PositiveIntegerField(default=0)
+    units_sold = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='unique_product_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} on {self.day}"
+
+
+class RollupState(models.Model):
+    """The last day a daily rollup job has folded in"""
+    name = models.CharField(max_length=50, unique=True)
+    day = models.DateField()
+
+    def __str__(self):
+        return f"{self.name} through {self.day}"
+
+
+class ActivityEvent(models.Model):
+    """
+    One storefront event, written in bulk by the authenticate.events flusher
+    and rolled up into ProductDailyStats
+    """
+    IMPRESSION = 1
+    VIEW = 2
+    CART_ADD = 3
+    KIND_CHOICES = [
+        (IMPRESSION, 'Listing impression'),
+        (VIEW, 'Product view'),
+        (CART_ADD, 'Add to cart'),
+    ]
+
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    # No FK constraint, so an event for a since-deleted product can't fail a whole batch
+    product = models.ForeignKey('customeradmin.Product', on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    quantity = models.PositiveIntegerField(default=1)
+    occurred_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['occurred_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} of {self.product_id} at {self.occurred_at}"
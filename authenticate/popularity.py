@@ -0,0 +1,104 @@
+"""
+Product popularity: the daily rollup that folds sales and storefront
+activity into Product.popularity as an exponentially decayed score.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import models, transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.utils import timezone
+
+from customeradmin.models import Product
+from .events import rollup_events
+from .models import OrderItem, ProductDailyStats, RollupState
+
+
+ROLLUP_NAME = 'popularity'
+
+# A day's activity counts half as much after this many days
+HALF_LIFE_DAYS = 7
+DECAY = 0.5 ** (1 / HALF_LIFE_DAYS)
+
+# What one unit sold, one add to cart and one view are worth
+WEIGHT_SALE = 10.0
+WEIGHT_CART_ADD = 2.0
+WEIGHT_VIEW = 0.1
+
+# Days of history folded in the first time the rollup runs
+BACKFILL_DAYS = 90
+
+# Orders that don't count as sales
+SALE_EXCLUDED_STATUSES = ('cancelled', 'refunded')
+
+# Products whose score is raised per UPDATE
+UPDATE_BATCH = 1000
+
+
+def record_sales(day):
+    """Set units_sold for every product sold on `day` from OrderItem, in one aggregate and one upsert"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    sold = (
+        OrderItem.objects.filter(
+            product_id__isnull=False,
+            order__created_at__gte=start,
+            order__created_at__lt=start + timedelta(days=1),
+        )
+        .exclude(order__status__in=SALE_EXCLUDED_STATUSES)
+        .values('product_id')
+        .annotate(units=Sum('quantity'))
+        .values_list('product_id', 'units')
+    )
+    ProductDailyStats.objects.bulk_create(
+        [ProductDailyStats(product_id=product_id, day=day, units_sold=units) for product_id, units in sold],
+        update_conflicts=True,
+        unique_fields=['product', 'day'],
+        update_fields=['units_sold'],
+        batch_size=UPDATE_BATCH,
+    )
+
+
+def fold_day(day):
+    """Decay every score by one day, then add `day`'s activity"""
+    Product.all_objects.filter(popularity__gt=0).update(popularity=F('popularity') * Value(DECAY))
+
+    gains = {}
+    rows = ProductDailyStats.objects.filter(day=day).values_list('product_id', 'units_sold', 'cart_adds', 'views')
+    for product_id, units_sold, cart_adds, views in rows:
+        gain = WEIGHT_SALE * units_sold + WEIGHT_CART_ADD * cart_adds + WEIGHT_VIEW * views
+        if gain:
+            gains[product_id] = gain
+
+    product_ids = list(gains)
+    for start in range(0, len(product_ids), UPDATE_BATCH):
+        batch = product_ids[start:start + UPDATE_BATCH]
+        Product.all_objects.filter(pk__in=batch).update(
+            popularity=F('popularity') + Case(
+                *[When(pk=pk, then=Value(gains[pk])) for pk in batch],
+                default=Value(0.0),
+                output_field=models.FloatField(),
+            )
+        )
+
+
+def rollup_popularity(through=None):
+    """
+    Roll up every complete day not yet done, through yesterday by default:
+    its events and sales into ProductDailyStats, then into Product.popularity.
+    Each day is its own transaction and advances the rollup state, so an
+    interrupted run picks up where it stopped and a repeated run does
+    nothing. Returns the days folded.
+    """
+    through = through or timezone.localdate() - timedelta(days=1)
+    folded = []
+    while True:
+        with transaction.atomic():
+            state = RollupState.objects.select_for_update().filter(name=ROLLUP_NAME).first()
+            day = state.day + timedelta(days=1) if state else through - timedelta(days=BACKFILL_DAYS - 1)
+            if day > through:
+                break
+            rollup_events(day)
+            record_sales(day)
+            fold_day(day)
+            RollupState.objects.update_or_create(name=ROLLUP_NAME, defaults={'day': day})
+        folded.append(day)
+    return folded
@@ -0,0 +1,180 @@
+"""Checkout quotes: one place that prices a cart, shared by the checkout page and order placement."""
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.utils import timezone
+
+from .models import Coupon, CouponUsage, Order
+
+
+CENTS = Decimal('0.01')
+
+# Session key holding the quote last shown on the checkout page
+SESSION_KEY = 'checkout_quote'
+
+# Active coupons are cached in-process for this long. Usage caps are enforced by
+# Coupon.objects.redeem() at placement, so a stale entry can't over-redeem.
+COUPON_CACHE_SECONDS = 60
+
+_coupon_cache = {'expires': 0.0, 'coupons': {}}
+
+
+@dataclass(frozen=True)
+class CouponTerms:
+    pk: int
+    code: str
+    description: str
+    discount_type: str
+    discount_value: Decimal
+    min_order: Decimal
+    valid_until: object
+    per_user_limit: object
+
+
+def active_coupons():
+    """Code -> CouponTerms for every active coupon, reloaded at most every COUPON_CACHE_SECONDS"""
+    now = time.monotonic()
+    if now >= _coupon_cache['expires']:
+        rows = Coupon.objects.active().values_list(
+            'pk', 'code', 'description', 'discount_type', 'discount_value', 'min_order', 'valid_until', 'per_user_limit'
+        )
+        _coupon_cache['coupons'] = {row[1]: CouponTerms(*row) for row in rows}
+        _coupon_cache['expires'] = now + COUPON_CACHE_SECONDS
+    return _coupon_cache['coupons']
+
+
+def clear_coupon_cache():
+    _coupon_cache['expires'] = 0.0
+
+
+@dataclass(frozen=True)
+class QuoteLine:
+    product_id: int
+    name: str
+    list_price: Decimal
+    unit_price: Decimal
+    quantity: int
+
+    @property
+    def line_total(self):
+        return self.unit_price * self.quantity
+
+
+@dataclass(frozen=True)
+class Quote:
+    lines: tuple
+    coupon_code: str
+    coupon_message: str
+    subtotal: Decimal
+    savings: Decimal
+    discount: Decimal
+    tax: Decimal
+    shipping: Decimal
+    total: Decimal
+    hash: str
+
+    @property
+    def quantities(self):
+        return {line.product_id: line.quantity for line in self.lines}
+
+    @property
+    def list_subtotal(self):
+        """Subtotal before markdowns: list_subtotal - savings - discount + tax + shipping == total"""
+        return self.subtotal + self.savings
+
+    def to_session(self):
+        """JSON-safe form for request.session"""
+        return {
+            'lines': [
+                [line.product_id, line.name, str(line.list_price), str(line.unit_price), line.quantity]
+                for line in self.lines
+            ],
+            'coupon_code': self.coupon_code,
+            'coupon_message': self.coupon_message,
+            'totals': [str(v) for v in (self.subtotal, self.savings, self.discount, self.tax, self.shipping, self.total)],
+            'hash': self.hash,
+        }
+
+    @classmethod
+    def from_session(cls, data):
+        lines = tuple(
+            QuoteLine(product_id, name, Decimal(list_price), Decimal(unit_price), quantity)
+            for product_id, name, list_price, unit_price, quantity in data['lines']
+        )
+        subtotal, savings, discount, tax, shipping, total = (Decimal(v) for v in data['totals'])
+        return cls(lines, data['coupon_code'], data['coupon_message'], subtotal, savings, discount, tax, shipping, total, data['hash'])
+
+
+def quote_hash(lines, coupon_code):
+    """Fingerprint of everything a quote depends on, including the coupon's terms and the pricing rules"""
+    coupon = active_coupons().get(coupon_code)
+    payload = {
+        'lines': [[line.product_id, str(line.list_price), str(line.unit_price), line.quantity] for line in lines],
+        'coupon': [coupon_code, coupon.discount_type, str(coupon.discount_value), str(coupon.min_order)] if coupon else coupon_code,
+        'rules': [str(Order.TAX_RATE), str(Order.SHIPPING_CHARGE), str(Order.FREE_SHIPPING_THRESHOLD)],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def coupon_discount(code, subtotal, user=None):
+    """Return (discount, message) for a coupon code against a subtotal; discount is 0 when it doesn't apply"""
+    if not code:
+        return Decimal('0.00'), ''
+    coupon = active_coupons().get(code)
+    if coupon is None or (coupon.valid_until and coupon.valid_until <= timezone.now()):
+        return Decimal('0.00'), 'Invalid coupon code'
+    if subtotal < coupon.min_order:
+        return Decimal('0.00'), f"Minimum order of ₹{coupon.min_order} required for this coupon"
+    if coupon.per_user_limit is not None and user is not None and user.is_authenticated:
+        used = CouponUsage.objects.filter(coupon_id=coupon.pk, user=user).values_list('times_used', flat=True).first() or 0
+        if used >= coupon.per_user_limit:
+            return Decimal('0.00'), 'You have already used this coupon'
+    if coupon.discount_type == 'percentage':
+        discount = subtotal * coupon.discount_value / 100
+    else:
+        discount = coupon.discount_value
+    return min(discount, subtotal).quantize(CENTS, ROUND_HALF_UP), coupon.description
+
+
+def build_quote(lines, coupon_code='', user=None):
+    coupon_code = (coupon_code or '').strip().upper()
+    subtotal = sum((line.line_total for line in lines), Decimal('0.00'))
+    savings = sum(((line.list_price - line.unit_price) * line.quantity for line in lines), Decimal('0.00'))
+    discount, message = coupon_discount(coupon_code, subtotal, user)
+    if not discount:
+        coupon_code = ''
+    tax = (subtotal * Order.TAX_RATE).quantize(CENTS, ROUND_HALF_UP)
+    shipping = Order.shipping_for(subtotal) if lines else Decimal('0.00')
+    total = subtotal - discount + tax + shipping
+    return Quote(
+        lines=tuple(lines),
+        coupon_code=coupon_code,
+        coupon_message=message,
+        subtotal=subtotal,
+        savings=max(savings, Decimal('0.00')),
+        discount=discount,
+        tax=tax,
+        shipping=shipping,
+        total=total,
+        hash=quote_hash(lines, coupon_code),
+    )
+
+
+def store_quote(session, quote):
+    session[SESSION_KEY] = quote.to_session()
+
+
+def current_quote(session, lines, coupon_code='', user=None):
+    """
+    The quote for these cart lines and coupon: the one cached in the session when
+    its hash still matches (so placement reuses exactly what checkout showed),
+    otherwise a freshly built one
+    """
+    coupon_code = (coupon_code or '').strip().upper()
+    cached = session.get(SESSION_KEY)
+    if cached and cached.get('hash') == quote_hash(lines, coupon_code):
+        return Quote.from_session(cached)
+    return build_quote(lines, coupon_code, user)
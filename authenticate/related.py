@@ -0,0 +1,184 @@
+"""
+Related products: scoring every visible product against the rest of the
+catalog offline, and reading a product's precomputed neighbours.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from customeradmin.models import Product, ProductImage, visible_category
+from .models import OrderItem, RelatedProduct
+
+
+# Neighbours stored per product; the detail page shows the first few still visible
+NEIGHBOURS = 8
+
+# Score weights. Co-purchase is scaled to 0..1 over the catalog and price
+# proximity is 1 at equal prices, falling off with the log price ratio.
+WEIGHT_COPURCHASE = 3.0
+WEIGHT_CATEGORY = 1.0
+WEIGHT_BRAND = 0.5
+WEIGHT_PRICE = 1.0
+PRICE_SCALE = 0.5
+
+# Orders that count as purchases for co-purchase
+PURCHASE_EXCLUDED_STATUSES = ('cancelled', 'refunded')
+
+# Products scored per block; each block holds a BLOCK_SIZE x catalog float32 matrix
+BLOCK_SIZE = 512
+
+
+def _codes(values):
+    """Integer codes for a list of labels, with blank labels as -1 so they never match"""
+    lookup = {}
+    return np.array(
+        [lookup.setdefault(value, len(lookup)) if value else -1 for value in values],
+        dtype=np.int64,
+    )
+
+
+def copurchase_counts(index):
+    """
+    How many orders each pair of catalog products was bought together in,
+    as parallel (rows, cols, counts) arrays sorted by row, where `index`
+    maps product id -> catalog position
+    """
+    items = (
+        OrderItem.objects.filter(product_id__in=list(index))
+        .exclude(order__status__in=PURCHASE_EXCLUDED_STATUSES)
+        .values_list('order_id', 'product_id')
+        .distinct()
+        .order_by('order_id')
+    )
+    pairs = np.array(list(items.iterator(chunk_size=5000)), dtype=np.int64).reshape(-1, 2)
+    empty = np.empty(0, dtype=np.int64)
+    if not len(pairs):
+        return empty, empty, empty
+
+    orders = pairs[:, 0]
+    positions = np.array([index[pk] for pk in pairs[:, 1].tolist()], dtype=np.int64)
+
+    # Every (item, other item) combination inside each order, without a Python loop per order
+    starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+    sizes = np.diff(np.r_[starts, len(orders)])
+    per_item = np.repeat(sizes, sizes)
+    left = np.repeat(np.arange(len(orders)), per_item)
+    first = np.repeat(np.repeat(starts, sizes), per_item)
+    offset = np.arange(len(left)) - np.repeat(np.cumsum(per_item) - per_item, per_item)
+    right = first + offset
+    keep = left != right
+
+    n = len(index)
+    keys, counts = np.unique(positions[left[keep]] * n + positions[right[keep]], return_counts=True)
+    return keys // n, keys % n, counts
+
+
+def compute_neighbours(neighbours=NEIGHBOURS):
+    """
+    Score every customer-visible product against every other one and return
+    {product_id: [(related_id, score), ...]} best first
+    """
+    catalog = list(
+        Product.customer_visible.order_by('pk').values_list('pk', 'category_id', 'brand', 'effective_price')
+    )
+    if len(catalog) < 2:
+        return {}
+
+    ids = np.array([row[0] for row in catalog], dtype=np.int64)
+    categories = np.array([row[1] for row in catalog], dtype=np.int64)
+    brands = _codes([(row[2] or '').strip().lower() for row in catalog])
+    log_prices = np.log(np.maximum(np.array([float(row[3]) for row in catalog]), 1.0))
+    index = {int(pk): position for position, pk in enumerate(ids)}
+
+    rows, cols, counts = copurchase_counts(index)
+    copurchase = np.log1p(counts) / np.log1p(counts.max()) if len(counts) else counts.astype(np.float64)
+
+    n = len(ids)
+    k = min(neighbours, n - 1)
+    result = {}
+    for start in range(0, n, BLOCK_SIZE):
+        stop = min(start + BLOCK_SIZE, n)
+        block = slice(start, stop)
+
+        scores = WEIGHT_CATEGORY * (categories[block, None] == categories[None, :])
+        scores = scores + WEIGHT_BRAND * ((brands[block, None] == brands[None, :]) & (brands[block, None] >= 0))
+        scores = scores + WEIGHT_PRICE * np.exp(-np.abs(log_prices[block, None] - log_prices[None, :]) / PRICE_SCALE)
+        scores = scores.astype(np.float32)
+
+        lo, hi = np.searchsorted(rows, [start, stop])
+        np.add.at(scores, (rows[lo:hi] - start, cols[lo:hi]), WEIGHT_COPURCHASE * copurchase[lo:hi])
+
+        # A product is never its own neighbour
+        scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        for offset in range(stop - start):
+            result[int(ids[start + offset])] = [
+                (int(ids[col]), float(score)) for col, score in zip(top[offset], top_scores[offset])
+            ]
+    return result
+
+
+def refresh_related_products(neighbours=NEIGHBOURS, batch_size=2000):
+    """Recompute every product's neighbour list and replace the stored ones; returns rows written"""
+    lists = compute_neighbours(neighbours)
+    entries = [
+        RelatedProduct(product_id=product_id, related_id=related_id, rank=rank, score=score)
+        for product_id, related in lists.items()
+        for rank, (related_id, score) in enumerate(related)
+    ]
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        RelatedProduct.objects.bulk_create(entries, batch_size=batch_size)
+    return len(entries)
+
+
+def _main_image(product_ref):
+    return Subquery(
+        ProductImage.objects.filter(product=OuterRef(product_ref))
+        .order_by('-is_primary', 'order', 'created_at')
+        .values('image')[:1]
+    )
+
+
+def related_products(product, limit=4):
+    """
+    A product's precomputed neighbours that are still visible, best first, in
+    one query through the (product, rank) index, each with main_image_url set.
+
+    Products added since the last refresh fall back to others in their category.
+    """
+    entries = list(
+        RelatedProduct.objects.filter(
+            visible_category('related__'),
+            product=product,
+            related__is_deleted=False,
+            related__is_blocked=False,
+            related__status='published',
+        )
+        .select_related('related')
+        .annotate(main_image=_main_image('related_id'))
+        .order_by('rank')[:limit]
+    )
+    if entries:
+        products = []
+        for entry in entries:
+            entry.related.main_image = entry.main_image
+            products.append(entry.related)
+    else:
+        products = list(
+            Product.customer_visible.filter(category_id=product.category_id)
+            .exclude(pk=product.pk)
+            .annotate(main_image=_main_image('pk'))
+            .order_by('-created_at')[:limit]
+        )
+
+    storage = ProductImage._meta.get_field('image').storage
+    for related in products:
+        related.main_image_url = storage.url(related.main_image) if related.main_image else None
+    return products
@@ -1,7 +1,13 @@
 from allauth.socialaccount.signals import pre_social_login
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 
+from .carts import merge_session_cart
+from .models import Coupon
+from .pricing import clear_coupon_cache
+
 User = get_user_model()
 
 @receiver(pre_social_login)
@@ -17,3 +23,17 @@ def link_to_existing_user(sender, request, sociallogin, **kwargs):
             sociallogin.connect(request, user)
         except User.DoesNotExist:
             pass
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def refresh_coupon_cache(sender, **kwargs):
+    """Staff edits take effect in this process immediately; other processes pick them up within the cache TTL"""
+    clear_coupon_cache()
+
+
+@receiver(user_logged_in)
+def merge_anonymous_cart(sender, request, user, **kwargs):
+    """Carry what a visitor put in their cart before logging in over to their saved cart"""
+    if request is not None and hasattr(request, 'session'):
+        merge_session_cart(request.session, user)
@@ -1,3 +1,656 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+
+from customeradmin.models import Category, Product, ProductEvent, ProductImage
+from .alerts import AlertDispatcher, claim_events, coalesce_events, current_alerts
+from . import events
+from .api import SORTS, encode_cursor
+from .carts import evaluate_cart
+from .inventory import claim
+from .popularity import BACKFILL_DAYS, DECAY, ROLLUP_NAME, rollup_popularity
+from .pricing import clear_coupon_cache
+from .related import related_products
+from .wishlists import add_products, evaluate_wishlist, remove_products
+from .models import (
+    ORDER_PREVIEW_ITEMS, ActivityEvent, Cart, CartItem, Coupon, CouponUsage, CustomUser, Order, OrderItem,
+    ProductDailyStats, RelatedProduct, RollupState, UserAddress, Wishlist, WishlistItem,
+)
+
+
+def make_user(index=0):
+    return CustomUser.objects.create_user(
+        f'shopper{index}@example.com', 'password',
+        first_name='Test', last_name='Shopper', phone_number=f'98765{index:05d}', is_active=True,
+    )
+
+
+def make_product(category, index=0, **kwargs):
+    fields = {
+        'name': f'Product {index}',
+        'sku': f'SKU-{index}',
+        'price': Decimal('100.00'),
+        'stock_quantity': 10,
+        'status': 'published',
+        'category': category,
+    }
+    fields.update(kwargs)
+    return Product.objects.create(**fields)
+
+
+def make_address(user):
+    return UserAddress.objects.create(
+        user=user, full_name='Test Shopper', phone_number='9876543210', address_line_1='1 Main Road',
+        city='Kochi', state='Kerala', postal_code='682001', country='India',
+    )
+
+
+def run_concurrently(target, count):
+    """Call target(index) from `count` threads released together; returns their results"""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(index):
+        try:
+            barrier.wait()
+            results[index] = target(index)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentClaimTests(TransactionTestCase):
+    """Checkouts racing for the same product can't oversell it"""
+
+    THREADS = 8
+
+    def test_claims_never_oversell(self):
+        product = make_product(Category.objects.create(name='Sofa'), stock_quantity=5, low_stock_threshold=1)
+        users = [make_user(index) for index in range(self.THREADS)]
+
+        results = run_concurrently(lambda index: claim(users[index], {product.pk: 2}), self.THREADS)
+
+        product.refresh_from_db()
+        claimed = sum(results)
+        self.assertGreaterEqual(product.stock_quantity, 0)
+        self.assertEqual(product.stock_quantity, 5 - 2 * claimed)
+        self.assertEqual(claimed, 2)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentCouponRedeemTests(TransactionTestCase):
+    """Checkouts racing for a coupon's last use can't both get it"""
+
+    THREADS = 8
+
+    def test_last_use_is_redeemed_once(self):
+        coupon = Coupon.objects.create(code='LASTONE', discount_value=Decimal('10'), usage_limit=5, times_used=4)
+        users = [make_user(index) for index in range(self.THREADS)]
+
+        results = run_concurrently(lambda index: Coupon.objects.redeem('LASTONE', users[index]), self.THREADS)
+
+        coupon.refresh_from_db()
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(coupon.times_used, coupon.usage_limit)
+        self.assertEqual(CouponUsage.objects.filter(coupon=coupon, times_used__gt=0).count(), 1)
+
+
+class CartQueryCountTests(TestCase):
+    """Cart, checkout and order placement cost the same number of queries however many lines the cart has"""
+
+    LINES = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user()
+        cls.address = make_address(cls.user)
+        category = Category.objects.create(name='Sofa')
+        cls.cart = Cart.objects.create(user=cls.user)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cls.cart, product=make_product(category, index), quantity=2)
+            for index in range(cls.LINES)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_evaluate_cart(self):
+        with self.assertNumQueries(1):
+            evaluation = evaluate_cart(self.cart)
+            self.assertEqual(len(evaluation.available_items), self.LINES)
+            self.assertEqual(evaluation.total_amount, Decimal('200.00') * self.LINES)
+            self.assertEqual(len(evaluation.quote_lines), self.LINES)
+
+    def test_cart_view(self):
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse('cart'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cart_items']), self.LINES)
+
+    def test_checkout_view(self):
+        with self.assertNumQueries(15):
+            response = self.client.get(reverse('checkout'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cart_items']), self.LINES)
+
+    def test_place_order_view(self):
+        self.client.get(reverse('checkout'))
+        with self.assertNumQueries(22):
+            response = self.client.post(reverse('place_order'), {'address': self.address.pk})
+        order = Order.objects.get(user=self.user)
+        self.assertRedirects(response, reverse('order_success', args=[order.order_number]), fetch_redirect_response=False)
+        self.assertEqual(order.items.count(), self.LINES)
+
+
+class OrderHistoryQueryCountTests(TestCase):
+    """The order history and profile pages cost the same number of queries however many orders and items there are"""
+
+    ORDERS = 30
+    ITEMS = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user()
+        make_address(cls.user)
+        for _ in range(cls.ORDERS):
+            order = Order.objects.create(user=cls.user, total_amount=Decimal('600.00'))
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_name=f'Product {index}', product_price=Decimal('100.00'),
+                          quantity=1, total_price=Decimal('100.00'))
+                for index in range(cls.ITEMS)
+            ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assertPreviews(self, orders):
+        for order in orders:
+            self.assertEqual(len(order.preview_items), ORDER_PREVIEW_ITEMS)
+            self.assertEqual(order.more_item_count, self.ITEMS - ORDER_PREVIEW_ITEMS)
+
+    def test_order_history(self):
+        with self.assertNumQueries(8):
+            response = self.client.get(reverse('user_orders'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['orders']), 10)
+        self.assertPreviews(response.context['orders'])
+
+    def test_order_history_later_page(self):
+        with self.assertNumQueries(8):
+            response = self.client.get(reverse('user_orders'), {'page': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertPreviews(response.context['orders'])
+
+    def test_profile(self):
+        with self.assertNumQueries(10):
+            response = self.client.get(reverse('user_profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['recent_orders']), 5)
+        self.assertEqual(response.context['order_count'], self.ORDERS)
+        self.assertPreviews(response.context['recent_orders'])
+
+
+class OrderBreakdownTests(TestCase):
+    """The breakdown stored on a placed order adds up to its total"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user()
+        cls.address = make_address(cls.user)
+        category = Category.objects.create(name='Sofa')
+        cart = Cart.objects.create(user=cls.user)
+        CartItem.objects.create(cart=cart, quantity=2, product=make_product(
+            category, 0, price=Decimal('400.00'), discount_type='percentage', discount_value=Decimal('10')))
+        CartItem.objects.create(cart=cart, quantity=1, product=make_product(category, 1, price=Decimal('99.99')))
+        Coupon.objects.create(code='TENOFF', discount_type='percentage', discount_value=Decimal('10'))
+
+    def setUp(self):
+        clear_coupon_cache()
+        self.client.force_login(self.user)
+
+    def place_order(self, coupon_code=''):
+        self.client.get(reverse('checkout'))
+        self.client.post(reverse('place_order'), {'address': self.address.pk, 'coupon_code': coupon_code})
+        return Order.objects.get(user=self.user)
+
+    def assertAddsUp(self, order):
+        self.assertEqual(
+            order.subtotal - order.discount_amount + order.tax_amount + order.shipping_charge, order.total_amount
+        )
+
+    def test_marked_down_product(self):
+        order = self.place_order()
+        self.assertEqual(order.subtotal, Decimal('899.99'))
+        self.assertEqual(order.discount_amount, Decimal('80.00'))
+        self.assertAddsUp(order)
+
+    def test_marked_down_product_with_coupon(self):
+        order = self.place_order('TENOFF')
+        self.assertEqual(order.coupon_code, 'TENOFF')
+        self.assertEqual(order.discount_amount, Decimal('80.00') + Decimal('82.00'))
+        self.assertAddsUp(order)
+
+
+class ProductAlertTests(TestCase):
+    """Price-drop and restock events reach each watching shopper once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Sofa')
+
+    def test_coalesce_restock_outranks_price_drop(self):
+        events = [
+            (1, 7, ProductEvent.PRICE_DROP, Decimal('500.00')),
+            (2, 7, ProductEvent.BACK_IN_STOCK, Decimal('450.00')),
+            (3, 7, ProductEvent.PRICE_DROP, Decimal('400.00')),
+            (4, 8, ProductEvent.PRICE_DROP, Decimal('300.00')),
+            (5, 8, ProductEvent.PRICE_DROP, Decimal('250.00')),
+        ]
+        self.assertEqual(coalesce_events(events), {
+            7: (ProductEvent.BACK_IN_STOCK, Decimal('500.00')),
+            8: (ProductEvent.PRICE_DROP, Decimal('300.00')),
+        })
+
+    def test_current_alerts_skip_reversed_drops_and_unavailable_products(self):
+        dropped = make_product(self.category, 0, price=Decimal('80.00'))
+        reversed_drop = make_product(self.category, 1, price=Decimal('100.00'))
+        sold_out = make_product(self.category, 2, stock_quantity=0)
+        restocked = make_product(self.category, 3)
+        alerts = current_alerts({
+            dropped.pk: (ProductEvent.PRICE_DROP, Decimal('100.00')),
+            reversed_drop.pk: (ProductEvent.PRICE_DROP, Decimal('100.00')),
+            sold_out.pk: (ProductEvent.BACK_IN_STOCK, None),
+            restocked.pk: (ProductEvent.BACK_IN_STOCK, None),
+        })
+        self.assertEqual(alerts, {
+            dropped.pk: (ProductEvent.PRICE_DROP, 'Product 0', Decimal('100.00'), Decimal('80.00')),
+            restocked.pk: (ProductEvent.BACK_IN_STOCK, 'Product 3', None, Decimal('100.00')),
+        })
+
+    def test_claim_events_marks_them_processed_oldest_first(self):
+        product = make_product(self.category)
+        events = ProductEvent.objects.bulk_create([
+            ProductEvent(product=product, kind=ProductEvent.PRICE_DROP, old_price=Decimal('100.00'))
+            for _ in range(3)
+        ])
+        first = claim_events(2)
+        self.assertEqual([pk for pk, *_ in first], [events[0].pk, events[1].pk])
+        self.assertEqual(ProductEvent.objects.filter(processed_at__isnull=True).count(), 1)
+        self.assertEqual([pk for pk, *_ in claim_events(2)], [events[2].pk])
+        self.assertEqual(claim_events(2), [])
+
+    def test_one_email_per_shopper_across_wishlist_and_cart(self):
+        dropped = make_product(self.category, 0, price=Decimal('500.00'))
+        restocked = make_product(self.category, 1, stock_quantity=0, low_stock_threshold=1)
+        both, wisher, inactive = make_user(0), make_user(1), make_user(2)
+        CustomUser.objects.filter(pk=inactive.pk).update(is_active=False)
+        for user, wished, carted in ((both, [dropped, restocked], [dropped]), (wisher, [restocked], []),
+                                     (inactive, [dropped], [])):
+            wishlist = Wishlist.objects.create(user=user)
+            WishlistItem.objects.bulk_create([WishlistItem(wishlist=wishlist, product=product) for product in wished])
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=1) for product in carted])
+
+        dropped.price = Decimal('400.00')
+        dropped.save()
+        restocked.stock_quantity = 5
+        restocked.save()
+        self.assertEqual(ProductEvent.objects.count(), 2)
+
+        dispatcher = AlertDispatcher()
+        dispatcher.run()
+
+        self.assertEqual((dispatcher.events, dispatcher.products, dispatcher.sent), (2, 2, 2))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [both.email, wisher.email])
+        combined = next(message for message in mail.outbox if message.to == [both.email])
+        self.assertEqual(combined.body.count('\n- '), 2)
+        self.assertIn('Product 0 is now ₹400.00 (was ₹500.00)', combined.body)
+        self.assertFalse(ProductEvent.objects.filter(processed_at__isnull=True).exists())
+
+
+class RelatedProductsTests(TestCase):
+    """The detail page reads a product's precomputed neighbours in one query"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Sofa')
+        cls.products = [make_product(category, index) for index in range(6)]
+
+    def test_reads_visible_neighbours_in_rank_order(self):
+        product, *others = self.products
+        for rank, related in enumerate([others[3], others[1], others[0], others[2]]):
+            RelatedProduct.objects.create(product=product, related=related, rank=rank, score=10 - rank)
+        Product.objects.filter(pk=others[1].pk).update(is_blocked=True)
+        ProductImage.objects.create(product=others[0], image='products/photo.jpg')
+
+        with self.assertNumQueries(1):
+            related = related_products(product, limit=3)
+        self.assertEqual([p.pk for p in related], [others[3].pk, others[0].pk, others[2].pk])
+        self.assertEqual(related[1].main_image_url, ProductImage._meta.get_field('image').storage.url('products/photo.jpg'))
+        self.assertIsNone(related[0].main_image_url)
+
+    def test_falls_back_to_category_before_first_refresh(self):
+        product = self.products[0]
+        with self.assertNumQueries(2):
+            related = related_products(product)
+        self.assertEqual(len(related), 4)
+        self.assertNotIn(product.pk, [p.pk for p in related])
+
+
+def noon(day):
+    return timezone.make_aware(datetime(day.year, day.month, day.day, 12))
+
+
+class PopularityRollupTests(TestCase):
+    """The daily rollup decays scores and folds each finished day in exactly once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Sofa')
+        cls.old_favourite = make_product(category, 0)
+        cls.newcomer = make_product(category, 1)
+        cls.day = timezone.localdate() - timedelta(days=1)
+
+    def add_events(self, day, kind, count=1, quantity=1):
+        ActivityEvent.objects.bulk_create([
+            ActivityEvent(kind=kind, product=self.newcomer, quantity=quantity, occurred_at=noon(day))
+            for _ in range(count)
+        ])
+
+    def test_decay_and_fold(self):
+        Product.all_objects.filter(pk=self.old_favourite.pk).update(popularity=100.0)
+        RollupState.objects.create(name=ROLLUP_NAME, day=self.day - timedelta(days=1))
+        self.add_events(self.day, ActivityEvent.VIEW, count=2)
+        self.add_events(self.day, ActivityEvent.CART_ADD, quantity=3)
+        order = Order.objects.create(user=make_user(), total_amount=Decimal('100.00'))
+        OrderItem.objects.create(order=order, product=self.newcomer, product_name='Product 1',
+                                 product_price=Decimal('100.00'), quantity=2, total_price=Decimal('200.00'))
+        Order.objects.filter(pk=order.pk).update(created_at=noon(self.day))
+
+        self.assertEqual(rollup_popularity(), [self.day])
+
+        stats = ProductDailyStats.objects.get(product=self.newcomer, day=self.day)
+        self.assertEqual((stats.views, stats.cart_adds, stats.units_sold), (2, 3, 2))
+        self.old_favourite.refresh_from_db()
+        self.newcomer.refresh_from_db()
+        self.assertAlmostEqual(self.old_favourite.popularity, 100.0 * DECAY)
+        self.assertAlmostEqual(self.newcomer.popularity, 2 * 0.1 + 3 * 2.0 + 2 * 10.0)
+
+        # A repeated run has nothing left to fold
+        self.assertEqual(rollup_popularity(), [])
+        self.newcomer.refresh_from_db()
+        self.assertAlmostEqual(self.newcomer.popularity, 2 * 0.1 + 3 * 2.0 + 2 * 10.0)
+
+    def test_first_run_backfills_window(self):
+        first = self.day - timedelta(days=BACKFILL_DAYS - 1)
+        self.add_events(first, ActivityEvent.VIEW)
+        self.add_events(first - timedelta(days=1), ActivityEvent.VIEW)
+
+        days = rollup_popularity()
+
+        self.assertEqual((len(days), days[0], days[-1]), (BACKFILL_DAYS, first, self.day))
+        self.assertEqual(list(ProductDailyStats.objects.values_list('day', flat=True)), [first])
+        self.assertEqual(RollupState.objects.get(name=ROLLUP_NAME).day, self.day)
+        self.newcomer.refresh_from_db()
+        self.assertAlmostEqual(self.newcomer.popularity, 0.1 * DECAY ** (BACKFILL_DAYS - 1))
+
+    def test_purge_keeps_days_inside_keep_days(self):
+        RollupState.objects.create(name=ROLLUP_NAME, day=self.day)
+        for days_ago in range(4):
+            self.add_events(self.day - timedelta(days=days_ago), ActivityEvent.VIEW)
+
+        call_command('rollup_popularity', keep_days=2, stdout=StringIO())
+
+        kept = sorted(timezone.localdate(occurred_at) for occurred_at in
+                      ActivityEvent.objects.values_list('occurred_at', flat=True))
+        self.assertEqual(kept, [self.day - timedelta(days=1), self.day])
+
+
+class EventBufferTests(TestCase):
+    """Storefront events are buffered in memory and written out in bulk"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Sofa')
+        cls.products = [make_product(category, index) for index in range(2)]
+
+    def make_buffer(self, **kwargs):
+        # The flusher thread is started but never wakes up during a test
+        buffer = events.EventBuffer(flush_seconds=3600, **kwargs)
+        self.addCleanup(buffer.stop)
+        return buffer
+
+    def test_flush_writes_buffered_events_in_batches(self):
+        buffer = self.make_buffer()
+        first, second = self.products
+        for kind, product, quantity in ((ActivityEvent.VIEW, first, 1), (ActivityEvent.CART_ADD, first, 3),
+                                        (ActivityEvent.IMPRESSION, second, 1)) * 2:
+            buffer.push(kind, product.pk, quantity)
+
+        with mock.patch.object(events, 'WRITE_BATCH', 4), CaptureQueriesContext(connection) as queries:
+            self.assertEqual(buffer.flush(), 6)
+        self.assertEqual(sum(query['sql'].startswith('INSERT') for query in queries.captured_queries), 2)
+
+        self.assertEqual(buffer.written, 6)
+        self.assertEqual(sorted(ActivityEvent.objects.values_list('kind', 'product_id', 'quantity')), sorted([
+            (ActivityEvent.IMPRESSION, second.pk, 1), (ActivityEvent.IMPRESSION, second.pk, 1),
+            (ActivityEvent.VIEW, first.pk, 1), (ActivityEvent.VIEW, first.pk, 1),
+            (ActivityEvent.CART_ADD, first.pk, 3), (ActivityEvent.CART_ADD, first.pk, 3),
+        ]))
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_full_buffer_drops_and_counts(self):
+        buffer = self.make_buffer(capacity=2)
+        results = [buffer.push(ActivityEvent.VIEW, self.products[0].pk) for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(buffer.dropped, 1)
+        self.assertEqual(buffer.flush(), 2)
+
+    def test_failed_write_is_counted(self):
+        buffer = self.make_buffer()
+        buffer.push(ActivityEvent.VIEW, self.products[0].pk)
+        with mock.patch.object(ActivityEvent.objects, 'bulk_create', side_effect=DatabaseError('down')), \
+                self.assertLogs('authenticate.events', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual((buffer.failed, buffer.written), (1, 0))
+        self.assertFalse(ActivityEvent.objects.exists())
+
+    def test_first_push_registers_flush_at_exit(self):
+        buffer = self.make_buffer()
+        with mock.patch.object(events.atexit, 'register') as register:
+            buffer.push(ActivityEvent.VIEW, self.products[0].pk)
+            buffer.push(ActivityEvent.VIEW, self.products[0].pk)
+        register.assert_called_once_with(buffer.flush)
+
+
+class EventFlusherThreadTests(TransactionTestCase):
+    """The background flusher writes on its own and closes its connection between flushes"""
+
+    def test_flusher_writes_and_closes_its_connection(self):
+        product = make_product(Category.objects.create(name='Sofa'))
+        buffer = events.EventBuffer(flush_seconds=0.01)
+        with mock.patch.object(events, 'connection', wraps=connection) as flusher_connection:
+            buffer.push(ActivityEvent.VIEW, product.pk)
+            deadline = time.monotonic() + 5
+            while buffer.written < 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            buffer.stop()
+        self.assertEqual(buffer.written, 1)
+        self.assertTrue(flusher_connection.close.called)
+        self.assertEqual(list(ActivityEvent.objects.values_list('kind', 'product_id')), [(ActivityEvent.VIEW, product.pk)])
+
+
+class CatalogApiTests(TestCase):
+    """The JSON catalog API pages through every sort without gaps or repeats"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Sofa')
+        now = timezone.now()
+        for index in range(13):
+            product = make_product(category, index, name=['Alpha', 'Beta', 'Gamma'][index % 3],
+                                   price=[Decimal('100.00'), Decimal('200.00')][index % 2])
+            # Several products share each sort value, so pages break inside ties
+            Product.all_objects.filter(pk=product.pk).update(
+                created_at=now - timedelta(hours=index % 3), popularity=[0.0, 5.0, 5.5][index % 3],
+            )
+        cls.hidden = make_product(category, 99)
+        Product.all_objects.filter(pk=cls.hidden.pk).update(is_blocked=True)
+
+    def page_through(self, sort, limit=4):
+        ids, cursor = [], ''
+        while True:
+            response = self.client.get(reverse('api_product_list'), {'sort': sort, 'limit': limit, 'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertLessEqual(len(data['results']), limit)
+            ids += [row['id'] for row in data['results']]
+            cursor = data['next_cursor']
+            if not cursor:
+                return ids
+
+    def test_every_sort_pages_through_ties(self):
+        rows = list(Product.customer_visible.values_list('pk', 'created_at', 'effective_price', 'popularity', 'name'))
+        columns = {'created_at': 1, 'effective_price': 2, 'popularity': 3, 'name': 4}
+        for sort, (field, descending) in SORTS.items():
+            with self.subTest(sort=sort):
+                expected = [row[0] for row in sorted(rows, key=lambda row: (row[columns[field]], row[0]), reverse=descending)]
+                self.assertEqual(self.page_through(sort), expected)
+
+    def test_cursor_from_another_sort_is_rejected(self):
+        cursor = self.client.get(reverse('api_product_list'), {'sort': 'name', 'limit': 2}).json()['next_cursor']
+        response = self.client.get(reverse('api_product_list'), {'sort': 'newest', 'cursor': cursor})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'success': False, 'error': 'Cursor belongs to a different sort'})
+
+    def test_tampered_cursor_is_rejected(self):
+        for sort, cursor in (
+            ('newest', 'not-base64!'),
+            ('newest', encode_cursor('newest', 'yesterday', 1)),
+            ('price_low', encode_cursor('price_low', '1.00', 'x')),
+            ('popularity', encode_cursor('popularity', None, 1)),
+        ):
+            with self.subTest(sort=sort, cursor=cursor):
+                response = self.client.get(reverse('api_product_list'), {'sort': sort, 'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'success': False, 'error': 'Invalid cursor'})
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse('api_product_list'), {'fields': 'id,cost_price,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'success': False, 'error': 'Unknown fields: cost_price, secret'})
+
+    def test_sparse_fields(self):
+        response = self.client.get(reverse('api_product_list'), {'fields': 'id,name', 'limit': 1})
+        self.assertEqual(list(response.json()['results'][0]), ['id', 'name'])
+
+    def test_batch_keeps_requested_order(self):
+        ids = list(Product.customer_visible.order_by('pk').values_list('pk', flat=True)[:3])
+        requested = [ids[2], self.hidden.pk, ids[0], 999999, ids[1], ids[0]]
+        response = self.client.get(reverse('api_product_batch'), {
+            'ids': ','.join(map(str, requested)), 'fields': 'id,name',
+        })
+        data = response.json()
+        self.assertEqual([row['id'] for row in data['results']], [ids[2], ids[0], ids[1]])
+        self.assertEqual(data['missing'], [self.hidden.pk, 999999])
+
+
+class WishlistTests(TestCase):
+    """Bulk wishlist edits, one-query evaluation and the cached product ids"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user()
+        category = Category.objects.create(name='Sofa')
+        cls.products = [make_product(category, index) for index in range(4)]
+        cls.hidden = make_product(category, 99, is_blocked=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, *indexes):
+        return [self.products[index].pk for index in indexes]
+
+    def test_add_products_in_bulk(self):
+        Wishlist.objects.create(user=self.user)
+        with self.assertNumQueries(4):
+            added, failed = add_products(self.user, self.ids(0, 1, 0) + [self.hidden.pk])
+        self.assertEqual(added, self.ids(0, 1))
+        self.assertEqual(failed, [(self.hidden.pk, 'This product is not available')])
+
+        # Products already there keep the price they were added at
+        Product.all_objects.filter(pk=self.products[0].pk).update(effective_price=Decimal('50.00'))
+        added, _ = add_products(self.user, self.ids(0, 2))
+        self.assertEqual(added, self.ids(2))
+        self.assertEqual(
+            WishlistItem.objects.get(product=self.products[0]).price_at_add, Decimal('100.00')
+        )
+
+    def test_remove_products(self):
+        add_products(self.user, self.ids(0, 1, 2))
+        self.assertEqual(remove_products(self.user, self.ids(0, 2, 3)), 2)
+        self.assertEqual(WishlistItem.objects.product_ids(self.user.pk), frozenset(self.ids(1)))
+        self.assertEqual(remove_products(self.user, []), 0)
+
+    def test_evaluate_wishlist_in_one_query(self):
+        add_products(self.user, self.ids(0, 1, 2))
+        Product.all_objects.filter(pk=self.products[0].pk).update(effective_price=Decimal('80.00'))
+        Product.all_objects.filter(pk=self.products[1].pk).update(stock_quantity=0)
+        with self.assertNumQueries(1):
+            evaluation = evaluate_wishlist(self.user)
+            by_product = {item.product_id: item for item in evaluation.items}
+            self.assertEqual(by_product[self.products[2].pk].product.category.name, 'Sofa')
+        self.assertEqual(evaluation.total_items, 3)
+        self.assertEqual([item.product_id for item in evaluation.price_drops], self.ids(0))
+        self.assertEqual([item.product_id for item in evaluation.unavailable_items], self.ids(1))
+
+    def test_product_ids_are_cached_and_invalidated(self):
+        add_products(self.user, self.ids(0, 1))
+        self.assertEqual(WishlistItem.objects.product_ids(self.user.pk), frozenset(self.ids(0, 1)))
+        with self.assertNumQueries(0):
+            self.assertEqual(WishlistItem.objects.product_ids(self.user.pk), frozenset(self.ids(0, 1)))
+
+        add_products(self.user, self.ids(2))
+        self.assertEqual(WishlistItem.objects.product_ids(self.user.pk), frozenset(self.ids(0, 1, 2)))
+
+        WishlistItem.objects.discard(self.user.pk, self.ids(1))
+        self.assertEqual(WishlistItem.objects.product_ids(self.user.pk), frozenset(self.ids(0, 2)))
+
+        # Discarding nothing leaves the cached ids in place
+        WishlistItem.objects.discard(self.user.pk, self.ids(3))
+        with self.assertNumQueries(0):
+            WishlistItem.objects.product_ids(self.user.pk)
+
+    def test_bulk_update_view(self):
+        self.client.force_login(self.user)
+        add_products(self.user, self.ids(0))
+        response = self.client.post(
+            reverse('bulk_wishlist_update'),
+            json.dumps({'add': self.ids(1, 2) + [self.hidden.pk], 'remove': self.ids(0)}),
+            content_type='application/json',
+        )
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual((data['added'], data['removed'], data['wishlist_count']), (self.ids(1, 2), 1, 2))
+        self.assertEqual(data['failed'], [{'product_id': self.hidden.pk, 'error': 'This product is not available'}])
+        self.assertEqual(WishlistItem.objects.product_ids(self.user.pk), frozenset(self.ids(1, 2)))
@@ -1,6 +1,6 @@
 from django.urls import path
 from django.contrib.auth.views import LogoutView
-from . import views
+from . import api, views
 from django.contrib.auth import views as auth_views
 
 urlpatterns = [
@@ -38,17 +38,20 @@ urlpatterns = [
     path('cart/', views.cart_view, name='cart'),
     path('cart/add/<int:product_id>/', views.add_to_cart_view, name='add_to_cart'),
     path('cart/update-quantity/', views.update_cart_quantity_view, name='update_cart_quantity'),
+    path('cart/bulk-update/', views.bulk_cart_update_view, name='bulk_cart_update'),
     path('cart/remove/<int:cart_item_id>/', views.remove_from_cart_view, name='remove_from_cart'),
     path('cart/clear/', views.clear_cart_view, name='clear_cart'),
     path('cart/count/', views.cart_item_count_view, name='cart_item_count'),
     
-    # Wishlist URLs (uncomment if implemented)
-    # path('wishlist/', views.wishlist_view, name='wishlist'),
-    # path('wishlist/add/<int:product_id>/', views.add_to_wishlist_view, name='add_to_wishlist'),
-    # path('wishlist/remove/<int:product_id>/', views.remove_from_wishlist_view, name='remove_from_wishlist'),
+    # Wishlist URLs
+    path('wishlist/', views.wishlist_view, name='wishlist'),
+    path('wishlist/add/<int:product_id>/', views.add_to_wishlist_view, name='add_to_wishlist'),
+    path('wishlist/remove/<int:product_id>/', views.remove_from_wishlist_view, name='remove_from_wishlist'),
+    path('wishlist/bulk-update/', views.bulk_wishlist_update_view, name='bulk_wishlist_update'),
     
     # Checkout and Order URLs
     path('checkout/', views.checkout_view, name='checkout'),
+    path('checkout/quote/', views.checkout_quote_view, name='checkout_quote'),
     path('place-order/', views.place_order_view, name='place_order'),
     path('order-success/<str:order_id>/', views.order_success_view, name='order_success'),
     
@@ -59,4 +62,12 @@ urlpatterns = [
     path('orders/<str:order_id>/cancel-item/<int:item_id>/', views.cancel_order_view, name='cancel_order_item'),
     path('orders/<str:order_id>/return/', views.return_order_view, name='return_order'),
     path('orders/<str:order_id>/invoice/', views.download_invoice_view, name='download_invoice'),
+    
+    # Read-only catalog API
+    path('api/products/', api.product_list_api, name='api_product_list'),
+    path('api/products/batch/', api.product_batch_api, name='api_product_batch'),
+    path('api/categories/', api.category_list_api, name='api_category_list'),
+
+    # Carrier tracking updates
+    path('shipments/carrier-webhook/', views.carrier_webhook_view, name='carrier_webhook'),
 ]
\ No newline at end of file
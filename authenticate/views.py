@@ -3,13 +3,15 @@ from django.contrib import messages
 from django.http import HttpResponse, JsonResponse 
 from django.http import HttpResponse
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph  
-from reportlab.lib.styles import getSampleStyleSheet  
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet  
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
 from django.db.models import Q
-from .models import Order, OrderItem, OrderStatusHistory, CustomUser, UserAddress, Cart, CartItem, Wishlist, WishlistItem
+from .models import MAX_CART_QUANTITY, ActivityEvent, Coupon, Order, OrderItem, OrderStatusHistory, CustomUser, UserAddress, Cart, CartItem, Wishlist, WishlistItem
 from .forms import OrderCancellationForm, OrderReturnForm, SignUpForm, OTPForm, NewPasswordForm, LoginForm, ForgotPasswordForm, UserProfileForm, EmailChangeForm, PasswordChangeForm, UserAddressForm
-from customeradmin.models import Product, Category, ProductImage
+from customeradmin.models import Product, Category, ProductImage, category_facets
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from io import BytesIO
@@ -20,13 +22,22 @@ from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
-from django.views.decorators.csrf import ensure_csrf_cookie, csrf_protect
+from django.views.decorators.csrf import ensure_csrf_cookie, csrf_protect, csrf_exempt
 from django.core.paginator import Paginator
 from django.db.models import Sum
 from decimal import Decimal
 from .utils import generate_otp, send_otp_email
 from django.contrib.auth import update_session_auth_hash
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import require_http_methods, require_POST
+from .shipments import TrackingIngestor, parse_event
+from .carts import SESSION_CART_KEY, apply_operations, apply_session_operations, evaluate_cart, evaluate_session_cart, parse_operations, session_cart
+from .inventory import claim, reserve
+from .pricing import SESSION_KEY as QUOTE_SESSION_KEY, build_quote, current_quote, store_quote
+from .events import track
+from .related import related_products as get_related_products
+from .wishlists import add_products, evaluate_wishlist, remove_products, wishlisted_ids
+import hmac
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -374,13 +385,11 @@ def send_test_email(request):
 @cache_control(no_cache=True, must_revalidate=True, no_store=True) 
 def home_view(request):
     try:
-        featured_products = Product.objects.filter(
-            status__iexact='published',
+        featured_products = Product.customer_visible.filter(
             stock_quantity__gt=0
-        ).select_related().prefetch_related('images')[:8]
+        ).select_related().prefetch_related('images').order_by('-popularity')[:8]
         
-        latest_products = Product.objects.filter(
-            status__iexact='published',
+        latest_products = Product.customer_visible.filter(
             stock_quantity__gt=0
         ).select_related().prefetch_related('images').order_by('-created_at')[:8]
         
@@ -404,9 +413,7 @@ def dummy_home_view(request):
         total_products = Product.objects.count()
         published_products = Product.objects.filter(status='published').count()
         
-        products = Product.objects.filter(
-            status='published'
-        ).select_related().prefetch_related('images')
+        products = Product.customer_visible.select_related().prefetch_related('images')
         
         search_query = request.GET.get('search', '').strip()
         category_filter = request.GET.get('category')
@@ -419,7 +426,7 @@ def dummy_home_view(request):
             products = products.filter(name__icontains=search_query)
         
         if category_filter and category_filter != 'all':
-            products = products.filter(category__iexact=category_filter)
+            products = products.filter(category__slug=category_filter.lower())
         
         if brand_filter and brand_filter != 'all':
             products = products.filter(brand__icontains=brand_filter)
@@ -427,38 +434,38 @@ def dummy_home_view(request):
         if min_price:
             try:
                 min_price_float = float(min_price)
-                products = products.filter(price__gte=min_price_float)
+                products = products.filter(effective_price__gte=min_price_float)
             except (ValueError, TypeError):
                 pass
         
         if max_price:
             try:
                 max_price_float = float(max_price)
-                products = products.filter(price__lte=max_price_float)
+                products = products.filter(effective_price__lte=max_price_float)
             except (ValueError, TypeError):
                 pass
         
         sort_options = {
-            'price_low': 'price',
-            'price_high': '-price',
+            'price_low': 'effective_price',
+            'price_high': '-effective_price',
             'name_az': 'name',
             'name_za': '-name',
-            'popularity': '-created_at',
-            'featured': '-created_at',
+            'popularity': '-popularity',
+            'featured': '-popularity',
             'newest': '-created_at',
         }
         
         if sort_by in sort_options:
-            products = products.order_by(sort_options[sort_by])
+            products = products.order_by(sort_options[sort_by], '-pk')
         else:
             products = products.order_by('-created_at')
         
         paginator = Paginator(products, 8)
         page_number = request.GET.get('page')
         page_obj = paginator.get_page(page_number)
+        track(ActivityEvent.IMPRESSION, [product.pk for product in page_obj])
         
-        all_published = Product.objects.filter(status='published')
-        available_categories = list(all_published.values_list('category', flat=True).distinct())
+        all_published = Product.customer_visible.all()
         available_brands = list(all_published.exclude(brand__iexact='').values_list('brand', flat=True).distinct())
         
         featured_products = products[:4]
@@ -467,9 +474,8 @@ def dummy_home_view(request):
             'page_obj': page_obj,
             'products': page_obj,
             'featured_products': featured_products,
-            'available_categories': available_categories,
             'available_brands': available_brands,
-            'category_choices': getattr(Product, 'CATEGORY_CHOICES', []),
+            'category_facets': category_facets(),
             'search_query': search_query,
             'current_category': category_filter,
             'current_brand': brand_filter,
@@ -477,6 +483,7 @@ def dummy_home_view(request):
             'min_price': min_price,
             'max_price': max_price,
             'total_products': paginator.count,
+            'wishlisted_ids': wishlisted_ids(request.user),
         }
         
         return render(request, 'dummy.html', context)
@@ -487,9 +494,8 @@ def dummy_home_view(request):
             'page_obj': None,
             'products': [],
             'featured_products': [],
-            'available_categories': [],
             'available_brands': [],
-            'category_choices': [],
+            'category_facets': [],
             'search_query': request.GET.get('search', ''),
             'current_category': request.GET.get('category'),
             'current_brand': request.GET.get('brand'),
@@ -506,9 +512,7 @@ def product_list_view(request):
         total_products = Product.objects.count()
         published_products = Product.objects.filter(status='published').count()
         
-        products = Product.objects.filter(
-            status='published'
-        ).select_related().prefetch_related('images')
+        products = Product.customer_visible.select_related().prefetch_related('images')
         
         search_query = request.GET.get('search', '').strip()
         category_filter = request.GET.get('category')
@@ -521,7 +525,7 @@ def product_list_view(request):
             products = products.filter(name__icontains=search_query)
         
         if category_filter and category_filter != 'all':
-            products = products.filter(category__iexact=category_filter)
+            products = products.filter(category__slug=category_filter.lower())
         
         if brand_filter and brand_filter != 'all':
             products = products.filter(brand__icontains=brand_filter)
@@ -529,45 +533,44 @@ def product_list_view(request):
         if min_price:
             try:
                 min_price_float = float(min_price)
-                products = products.filter(price__gte=min_price_float)
+                products = products.filter(effective_price__gte=min_price_float)
             except (ValueError, TypeError):
                 pass
         
         if max_price:
             try:
                 max_price_float = float(max_price)
-                products = products.filter(price__lte=max_price_float)
+                products = products.filter(effective_price__lte=max_price_float)
             except (ValueError, TypeError):
                 pass
         
         sort_options = {
-            'price_low': 'price',
-            'price_high': '-price',
+            'price_low': 'effective_price',
+            'price_high': '-effective_price',
             'name_az': 'name',
             'name_za': '-name',
-            'popularity': '-created_at',
-            'featured': '-created_at',
+            'popularity': '-popularity',
+            'featured': '-popularity',
             'newest': '-created_at',
         }
         
         if sort_by in sort_options:
-            products = products.order_by(sort_options[sort_by])
+            products = products.order_by(sort_options[sort_by], '-pk')
         else:
             products = products.order_by('-created_at')
         
         paginator = Paginator(products, 12)
         page_number = request.GET.get('page')
         page_obj = paginator.get_page(page_number)
+        track(ActivityEvent.IMPRESSION, [product.pk for product in page_obj])
         
-        all_published = Product.objects.filter(status='published')
-        available_categories = all_published.values_list('category', flat=True).distinct()
+        all_published = Product.customer_visible.all()
         available_brands = all_published.exclude(brand__iexact='').values_list('brand', flat=True).distinct()
         
         context = {
             'page_obj': page_obj,
-            'available_categories': available_categories,
             'available_brands': available_brands,
-            'category_choices': getattr(Product, 'CATEGORY_CHOICES', []),
+            'category_facets': category_facets(),
             'search_query': search_query,
             'current_category': category_filter,
             'current_brand': brand_filter,
@@ -575,6 +578,7 @@ def product_list_view(request):
             'min_price': min_price,
             'max_price': max_price,
             'total_products': paginator.count,
+            'wishlisted_ids': wishlisted_ids(request.user),
         }
         
         return render(request, 'product_list.html', context)
@@ -583,9 +587,8 @@ def product_list_view(request):
         messages.error(request, f'Error loading products: {str(e)}')
         context = {
             'page_obj': None,
-            'available_categories': [],
             'available_brands': [],
-            'category_choices': [],
+            'category_facets': [],
             'search_query': request.GET.get('search', ''),
             'current_category': request.GET.get('category'),
             'current_brand': request.GET.get('brand'),
@@ -601,9 +604,9 @@ def product_detail_view(request, pk):
     try:
         logger.info(f"Loading product detail for pk: {pk}")
         
-        product = get_object_or_404(Product, pk=pk)
+        product = get_object_or_404(Product.objects.select_related('category'), pk=pk)
         
-        if product.status != 'published':
+        if product.status != 'published' or not product.category.is_visible:
             messages.error(request, 'This product is no longer available.')
             return redirect('product_list')
         
@@ -627,33 +630,17 @@ def product_detail_view(request, pk):
             {'name': 'Home', 'url_name': 'home'},
             {'name': 'Products', 'url_name': 'product_list'},
             {
-                'name': product.get_category_display() if hasattr(product, 'get_category_display') else str(product.category), 
+                'name': product.category.name, 
                 'url_name': 'product_list', 
-                'category': product.category
+                'category': product.category.slug
             },
             {'name': product.name, 'url_name': None}
         ]
         
         original_price = product.price
-        discounted_price = original_price
-        discount_amount = 0
-        final_price = original_price
-        
-        try:
-            if hasattr(product, 'get_discounted_price'):
-                discounted_price = product.get_discounted_price()
-                discount_amount = original_price - discounted_price if discounted_price != original_price else 0
-        except Exception as e:
-            logger.warning(f"Error calculating discounted price: {e}")
-        
-        try:
-            if hasattr(product, 'get_final_price_with_tax'):
-                final_price = product.get_final_price_with_tax()
-            else:
-                final_price = discounted_price
-        except Exception as e:
-            logger.warning(f"Error calculating final price: {e}")
-            final_price = discounted_price
+        discounted_price = product.effective_price
+        discount_amount = original_price - discounted_price if discounted_price != original_price else 0
+        final_price = product.final_price
         
         stock_status = 'in_stock'
         try:
@@ -666,10 +653,7 @@ def product_detail_view(request, pk):
             logger.warning(f"Error determining stock status: {e}")
         
         try:
-            related_products = Product.objects.filter(
-                category=product.category,
-                status='published'
-            ).exclude(pk=product.pk)[:4]
+            related_products = get_related_products(product)
         except Exception as e:
             logger.warning(f"Error getting related products: {e}")
             related_products = []
@@ -679,7 +663,7 @@ def product_detail_view(request, pk):
             if hasattr(product, 'detailed_description') and product.detailed_description:
                 specs = [
                     {'name': 'Brand', 'value': getattr(product, 'brand', 'Not specified') or 'Not specified'},
-                    {'name': 'Category', 'value': product.get_category_display() if hasattr(product, 'get_category_display') else str(product.category)},
+                    {'name': 'Category', 'value': product.category.name},
                     {'name': 'SKU', 'value': getattr(product, 'sku', 'N/A')},
                 ]
         except Exception as e:
@@ -697,8 +681,11 @@ def product_detail_view(request, pk):
             'stock_status': stock_status,
             'related_products': related_products,
             'specs': specs,
+            'in_wishlist': product.pk in wishlisted_ids(request.user),
         }
         
+        track(ActivityEvent.VIEW, [product.pk])
+        
         logger.info(f"Successfully loaded product: {product.name}")
         return render(request, 'product_detail.html', context)
         
@@ -718,12 +705,15 @@ def user_profile_view(request):
     try:
         user = CustomUser.objects.get(pk=request.user.pk)
         addresses = user.addresses.all()
+        recent_orders = user.orders.order_by('-created_at', '-id').with_item_summary()[:5]
         
         print(f"Profile view - User: {user.email}, Profile image: {user.profile_image}")
         
         context = {
             'user': user,
             'addresses': addresses,
+            'recent_orders': recent_orders,
+            'order_count': user.orders.count(),
         }
         return render(request, 'profile/user_profile.html', context)
         
@@ -1065,9 +1055,17 @@ def user_orders_view(request):
     orders = Order.objects.filter(user=request.user)
     if query:
         orders = orders.filter(Q(order_number__icontains=query) | Q(status__icontains=query))
-    orders = orders.order_by('-created_at')
+    orders = orders.order_by('-created_at', '-id').with_item_summary()
+    
+    paginator = Paginator(orders, 10)
+    page_obj = paginator.get_page(request.GET.get('page'))
     
-    context = {'orders': orders, 'query': query}
+    context = {
+        'orders': page_obj,
+        'page_obj': page_obj,
+        'page_range': paginator.get_elided_page_range(page_obj.number),
+        'query': query,
+    }
     return render(request, 'profile/user_orders.html', context)
 
 @login_required
@@ -1111,13 +1109,6 @@ def cancel_order_view(request, order_id, item_id=None):
                     messages.error(request, "Unable to cancel this item.")
             else:  # Cancel entire order
                 if order.cancel_order(reason=full_reason, cancelled_by=request.user.email):
-                    OrderStatusHistory.objects.create(
-                        order=order, 
-                        old_status=order.status, 
-                        new_status='cancelled', 
-                        changed_by=request.user.email,
-                        notes=full_reason
-                    )
                     messages.success(request, "Order cancelled successfully. Stock updated.")
                 else:
                     messages.error(request, "Unable to cancel this order.")
@@ -1133,16 +1124,18 @@ def cancel_order_view(request, order_id, item_id=None):
 '''Cart management '''
 # CART MANAGEMENT VIEWS
 
-@login_required
 def add_to_cart_view(request, product_id):
     """Add product to cart or increase quantity"""
     if request.method != 'POST':
         return JsonResponse({'success': False, 'message': 'Invalid request method'})
+
+    if not request.user.is_authenticated:
+        return add_to_session_cart(request, product_id)
     
     try:
         with transaction.atomic():
             # Get product and validate availability
-            product = get_object_or_404(Product, id=product_id)
+            product = get_object_or_404(Product.objects.select_related('category'), id=product_id)
             
             # Check if product or category is blocked/unlisted
             if product.status != 'published':
@@ -1151,13 +1144,11 @@ def add_to_cart_view(request, product_id):
                     'message': 'This product is no longer available'
                 })
             
-            # Check if category is blocked (assuming you have this field)
-            if hasattr(product, 'category') and hasattr(product.category, 'is_blocked'):
-                if product.category.is_blocked:
-                    return JsonResponse({
-                        'success': False, 
-                        'message': 'This product category is currently unavailable'
-                    })
+            if not product.category.is_visible:
+                return JsonResponse({
+                    'success': False, 
+                    'message': 'This product category is currently unavailable'
+                })
             
             # Check stock availability
             if product.stock_quantity <= 0:
@@ -1183,7 +1174,6 @@ def add_to_cart_view(request, product_id):
             new_quantity = cart_item.quantity + quantity
             
             # Validate maximum quantity constraints
-            MAX_CART_QUANTITY = 10  # Configurable limit per product
             max_allowed = min(product.stock_quantity, MAX_CART_QUANTITY)
             
             if new_quantity > max_allowed:
@@ -1197,15 +1187,8 @@ def add_to_cart_view(request, product_id):
             cart_item.save()
             
             # Remove from wishlist if it exists
-            try:
-                wishlist = Wishlist.objects.get(user=request.user)
-                WishlistItem.objects.filter(
-                    wishlist=wishlist, 
-                    product=product
-                ).delete()
-                removed_from_wishlist = True
-            except Wishlist.DoesNotExist:
-                removed_from_wishlist = False
+            removed_from_wishlist = bool(WishlistItem.objects.discard(request.user.pk, [product.pk]))
+            track(ActivityEvent.CART_ADD, [product.pk], quantity)
             
             # Prepare response data
             response_data = {
@@ -1236,51 +1219,57 @@ def add_to_cart_view(request, product_id):
             'message': 'An error occurred while adding to cart'
         })
 
-@login_required
+def add_to_session_cart(request, product_id):
+    """add_to_cart_view for anonymous visitors, whose cart lives in the session"""
+    try:
+        quantity = int(request.POST.get('quantity', 1))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Invalid quantity specified'})
+
+    changed, failed = apply_session_operations(request.session, [('add', product_id, quantity)])
+    if failed:
+        return JsonResponse({'success': False, 'message': failed[0][1]})
+
+    if changed:
+        track(ActivityEvent.CART_ADD, [product_id], quantity)
+
+    evaluation = evaluate_session_cart(request.session)
+    item = next((i for i in evaluation.items if i.product_id == product_id), None)
+    return JsonResponse({
+        'success': True,
+        'message': f'Added {item.product.name} to cart' if item else 'Cart unchanged',
+        'cart_total_items': evaluation.total_items,
+        'cart_total_amount': float(evaluation.total_amount),
+        'item_quantity': item.quantity if item else 0,
+        'item_subtotal': float(item.line_total) if item else 0.0,
+        'removed_from_wishlist': False
+    })
+
 @cache_control(no_cache=True, must_revalidate=True, no_store=True) 
 def cart_view(request):
     """Display user's shopping cart"""
     try:
-        cart = Cart.objects.get(user=request.user)
-        cart_items = cart.items.select_related('product').prefetch_related('product__images')
-        
-        # Check for any out-of-stock or unavailable items
-        unavailable_items = []
-        available_items = []
-        
-        for item in cart_items:
-            if not item.is_available:
-                unavailable_items.append(item)
-            else:
-                available_items.append(item)
-        
-        context = {
-            'cart': cart,
-            'cart_items': cart_items,
-            'available_items': available_items,
-            'unavailable_items': unavailable_items,
-            'total_amount': cart.total_amount,
-            'total_items': cart.total_items,
-            'can_checkout': cart.is_valid_for_checkout,
-        }
-        
-        return render(request, 'cart/cart.html', context)
-        
-    except Cart.DoesNotExist:
-        # Create empty cart
-        cart = Cart.objects.create(user=request.user)
+        if request.user.is_authenticated:
+            cart, created = Cart.objects.get_or_create(user=request.user)
+            evaluation = evaluate_cart(cart)
+        else:
+            # Anonymous visitors get a session cart; it joins their saved cart when they log in
+            cart = None
+            evaluation = evaluate_session_cart(request.session)
+
         context = {
             'cart': cart,
-            'cart_items': [],
-            'available_items': [],
-            'unavailable_items': [],
-            'total_amount': 0,
-            'total_items': 0,
-            'can_checkout': False,
+            'cart_items': evaluation.items,
+            'available_items': evaluation.available_items,
+            'unavailable_items': evaluation.unavailable_items,
+            'total_amount': evaluation.total_amount,
+            'total_items': evaluation.total_items,
+            'can_checkout': evaluation.can_checkout,
         }
         return render(request, 'cart/cart.html', context)
-    
+
     except Exception as e:
+        logger.error(f"Error in cart_view: {str(e)}")
         messages.error(request, 'Error loading cart')
         return redirect('dummy_home')
 
@@ -1328,6 +1317,65 @@ def update_cart_quantity_view(request):
     except Exception as e:
         return JsonResponse({'success': False, 'message': 'Error updating quantity'})
 
+@require_POST
+def bulk_cart_update_view(request):
+    """
+    Apply a list of cart operations in one request:
+    {"operations": [{"op": "set" | "add" | "remove", "product_id": 1, "quantity": 2}, ...],
+     "from_wishlist": true}   # optional: add one of every wishlist product
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+        operations = parse_operations(payload.get('operations') or [])
+    except (ValueError, AttributeError) as e:
+        return JsonResponse({'success': False, 'message': f'Invalid request data: {e}'})
+
+    if not request.user.is_authenticated:
+        return bulk_session_cart_update(request, operations)
+
+    cart, created = Cart.objects.get_or_create(user=request.user)
+    if payload.get('from_wishlist'):
+        wishlist_products = WishlistItem.objects.filter(wishlist__user=request.user).values_list('product_id', flat=True)
+        operations += [('add', product_id, 1) for product_id in wishlist_products]
+    if not operations:
+        return JsonResponse({'success': False, 'message': 'Nothing to update'})
+
+    try:
+        changed, failed = apply_operations(cart, operations)
+    except Exception as e:
+        logger.error(f"Error in bulk cart update: {str(e)}")
+        return JsonResponse({'success': False, 'message': 'Error updating cart'})
+
+    return cart_update_response(evaluate_cart(cart), changed, failed)
+
+def cart_update_response(evaluation, changed, failed):
+    """The bulk cart update reply: changed lines, failures and the new cart summary"""
+    return JsonResponse({
+        'success': True,
+        'message': f'Updated {len(changed)} cart items' if changed else 'Cart unchanged',
+        'items': [
+            {
+                'cart_item_id': item.pk,
+                'product_id': item.product_id,
+                'quantity': item.quantity,
+                'item_subtotal': float(item.line_total),
+                'max_quantity': item.max_quantity,
+            }
+            for item in evaluation.items if item.product_id in changed
+        ],
+        'removed': [product_id for product_id, quantity in changed.items() if quantity == 0],
+        'failed': [{'product_id': product_id, 'error': reason} for product_id, reason in failed],
+        'cart_total_items': evaluation.total_items,
+        'cart_total_amount': float(evaluation.total_amount),
+    })
+
+def bulk_session_cart_update(request, operations):
+    """bulk_cart_update_view for anonymous visitors"""
+    if not operations:
+        return JsonResponse({'success': False, 'message': 'Nothing to update'})
+    changed, failed = apply_session_operations(request.session, operations)
+    return cart_update_response(evaluate_session_cart(request.session), changed, failed)
+
 @login_required
 def remove_from_cart_view(request, cart_item_id):
     """Remove item from cart"""
@@ -1361,12 +1409,16 @@ def remove_from_cart_view(request, cart_item_id):
         messages.error(request, 'Error removing item from cart')
         return redirect('cart')
 
-@login_required
 def clear_cart_view(request):
     """Clear all items from cart"""
     if request.method != 'POST':
         messages.error(request, 'Invalid request method')
         return redirect('cart')
+
+    if not request.user.is_authenticated:
+        request.session.pop(SESSION_CART_KEY, None)
+        messages.success(request, 'Cart cleared successfully')
+        return redirect('cart')
     
     try:
         cart = Cart.objects.get(user=request.user)
@@ -1380,69 +1432,97 @@ def clear_cart_view(request):
     
     return redirect('cart')
 
-@login_required
 def cart_item_count_view(request):
     """Get cart item count for header display"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'success': True, 'count': sum(session_cart(request.session).values()), 'wishlist_count': 0})
+    wishlist_count = len(wishlisted_ids(request.user))
     try:
         cart = Cart.objects.get(user=request.user)
         return JsonResponse({
             'success': True,
-            'count': cart.total_items
+            'count': cart.total_items,
+            'wishlist_count': wishlist_count
         })
     except Cart.DoesNotExist:
         return JsonResponse({
             'success': True,
-            'count': 0
+            'count': 0,
+            'wishlist_count': wishlist_count
         })
 
 # WISHLIST VIEWS
 
-# @login_required
-# @cache_control(no_cache=True, must_revalidate=True, no_store=True) 
-# def wishlist_view(request):
-#     """Display user's wishlist"""
-#     try:
-#         wishlist = Wishlist.objects.get(user=request.user)
-#         wishlist_items = wishlist.items.select_related('product').prefetch_related('product__images')
-        
-#         # Check for any unavailable items (e.g., unpublished or out-of-stock)
-#         unavailable_items = []
-#         available_items = []
-        
-#         for item in wishlist_items:
-#             if item.product.status != 'published' or item.product.stock_quantity <= 0:
-#                 unavailable_items.append(item)
-#             else:
-#                 available_items.append(item)
-        
-#         context = {
-#             'wishlist': wishlist,
-#             'wishlist_items': wishlist_items,
-#             'available_items': available_items,
-#             'unavailable_items': unavailable_items,
-#             'total_items': wishlist.items.count(),
-#         }
-        
-#         return render(request, 'wishlist/wishlist.html', context)
-        
-#     except Wishlist.DoesNotExist:
-#         # Create empty wishlist if none exists
-#         wishlist = Wishlist.objects.create(user=request.user)
-#         context = {
-#             'wishlist': wishlist,
-#             'wishlist_items': [],
-#             'available_items': [],
-#             'unavailable_items': [],
-#             'total_items': 0,
-#         }
-#         return render(request, 'wishlist/wishlist.html', context)
-    
-#     except Exception as e:
-#         logger.error(f"Error loading wishlist: {str(e)}")
-#         messages.error(request, 'Error loading wishlist')
-#         return redirect('dummy_home')
+@login_required
+@cache_control(no_cache=True, must_revalidate=True, no_store=True) 
+def wishlist_view(request):
+    """Display user's wishlist"""
+    try:
+        evaluation = evaluate_wishlist(request.user)
+        context = {
+            'wishlist_items': evaluation.items,
+            'available_items': evaluation.available_items,
+            'unavailable_items': evaluation.unavailable_items,
+            'price_drops': evaluation.price_drops,
+            'total_items': evaluation.total_items,
+        }
+        return render(request, 'wishlist.html', context)
+    except Exception as e:
+        logger.error(f"Error loading wishlist: {str(e)}")
+        messages.error(request, 'Error loading wishlist')
+        return redirect('product_list')
 
+@login_required
+@require_POST
+def add_to_wishlist_view(request, product_id):
+    """Add one product to the wishlist"""
+    added, failed = add_products(request.user, [product_id])
+    if failed:
+        return JsonResponse({'success': False, 'message': failed[0][1]})
+    return JsonResponse({
+        'success': True,
+        'message': 'Added to wishlist' if added else 'Already in your wishlist',
+        'wishlist_count': len(wishlisted_ids(request.user)),
+    })
 
+@login_required
+@require_POST
+def remove_from_wishlist_view(request, product_id):
+    """Remove one product from the wishlist"""
+    removed = remove_products(request.user, [product_id])
+    return JsonResponse({
+        'success': True,
+        'message': 'Removed from wishlist' if removed else 'Not in your wishlist',
+        'wishlist_count': len(wishlisted_ids(request.user)),
+    })
+
+@login_required
+@require_POST
+def bulk_wishlist_update_view(request):
+    """
+    Add and remove several wishlist products in one request:
+    {"add": [1, 2], "remove": [3]}
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+        to_add = [int(pk) for pk in payload.get('add') or []]
+        to_remove = [int(pk) for pk in payload.get('remove') or []]
+    except (ValueError, TypeError, AttributeError) as e:
+        return JsonResponse({'success': False, 'message': f'Invalid request data: {e}'})
+
+    if not to_add and not to_remove:
+        return JsonResponse({'success': False, 'message': 'Nothing to update'})
+
+    added, failed = add_products(request.user, to_add) if to_add else ([], [])
+    removed = remove_products(request.user, to_remove)
+    return JsonResponse({
+        'success': True,
+        'message': f'Added {len(added)}, removed {removed} wishlist items',
+        'added': added,
+        'removed': removed,
+        'failed': [{'product_id': product_id, 'error': reason} for product_id, reason in failed],
+        'wishlist_count': len(wishlisted_ids(request.user)),
+    })
 
 
 @login_required
@@ -1453,9 +1533,9 @@ def checkout_view(request):
     """
     try:
         cart = Cart.objects.get(user=request.user)
-        cart_items = cart.items.filter(product__status='published', product__stock_quantity__gt=0)
+        evaluation = evaluate_cart(cart)
 
-        if not cart_items.exists():
+        if not evaluation.available_items:
             messages.error(request, "Your cart is empty or contains only unavailable items. Cannot proceed to checkout.")
             return redirect('cart')
 
@@ -1464,22 +1544,25 @@ def checkout_view(request):
             messages.info(request, "Please add a shipping address before proceeding to checkout.")
             return redirect('add_address')
 
-        # Calculate order summary (consistent with HTML: 18% tax)
-        subtotal = sum(item.subtotal for item in cart_items)
-        taxes = subtotal * Decimal('0.18')  # 18% tax as per HTML
-        shipping = Decimal('50.00') if subtotal < 1000 else Decimal('0.00')  # Example: Free shipping over 1000
-        discount = Decimal('0.00')  # Placeholder; actual discount applied in place_order
+        # The page renders from the same quote place_order_view will charge
+        quote = build_quote(evaluation.quote_lines, user=request.user)
+        store_quote(request.session, quote)
 
-        grand_total = subtotal + taxes + shipping - discount
+        # Hold the cart's quantities while the customer checks out
+        shortfalls = reserve(request.user, quote.quantities)
+        if shortfalls:
+            names = ', '.join(line.name for line in quote.lines if line.product_id in shortfalls)
+            messages.error(request, f"Not enough stock left for: {names}. Please update your cart.")
+            return redirect('cart')
 
         context = {
             'addresses': addresses,
-            'cart_items': cart_items,
-            'subtotal': subtotal,
-            'taxes': taxes,
-            'shipping': shipping,
-            'discount': discount,
-            'grand_total': grand_total,
+            'cart_items': evaluation.available_items,
+            'subtotal': quote.subtotal,
+            'taxes': quote.tax,
+            'shipping': quote.shipping,
+            'discount': quote.discount,
+            'grand_total': quote.total,
             'user': request.user,
         }
         return render(request, 'store/checkout.html', context)
@@ -1491,6 +1574,36 @@ def checkout_view(request):
         messages.error(request, "An unexpected error occurred.")
         return redirect('cart')
 
+@login_required
+@require_POST
+def checkout_quote_view(request):
+    """
+    Re-price the checkout with a coupon and remember the quote for place_order_view.
+    """
+    try:
+        cart = Cart.objects.get(user=request.user)
+    except Cart.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Your cart was not found.'}, status=404)
+
+    lines = evaluate_cart(cart).quote_lines
+    if not lines:
+        return JsonResponse({'success': False, 'error': 'Your cart is empty or items are out of stock.'}, status=400)
+
+    quote = build_quote(lines, request.POST.get('coupon_code'), request.user)
+    store_quote(request.session, quote)
+    return JsonResponse({
+        'success': True,
+        'quote': {
+            'coupon_code': quote.coupon_code,
+            'coupon_message': quote.coupon_message,
+            'subtotal': str(quote.subtotal),
+            'discount': str(quote.discount),
+            'tax': str(quote.tax),
+            'shipping': str(quote.shipping),
+            'total': str(quote.total),
+        },
+    })
+
 @login_required
 @transaction.atomic
 def place_order_view(request):
@@ -1502,9 +1615,9 @@ def place_order_view(request):
 
     try:
         cart = Cart.objects.get(user=request.user)
-        cart_items = cart.items.filter(product__status='published', product__stock_quantity__gt=0)
+        lines = evaluate_cart(cart).quote_lines
         
-        if not cart_items.exists():
+        if not lines:
             messages.error(request, "Your cart is empty or items are out of stock.")
             return redirect('cart')
         
@@ -1515,55 +1628,51 @@ def place_order_view(request):
             
         shipping_address = UserAddress.objects.get(id=address_id, user=request.user)
 
-        # Recalculate total to ensure price integrity (server-side validation)
-        subtotal = sum(item.subtotal for item in cart_items)
-        taxes = subtotal * Decimal('0.18')  # Consistent 18% tax
-        shipping = Decimal('50.00') if subtotal < 1000 else Decimal('0.00')
-        
-        # Server-side coupon validation (matching client-side predefined coupons)
-        coupon_code = request.POST.get('coupon_code', '').strip().upper()
-        discount = Decimal('0.00')
-        coupons = {
-            'SAVE10': {'discount': 0.10, 'minOrder': 500},
-            'FLAT50': {'discount': 50, 'minOrder': 1000},
-            'FIRSTORDER': {'discount': 0.15, 'minOrder': 300}
-        }
-        
-        if coupon_code in coupons:
-            coupon = coupons[coupon_code]
-            if subtotal >= coupon['minOrder']:
-                if coupon['discount'] < 1:  # Percentage
-                    discount = subtotal * Decimal(coupon['discount'])
-                else:  # Flat
-                    discount = Decimal(coupon['discount'])
-        
-        grand_total = subtotal + taxes + shipping - discount
+        # Reuse the quote shown at checkout when nothing it depends on has changed
+        quote = current_quote(request.session, lines, request.POST.get('coupon_code'), request.user)
+
+        # Take the stock before anything is written; this fails rather than overselling
+        if not claim(request.user, quote.quantities):
+            messages.error(request, "Some items in your cart are no longer available in the quantity you chose.")
+            return redirect('cart')
+
+        # Claim the coupon use the same way; the last use can only go to one order
+        if quote.coupon_code and not Coupon.objects.redeem(quote.coupon_code, request.user):
+            transaction.set_rollback(True)
+            request.session.pop(QUOTE_SESSION_KEY, None)
+            messages.error(request, f"Coupon {quote.coupon_code} is no longer available. Please review your order.")
+            return redirect('checkout')
 
-        # Create the Order
         order = Order.objects.create(
             user=request.user,
             shipping_address=shipping_address,
-            total_amount=grand_total,
+            # Stored at list prices, so subtotal - discount + tax + shipping adds up to the total
+            subtotal=quote.list_subtotal,
+            discount_amount=quote.savings + quote.discount,
+            tax_amount=quote.tax,
+            shipping_charge=quote.shipping,
+            coupon_code=quote.coupon_code,
+            total_amount=quote.total,
             payment_method='Cash on Delivery',
             payment_status='Pending'
         )
 
-        # Create Order Items and update stock
-        for item in cart_items:
-            OrderItem.objects.create(
+        # Order lines record the price actually paid
+        OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
-                product=item.product,
-                product_name=item.product.name,
-                product_price=item.product.price,
-                quantity=item.quantity
+                product_id=line.product_id,
+                product_name=line.name,
+                product_price=line.unit_price,
+                quantity=line.quantity,
+                total_price=line.line_total,
             )
-            # Decrease stock
-            product = item.product
-            product.stock_quantity -= item.quantity
-            product.save()
+            for line in quote.lines
+        ])
 
         # Clear the cart
         cart.items.all().delete()
+        request.session.pop(QUOTE_SESSION_KEY, None)
         
         messages.success(request, "Your order has been placed successfully!")
         return redirect('order_success', order_id=order.order_number)
@@ -1575,6 +1684,8 @@ def place_order_view(request):
         messages.error(request, "Your cart was not found.")
         return redirect('product_list')
     except Exception as e:
+        # Undo the partial order and any coupon use claimed above
+        transaction.set_rollback(True)
         logger.error(f"Error in place_order_view: {str(e)}")
         messages.error(request, "An error occurred while placing your order. Please try again.")
         return redirect('checkout')
@@ -1597,6 +1708,22 @@ def order_success_view(request, order_id):
         messages.error(request, "Could not load order confirmation.")
         return redirect('user_orders')
 
+# The built-in PDF fonts have no ₹ glyph, so invoices embed this TTF font
+INVOICE_FONT = 'DejaVuSans'
+INVOICE_FONT_PATH = getattr(settings, 'INVOICE_FONT_PATH', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+
+def invoice_font():
+    """(font name, currency symbol) for invoices, falling back to 'Rs.' without the TTF font"""
+    if INVOICE_FONT not in pdfmetrics.getRegisteredFontNames():
+        try:
+            pdfmetrics.registerFont(TTFont(INVOICE_FONT, INVOICE_FONT_PATH))
+        except Exception as e:
+            logger.warning(f"Invoice font unavailable, using Helvetica: {e}")
+            return 'Helvetica', 'Rs. '
+    return INVOICE_FONT, '₹'
+
+
 @login_required
 @cache_control(no_cache=True, must_revalidate=True, no_store=True) 
 def download_invoice_view(request, order_id):
@@ -1605,23 +1732,35 @@ def download_invoice_view(request, order_id):
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter)
     styles = getSampleStyleSheet()
+    font, currency = invoice_font()
+    normal = ParagraphStyle('Invoice', parent=styles['Normal'], fontName=font)
     elements = []
     
     # Title
     elements.append(Paragraph(f"Invoice for Order: {order.order_number}", styles['Title']))
-    elements.append(Paragraph(f"Date: {order.created_at.strftime('%Y-%m-%d')}", styles['Normal']))
-    elements.append(Paragraph(f"Status: {order.get_status_display()}", styles['Normal']))
-    elements.append(Paragraph(f"Payment Method: {order.get_payment_method_display()}", styles['Normal']))
-    elements.append(Paragraph(f"Total: ${order.total_amount}", styles['Normal']))
+    elements.append(Paragraph(f"Date: {order.created_at.strftime('%Y-%m-%d')}", normal))
+    elements.append(Paragraph(f"Status: {order.get_status_display()}", normal))
+    elements.append(Paragraph(f"Payment Method: {order.get_payment_method_display()}", normal))
     
     # Items Table
     data = [['Product', 'Quantity', 'Price', 'Total']]
     for item in order.items.all():
-        data.append([item.product_name, item.quantity, f"${item.product_price}", f"${item.total_price}"])
+        data.append([item.product_name, item.quantity, f"{currency}{item.product_price}", f"{currency}{item.total_price}"])
     table = Table(data)
-    table.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), 'grey'), ('TEXTCOLOR', (0, 0), (-1, 0), 'white')]))
+    table.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), font),
+        ('BACKGROUND', (0, 0), (-1, 0), 'grey'),
+        ('TEXTCOLOR', (0, 0), (-1, 0), 'white'),
+    ]))
     elements.append(table)
     
+    # Price breakdown stored on the order when it was placed
+    elements.append(Paragraph(f"Subtotal: {currency}{order.subtotal}", normal))
+    elements.append(Paragraph(f"Discount: -{currency}{order.discount_amount}", normal))
+    elements.append(Paragraph(f"Tax: {currency}{order.tax_amount}", normal))
+    elements.append(Paragraph(f"Shipping: {currency}{order.shipping_charge}", normal))
+    elements.append(Paragraph(f"Grand Total: {currency}{order.total_amount}", normal))
+    
     doc.build(elements)
     buffer.seek(0)
     
@@ -1643,13 +1782,6 @@ def return_order_view(request, order_id):
         if form.is_valid():
             reason = form.cleaned_data['reason']
             if order.return_order(reason=reason, returned_by=request.user.email):
-                OrderStatusHistory.objects.create(
-                    order=order, 
-                    old_status='delivered', 
-                    new_status='refunded', 
-                    changed_by=request.user.email,
-                    notes=reason
-                )
                 messages.success(request, "Order returned successfully. Stock updated.")
                 return redirect('order_detail', order_id=order.order_number)
             else:
@@ -1663,6 +1795,49 @@ def return_order_view(request, order_id):
 
 
 
+@csrf_exempt
+@require_POST
+def carrier_webhook_view(request):
+    """Receive a batch of carrier tracking events and apply them to orders"""
+    token = settings.CARRIER_WEBHOOK_TOKEN
+    if not token or not hmac.compare_digest(request.headers.get('X-Carrier-Token', ''), token):
+        return JsonResponse({'success': False, 'error': 'Invalid token'}, status=403)
+
+    try:
+        payload = json.loads(request.body or b'[]')
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    rows = payload.get('events') if isinstance(payload, dict) else payload
+    if not isinstance(rows, list):
+        return JsonResponse({'success': False, 'error': 'Expected a list of events'}, status=400)
+
+    events = []
+    invalid = []
+    for index, row in enumerate(rows):
+        try:
+            if not isinstance(row, dict):
+                raise ValueError("each event must be an object")
+            events.append(parse_event(row))
+        except ValueError as e:
+            invalid.append({'index': index, 'error': str(e)})
+
+    ingestor = TrackingIngestor()
+    try:
+        ingestor.apply(events)
+    except Exception as e:
+        logger.error(f"Error applying carrier events: {str(e)}")
+        return JsonResponse({'success': False, 'error': 'Could not apply events'}, status=500)
+
+    return JsonResponse({
+        'success': True,
+        'moved': ingestor.moved,
+        'unchanged': ingestor.unchanged,
+        'unmatched': ingestor.unmatched,
+        'rejected': [{'tracking_number': t, 'error': reason} for t, reason in ingestor.errors],
+        'invalid': invalid,
+    })
+
+
 def contact(request):
     """Display contact page"""
     return render(request, 'contact.html')
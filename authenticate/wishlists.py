@@ -0,0 +1,90 @@
+"""Wishlists: bulk adds and removes, and evaluating a wishlist's items in one query."""
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.db import models
+from django.db.models import ExpressionWrapper, F, Q, Value
+
+from customeradmin.models import Product
+from .carts import line_annotations, with_image_urls
+from .models import Wishlist, WishlistItem, wishlist_cache_key
+
+
+def wishlisted_ids(user):
+    """Ids of the products on the user's wishlist; empty for anonymous visitors"""
+    if not user.is_authenticated:
+        return frozenset()
+    return WishlistItem.objects.product_ids(user.pk)
+
+
+def add_products(user, product_ids):
+    """
+    Put products on the user's wishlist, remembering the price each was added at.
+
+    Products are checked with one IN query and written with one INSERT; ones
+    already on the wishlist keep their original price.
+
+    Returns ([added product ids], [(product_id, reason)]).
+    """
+    product_ids = list(dict.fromkeys(product_ids))
+    prices = dict(Product.customer_visible.filter(pk__in=product_ids).values_list('pk', 'effective_price'))
+    failed = [(pk, 'This product is not available') for pk in product_ids if pk not in prices]
+    if not prices:
+        return [], failed
+
+    wishlist, _ = Wishlist.objects.get_or_create(user=user)
+    existing = set(wishlist.items.filter(product_id__in=list(prices)).values_list('product_id', flat=True))
+    added = [pk for pk in product_ids if pk in prices and pk not in existing]
+    if added:
+        WishlistItem.objects.bulk_create(
+            [WishlistItem(wishlist=wishlist, product_id=pk, price_at_add=prices[pk]) for pk in added],
+            ignore_conflicts=True,
+        )
+        cache.delete(wishlist_cache_key(user.pk))
+    return added, failed
+
+
+def remove_products(user, product_ids):
+    """Take products off the user's wishlist; returns how many were removed"""
+    return WishlistItem.objects.discard(user.pk, product_ids)
+
+
+@dataclass(frozen=True)
+class WishlistEvaluation:
+    items: tuple
+
+    @property
+    def available_items(self):
+        return [item for item in self.items if item.available]
+
+    @property
+    def unavailable_items(self):
+        return [item for item in self.items if not item.available]
+
+    @property
+    def price_drops(self):
+        return [item for item in self.items if item.price_dropped]
+
+    @property
+    def total_items(self):
+        return len(self.items)
+
+
+def evaluate_wishlist(user):
+    """
+    Evaluate the user's wishlist in one query: each item comes back with the
+    cart line annotations for one unit (available, max_quantity, main_image)
+    plus price_dropped, set when the product is cheaper than when it was added
+    """
+    items = (
+        WishlistItem.objects.filter(wishlist__user_id=user.pk)
+        .select_related('product__category')
+        .annotate(
+            **line_annotations(Value(1), 'product__'),
+            price_dropped=ExpressionWrapper(
+                Q(product__effective_price__lt=F('price_at_add')),
+                output_field=models.BooleanField(),
+            ),
+        )
+    )
+    return WishlistEvaluation(with_image_urls(list(items)))
@@ -10,7 +10,10 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'category', 'price', 'stock_quantity', 'status', 'is_blocked', 'created_at')
     list_filter = ('category', 'status', 'is_blocked', 'created_at')
     search_fields = ('name', 'sku', 'brand')
-    actions = ['block_selected_products', 'unblock_selected_products']
+    actions = [
+        'block_selected_products', 'unblock_selected_products', 'soft_delete_selected_products',
+        'publish_selected_products', 'draft_selected_products',
+    ]
     inlines = [ProductImageInline]
     
     fieldsets = (
@@ -38,14 +41,27 @@ class ProductAdmin(admin.ModelAdmin):
     readonly_fields = ('blocked_at', 'blocked_by')
     
     def block_selected_products(self, request, queryset):
-        for product in queryset:
-            product.block_product(blocked_by=request.user.username)
-        self.message_user(request, f'{queryset.count()} products blocked successfully.')
+        count = queryset.block(blocked_by=request.user.get_username())
+        self.message_user(request, f'{count} products blocked successfully.')
     
     def unblock_selected_products(self, request, queryset):
-        for product in queryset:
-            product.unblock_product()
-        self.message_user(request, f'{queryset.count()} products unblocked successfully.')
+        count = queryset.unblock()
+        self.message_user(request, f'{count} products unblocked successfully.')
+
+    def soft_delete_selected_products(self, request, queryset):
+        count = queryset.soft_delete(deleted_by=request.user.get_username())
+        self.message_user(request, f'{count} products deleted successfully.')
+
+    def publish_selected_products(self, request, queryset):
+        count = queryset.filter(is_blocked=False).set_status('published')
+        self.message_user(request, f'{count} products published successfully.')
+
+    def draft_selected_products(self, request, queryset):
+        count = queryset.filter(is_blocked=False).set_status('draft')
+        self.message_user(request, f'{count} products moved to draft.')
     
     block_selected_products.short_description = "Block selected products"
     unblock_selected_products.short_description = "Unblock selected products"
+    soft_delete_selected_products.short_description = "Soft delete selected products"
+    publish_selected_products.short_description = "Publish selected products"
+    draft_selected_products.short_description = "Move selected products to draft"
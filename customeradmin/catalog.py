@@ -0,0 +1,83 @@
+"""Row formats shared by the import_catalog and export_catalog commands."""
+import csv
+import json
+import os
+
+
+# Product columns in a catalog file, in export order
+CATALOG_FIELDS = [
+    'sku', 'name', 'category', 'brand', 'price', 'discount_type', 'discount_value',
+    'tax_type', 'vat_percentage', 'stock_quantity', 'low_stock_threshold', 'manage_stock',
+    'status', 'short_description', 'detailed_description',
+]
+
+# Column holding image paths; CSV joins several paths with IMAGE_SEPARATOR
+IMAGES_FIELD = 'images'
+IMAGE_SEPARATOR = '|'
+
+FORMATS = ('csv', 'jsonl')
+
+
+def detect_format(path, fmt=None):
+    """Return the catalog format from an explicit choice or the file extension"""
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    if ext in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_rows(stream, fmt):
+    """
+    Yield (line_number, row, error) for every record in a catalog stream.
+
+    Rows are read lazily so arbitrarily large files are never held in memory.
+    `error` is set instead of `row` when a JSONL line cannot be decoded.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "Each line must be a JSON object"
+            continue
+        yield line_number, row, None
+
+
+def split_images(value):
+    """Normalise the images column (list or separated string) into a list of paths"""
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value).split(IMAGE_SEPARATOR) if v.strip()]
+
+
+class CatalogWriter:
+    """Streams catalog rows to a file object as CSV or JSONL"""
+
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.writer = csv.DictWriter(stream, fieldnames=CATALOG_FIELDS + [IMAGES_FIELD])
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.fmt == 'csv':
+            row = dict(row, **{IMAGES_FIELD: IMAGE_SEPARATOR.join(row.get(IMAGES_FIELD, []))})
+            self.writer.writerow(row)
+        else:
+            self.stream.write(json.dumps(row, default=str) + '\n')
@@ -101,6 +101,8 @@ class ProductForm(forms.ModelForm):
         self.fields['brand'].required = False
         self.fields['short_description'].required = False
         self.fields['detailed_description'].required = False
+        self.fields['category'].queryset = Category.objects.order_by('name')
+        self.fields['category'].empty_label = 'Select category'
 
     def clean_sku(self):
         sku = self.cleaned_data.get('sku')
@@ -137,6 +139,31 @@ class ProductForm(forms.ModelForm):
         return discount_value
 
 
+class ProductImportForm(ProductForm):
+    """
+    ProductForm for catalog import rows.
+
+    SKU uniqueness is checked for a whole chunk of rows with one IN query by
+    `import_catalog`, so the per-row existence queries are skipped here.
+    Categories are given by slug and resolved from `categories`
+    ({slug: Category}, loaded once per import) rather than a query per row.
+    """
+
+    def __init__(self, *args, categories=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        categories = categories or {}
+        self.fields['category'] = forms.TypedChoiceField(
+            choices=[(slug, slug) for slug in categories],
+            coerce=categories.get,
+        )
+
+    def clean_sku(self):
+        return self.cleaned_data.get('sku')
+
+    def validate_unique(self):
+        pass
+
+
 class ProductImageForm(forms.ModelForm):
     class Meta:
         model = ProductImage
@@ -242,33 +269,21 @@ class CategoryForm(forms.ModelForm):
 
 class OrderStatusForm(forms.Form):
     status = forms.ChoiceField(choices=())  # will be set in __init__
+    tracking_number = forms.CharField(max_length=100, required=False)
+    shipping_carrier = forms.CharField(max_length=100, required=False)
 
     def __init__(self, *args, order=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.order = order
 
-        # Build choices dynamically so it's never empty
-        if hasattr(Order, "Status") and getattr(Order.Status, "choices", None):
-            status_tuple = Order.Status.choices
-        elif hasattr(Order, "ORDERSTATUSCHOICES") and getattr(Order, "ORDERSTATUSCHOICES", ()):
-            status_tuple = Order.ORDERSTATUSCHOICES
-        else:
-            status_tuple = (
-                ("pending", "Pending"),
-                ("paid", "Paid"),
-                ("shipped", "Shipped"),
-                ("out-for-delivery", "Out for Delivery"),
-                ("delivered", "Delivered"),
-                ("cancelled", "Cancelled"),
-            )
-
-        self.fields["status"].choices = status_tuple
+        self.fields["status"].choices = Order.ORDER_STATUS_CHOICES
         if order is not None:
             self.fields["status"].initial = order.status
+            self.fields["tracking_number"].initial = order.tracking_number
+            self.fields["shipping_carrier"].initial = order.shipping_carrier
 
     def clean_status(self):
         new_status = self.cleaned_data["status"]
-        if self.order and hasattr(self.order, "can_transition_to"):
-            if not self.order.can_transition_to(new_status):
-                raise forms.ValidationError("Invalid status transition for this order.")
+        if self.order and new_status != self.order.status and not self.order.can_transition_to(new_status):
+            raise forms.ValidationError("Invalid status transition for this order.")
         return new_status
\ No newline at end of file
@@ -0,0 +1,62 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from customeradmin.catalog import CATALOG_FIELDS, FORMATS, IMAGES_FIELD, CatalogWriter, detect_format
+from customeradmin.models import Product, ProductImage
+
+
+class Command(BaseCommand):
+    help = 'Stream products to a CSV or JSONL catalog file that import_catalog can read back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help='Output file (default: stdout)')
+        parser.add_argument('--format', choices=FORMATS, help='File format (defaults to the file extension, or csv)')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Products read per query')
+        parser.add_argument('--include-deleted', action='store_true', help='Also export soft-deleted products')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or (detect_format(output) if output != '-' else 'csv')
+        manager = Product.all_objects if options['include_deleted'] else Product.objects
+        batch_size = max(1, options['batch_size'])
+
+        if output == '-':
+            exported = self.export(manager, CatalogWriter(self.stdout, fmt), batch_size)
+        else:
+            with open(output, 'w', newline='', encoding='utf-8') as stream:
+                exported = self.export(manager, CatalogWriter(stream, fmt), batch_size)
+            self.stdout.write(self.style.SUCCESS(
+                f"Exported {exported} products to {output} (image paths are relative to MEDIA_ROOT)"
+            ))
+
+    def export(self, manager, writer, batch_size):
+        """Keyset-paginate products by pk so memory stays flat for any catalog size"""
+        last_pk = 0
+        exported = 0
+        while True:
+            batch = list(
+                manager.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values('pk', 'category__slug', *[f for f in CATALOG_FIELDS if f != 'category'])[:batch_size]
+            )
+            if not batch:
+                return exported
+
+            ids = [row['pk'] for row in batch]
+            images = defaultdict(list)
+            image_rows = (
+                ProductImage.objects.filter(product_id__in=ids)
+                .order_by('product_id', 'order', 'created_at')
+                .values_list('product_id', 'image')
+            )
+            for product_id, name in image_rows:
+                images[product_id].append(name)
+
+            for row in batch:
+                row['category'] = row.pop('category__slug')
+                row[IMAGES_FIELD] = images.get(row.pop('pk'), [])
+                writer.write(row)
+
+            exported += len(batch)
+            last_pk = ids[-1]
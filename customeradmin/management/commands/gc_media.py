@@ -0,0 +1,138 @@
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models
+
+
+# Upload directories owned by models. Loose files at the top of MEDIA_ROOT
+# are referenced directly from templates and are never collected.
+UPLOAD_DIRS = ['products', 'profile_images', 'categories']
+
+
+class Command(BaseCommand):
+    help = 'Delete media files under the upload directories that no database row references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='List unreferenced files without deleting them')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of files deleted per batch')
+        parser.add_argument(
+            '--min-age-hours', type=float, default=24,
+            help='Skip files modified more recently than this (uploads whose row is not committed yet)'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        batch_size = max(1, options['batch_size'])
+        cutoff = time.time() - options['min_age_hours'] * 3600
+
+        referenced = self.referenced_files()
+        self.stdout.write(f"{len(referenced)} files referenced from the database")
+
+        batch = []
+        deleted = 0
+        freed = 0
+        for name, path, size in self.unreferenced_files(referenced, cutoff):
+            batch.append((name, path, size))
+            if len(batch) >= batch_size:
+                count, size = self.delete_batch(batch, cutoff, dry_run)
+                deleted += count
+                freed += size
+                batch = []
+        if batch:
+            count, size = self.delete_batch(batch, cutoff, dry_run)
+            deleted += count
+            freed += size
+
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(
+            self.style.SUCCESS(f"{verb} {deleted} unreferenced files ({freed / (1024 * 1024):.1f} MB)")
+        )
+
+    def file_fields(self):
+        """Yield (model, field) for every FileField across all models"""
+        for model in apps.get_models():
+            for field in model._meta.concrete_fields:
+                if isinstance(field, models.FileField):
+                    yield model, field
+
+    def referenced_files(self):
+        """Collect the stored name of every FileField value across all models"""
+        referenced = set()
+        for model, field in self.file_fields():
+            # _base_manager so soft-deleted rows keep their files until purged
+            names = (
+                model._base_manager
+                .exclude(**{f'{field.attname}__isnull': True})
+                .exclude(**{field.attname: ''})
+                .values_list(field.attname, flat=True)
+                .iterator(chunk_size=2000)
+            )
+            referenced.update(names)
+        return referenced
+
+    def referenced_among(self, names):
+        """The subset of `names` that some row references right now"""
+        referenced = set()
+        for model, field in self.file_fields():
+            referenced.update(
+                model._base_manager.filter(**{f'{field.attname}__in': names}).values_list(field.attname, flat=True)
+            )
+        return referenced
+
+    def unreferenced_files(self, referenced, cutoff):
+        """Yield (name, path, size) for old files under UPLOAD_DIRS not in `referenced`"""
+        root = settings.MEDIA_ROOT
+        pending = [os.path.join(root, d) for d in UPLOAD_DIRS]
+        while pending:
+            directory = pending.pop()
+            try:
+                entries = os.scandir(directory)
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                        continue
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    name = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                    if name in referenced:
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                    if stat.st_mtime > cutoff:
+                        continue
+                    yield name, entry.path, stat.st_size
+
+    def delete_batch(self, batch, cutoff, dry_run):
+        """
+        Delete a batch of candidates, re-checking each against the database and
+        its mtime first: the referenced snapshot was taken before the scan, and
+        an upload may have reused or referenced the file since
+        """
+        referenced = self.referenced_among([name for name, _, _ in batch])
+        deleted = 0
+        freed = 0
+        for name, path, size in batch:
+            if name in referenced:
+                continue
+            try:
+                if os.stat(path).st_mtime > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            if dry_run:
+                self.stdout.write(f"  {name}")
+            else:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+            deleted += 1
+            freed += size
+        if not dry_run:
+            self.stdout.write(f"Removed batch of {deleted} files")
+        return deleted, freed
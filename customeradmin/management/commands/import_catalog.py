@@ -0,0 +1,222 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.forms.models import model_to_dict
+from django.utils import timezone
+
+from customeradmin.catalog import CATALOG_FIELDS, FORMATS, IMAGES_FIELD, detect_format, read_rows, split_images
+from customeradmin.forms import ProductImportForm
+from customeradmin.models import Category, Product, ProductImage, capture_alerts, capture_counts, lock_states
+from customeradmin.utils import process_image
+
+
+MIN_IMAGES = 3
+MAX_IMAGES = 6
+
+# Values a new product row may leave out
+NEW_PRODUCT_DEFAULTS = {
+    'discount_type': 'none',
+    'discount_value': 0,
+    'tax_type': 'free',
+    'vat_percentage': 0,
+    'low_stock_threshold': 5,
+    'manage_stock': True,
+    'status': 'draft',
+}
+
+FALSE_VALUES = {'', '0', 'false', 'no', 'n', 'off'}
+
+UPDATE_FIELDS = [f for f in CATALOG_FIELDS if f != 'sku'] + ['effective_price', 'final_price', 'updated_at']
+
+
+def store_product_images(paths):
+    """Resize and store the image files for one row. Runs in a worker thread."""
+    field = ProductImage._meta.get_field('image')
+    names = []
+    for path in paths:
+        with Image.open(path) as img:
+            img.verify()
+        with open(path, 'rb') as fh:
+            processed = process_image(File(fh, name=os.path.basename(path)))
+            names.append(field.storage.save(field.generate_filename(None, processed.name), processed))
+    return names
+
+
+class Command(BaseCommand):
+    help = 'Create or update products in bulk from a CSV or JSONL catalog file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file with one product per row')
+        parser.add_argument('--format', choices=FORMATS, help='File format (defaults to the file extension)')
+        parser.add_argument('--images', default='', help='Directory that image paths in the file are relative to')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows validated and written per transaction')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='Image processing threads')
+        parser.add_argument('--dry-run', action='store_true', help='Validate rows without writing anything')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f"File not found: {path}")
+
+        fmt = detect_format(path, options['format'])
+        batch_size = max(1, options['batch_size'])
+        self.image_root = options['images']
+        self.dry_run = options['dry_run']
+        self.seen_skus = set()
+        # The category column holds slugs; products reference categories by id.
+        # Soft-deleted categories are left out, so rows naming them fail validation
+        self.categories = {category.slug: category for category in Category.objects.all()}
+        self.category_slugs = {category.pk: slug for slug, category in self.categories.items()}
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+
+        with open(path, newline='', encoding='utf-8') as stream, \
+                ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            self.pool = pool
+            chunk = []
+            for record in read_rows(stream, fmt):
+                chunk.append(record)
+                if len(chunk) >= batch_size:
+                    self.import_chunk(chunk)
+                    chunk = []
+            if chunk:
+                self.import_chunk(chunk)
+
+        prefix = 'Dry run: would have ' if self.dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}created {self.created}, updated {self.updated}, {self.failed} rows failed"
+        ))
+
+    def report(self, line, sku, error):
+        self.failed += 1
+        self.stderr.write(f"line {line} [{sku or '-'}]: {error}")
+
+    def import_chunk(self, records):
+        rows = []
+        for line, row, error in records:
+            if error:
+                self.report(line, None, error)
+                continue
+            sku = str(row.get('sku') or '').strip()
+            if not sku:
+                self.report(line, None, "sku is required")
+                continue
+            if sku in self.seen_skus:
+                self.report(line, sku, "duplicate SKU earlier in the file")
+                continue
+            self.seen_skus.add(sku)
+            rows.append((line, sku, row))
+
+        # One IN query for the whole chunk instead of a lookup per row
+        existing = Product.all_objects.in_bulk([sku for _, sku, _ in rows], field_name='sku')
+
+        valid = []
+        for line, sku, row in rows:
+            product = self.build_product(line, sku, row, existing.get(sku))
+            if product is None:
+                continue
+            image_paths = [os.path.join(self.image_root, p) for p in split_images(row.get(IMAGES_FIELD))]
+            if image_paths and not MIN_IMAGES <= len(image_paths) <= MAX_IMAGES:
+                self.report(line, sku, f"a product needs between {MIN_IMAGES} and {MAX_IMAGES} images")
+                continue
+            missing = [p for p in image_paths if not os.path.isfile(p)]
+            if missing:
+                self.report(line, sku, f"image not found: {', '.join(missing)}")
+                continue
+            valid.append((line, sku, product, image_paths))
+
+        if self.dry_run:
+            for _, _, product, _ in valid:
+                if product.pk:
+                    self.updated += 1
+                else:
+                    self.created += 1
+            return
+
+        # Decode, resize and store images in parallel; a failing row is dropped whole
+        results = self.pool.map(self.process_images, [paths for _, _, _, paths in valid])
+        ready = []
+        for (line, sku, product, _), (names, error) in zip(valid, results):
+            if error:
+                self.report(line, sku, f"image processing failed: {error}")
+                continue
+            ready.append((line, sku, product, names))
+
+        self.write_chunk(ready)
+
+    def build_product(self, line, sku, row, instance):
+        """Validate a row through ProductImportForm and return the unsaved product"""
+        if instance:
+            data = model_to_dict(instance, fields=CATALOG_FIELDS)
+            data['category'] = self.category_slugs.get(data['category'])
+        else:
+            data = dict(NEW_PRODUCT_DEFAULTS)
+        for field in CATALOG_FIELDS:
+            value = row.get(field)
+            if value is None or value == '':
+                continue
+            data[field] = value
+        data['sku'] = sku
+        data['manage_stock'] = str(data.get('manage_stock')).strip().lower() not in FALSE_VALUES
+
+        form = ProductImportForm(data, instance=instance, categories=self.categories)
+        if not form.is_valid():
+            errors = '; '.join(f"{field}: {' '.join(msgs)}" for field, msgs in form.errors.items())
+            self.report(line, sku, errors)
+            return None
+
+        product = form.save(commit=False)
+        product.apply_stock_status()
+        product.apply_pricing()
+        return product
+
+    def process_images(self, paths):
+        if not paths:
+            return [], None
+        try:
+            return store_product_images(paths), None
+        except Exception as e:
+            return None, str(e)
+
+    def write_chunk(self, ready):
+        if not ready:
+            return
+
+        now = timezone.now()
+        to_create = [product for _, _, product, _ in ready if not product.pk]
+        to_update = [product for _, _, product, _ in ready if product.pk]
+        updated_ids = set()
+        for product in to_update:
+            product.updated_at = now
+            updated_ids.add(product.pk)
+
+        try:
+            with transaction.atomic():
+                lock_states(to_update)
+                Product.all_objects.bulk_create(to_create, batch_size=500)
+                Product.all_objects.bulk_update(to_update, UPDATE_FIELDS, batch_size=500)
+                capture_alerts(to_update)
+                capture_counts(to_create + to_update)
+
+                with_images = [(product, names) for _, _, product, names in ready if names]
+                ProductImage.objects.filter(
+                    product_id__in=[product.pk for product, _ in with_images if product.pk in updated_ids]
+                ).delete()
+                ProductImage.objects.bulk_create([
+                    ProductImage(product=product, image=name, is_primary=(index == 0), order=index)
+                    for product, names in with_images
+                    for index, name in enumerate(names)
+                ], batch_size=1000)
+        except Exception as e:
+            for line, sku, _, _ in ready:
+                self.report(line, sku, f"batch write failed: {e}")
+            return
+
+        self.created += len(to_create)
+        self.updated += len(to_update)
+        self.stdout.write(f"Wrote {len(ready)} products (through line {ready[-1][0]})")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from customeradmin.models import reconcile_category_counts
+
+
+class Command(BaseCommand):
+    help = 'Recount products per category and fix counters that drifted (run nightly from cron)'
+
+    def handle(self, *args, **options):
+        fixed = reconcile_category_counts()
+        for category, old, new in fixed:
+            self.stdout.write(
+                f"{category.name}: total {old[0]} -> {new[0]}, published {old[1]} -> {new[1]}, in stock {old[2]} -> {new[2]}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Reconciled category counts, {len(fixed)} categories corrected"))
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.4 on 2026-10-19 10:58
+
+import customeradmin.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customeradmin', '0004_remove_orderitem_order_remove_orderitem_product_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=customeradmin.storage.ContentAddressedStorage(), upload_to='products/'),
+        ),
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=models.ImageField(storage=customeradmin.storage.ContentAddressedStorage(), upload_to='products/'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.4 on 2026-10-19 11:04
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest, Round
+
+
+# Frozen copies of the pricing expressions as they stood at this migration,
+# so later changes to customeradmin.models don't alter what it computes
+PERCENT = Value(Decimal('0.01'))
+
+
+def discounted_price():
+    price = F('price')
+    return Case(
+        When(discount_type='percentage', discount_value__gt=0, then=price - price * F('discount_value') * PERCENT),
+        When(discount_type='fixed', discount_value__gt=0, then=Greatest(price - F('discount_value'), Value(Decimal('0')))),
+        default=price,
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def populate_prices(apps, schema_editor):
+    Product = apps.get_model('customeradmin', 'Product')
+    discounted = discounted_price()
+    Product._base_manager.update(
+        effective_price=Round(discounted, 2),
+        final_price=Round(Case(
+            When(tax_type='taxable', vat_percentage__gt=0,
+                 then=discounted + discounted * F('vat_percentage') * PERCENT),
+            default=discounted,
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ), 2),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customeradmin', '0005_alter_product_image_alter_productimage_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='final_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['status', 'effective_price'], name='customeradm_status_f7a57d_idx'),
+        ),
+        migrations.RunPython(populate_prices, migrations.RunPython.noop),
+    ]
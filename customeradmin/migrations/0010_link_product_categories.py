@@ -0,0 +1,62 @@
+from django.db import migrations
+from django.utils.text import slugify
+
+
+# The choices Product.category was limited to before it became a foreign key
+CATEGORY_CHOICES = [
+    ('sofa', 'Sofa'),
+    ('chair', 'Chair'),
+    ('table', 'Table'),
+    ('bed', 'Bed'),
+    ('storage', 'Storage'),
+    ('accessories', 'Accessories'),
+]
+
+
+def link_categories(apps, schema_editor):
+    """
+    Give every category a slug, make sure each old category string has a
+    Category row (matched by slug or name), and point products at it with
+    one UPDATE per category
+    """
+    Category = apps.get_model('customeradmin', 'Category')
+    Product = apps.get_model('customeradmin', 'Product')
+
+    taken = set()
+    for category in Category.objects.order_by('pk'):
+        slug = base = slugify(category.name) or f'category-{category.pk}'
+        suffix = 2
+        while slug in taken:
+            slug = f'{base}-{suffix}'
+            suffix += 1
+        taken.add(slug)
+        Category.objects.filter(pk=category.pk).update(slug=slug)
+
+    labels = dict(CATEGORY_CHOICES)
+    used = Product.objects.order_by().values_list('category', flat=True).distinct()
+    for value in used:
+        key = slugify(value) or 'uncategorised'
+        category = (
+            Category.objects.filter(slug=key).first()
+            or Category.objects.filter(name__iexact=labels.get(value, value)).first()
+        )
+        if category is None:
+            category = Category.objects.create(name=labels.get(value, value.title() or 'Uncategorised'), slug=key)
+        Product.objects.filter(category=value).update(category_ref=category)
+
+
+def unlink_categories(apps, schema_editor):
+    Product = apps.get_model('customeradmin', 'Product')
+    for pk, slug in Product.objects.values_list('pk', 'category_ref__slug'):
+        Product.objects.filter(pk=pk).update(category=slug or 'sofa')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customeradmin', '0009_category_slug_product_category_ref'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_categories, unlink_categories),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-19 11:42
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def count_products(apps, schema_editor):
+    """Fill the new counters with one aggregate over products and one UPDATE per category"""
+    Category = apps.get_model('customeradmin', 'Category')
+    Product = apps.get_model('customeradmin', 'Product')
+    active = Q(is_deleted=False, is_blocked=False)
+    rows = Product.objects.order_by().values('category_id').annotate(
+        total=Count('pk', filter=Q(is_deleted=False)),
+        published=Count('pk', filter=active & Q(status='published')),
+        in_stock=Count('pk', filter=active & Q(stock_quantity__gt=0)),
+    )
+    for row in rows:
+        Category.objects.filter(pk=row['category_id']).update(
+            product_count=row['total'],
+            published_count=row['published'],
+            in_stock_count=row['in_stock'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customeradmin', '0011_product_category_fk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='in_stock_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='published_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_products, migrations.RunPython.noop),
+    ]
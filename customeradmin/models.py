@@ -1,4 +1,10 @@
-from django.db import models
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.functions import Greatest, Round
+from django.db.models.lookups import Exact, GreaterThan, LessThanOrEqual
 from PIL import Image as PILImage
 import io
 from django.core.files.uploadedfile import InMemoryUploadedFile
@@ -6,7 +12,10 @@ import sys
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 from django.utils import timezone
-from decimal import Decimal
+from django.utils.text import slugify
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from .storage import content_addressed_storage
 
 class SoftDeleteManager(models.Manager):
     """Manager that excludes soft-deleted objects by default"""
@@ -20,15 +29,343 @@ class AllObjectsManager(models.Manager):
         return super().get_queryset()
 
 
+def visible_category(product=''):
+    """
+    Q for products whose category is listed and not deleted, where `product`
+    is the lookup prefix of the product ('' on Product itself)
+    """
+    return Q(**{f'{product}category__is_listed': True, f'{product}category__is_deleted': False})
+
+
 class CustomerVisibleManager(SoftDeleteManager):
     """Manager for customer-visible products only"""
     def get_queryset(self):
         return super().get_queryset().filter(
+            visible_category(),
             is_blocked=False,
             status='published'
         )
 
 
+def stock_status_expression(stock=None, status=None, frozen=None):
+    """
+    SQL equivalent of Product.apply_stock_status for set-based updates.
+
+    `stock` and `status` default to the current column values; pass
+    expressions for the values being written in the same UPDATE. Rows
+    matching `frozen` (blocked or soft-deleted by default) keep `status`.
+    """
+    stock = stock if stock is not None else F('stock_quantity')
+    status = status if status is not None else F('status')
+    frozen = frozen if frozen is not None else Q(is_blocked=True) | Q(is_deleted=True)
+    threshold = F('low_stock_threshold')
+    return Case(
+        When(frozen, then=status),
+        When(Exact(stock, 0), then=Value('out-of-stock')),
+        When(Q(LessThanOrEqual(stock, threshold)) & Q(Exact(status, 'out-of-stock')), then=Value('low-stock')),
+        When(
+            Q(GreaterThan(stock, threshold)) & (Q(Exact(status, 'out-of-stock')) | Q(Exact(status, 'low-stock'))),
+            then=Value('published'),
+        ),
+        default=status,
+        output_field=models.CharField(),
+    )
+
+
+# Multiplying by 0.01 rather than dividing by 100 keeps SQLite out of integer division
+PERCENT = Value(Decimal('0.01'))
+
+
+def _discounted_price_expression(price):
+    return Case(
+        When(discount_type='percentage', discount_value__gt=0, then=price - price * F('discount_value') * PERCENT),
+        When(discount_type='fixed', discount_value__gt=0, then=Greatest(price - F('discount_value'), Value(Decimal('0')))),
+        default=price,
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def effective_price_expression(price=None):
+    """SQL equivalent of Product.get_discounted_price, rounded to two places"""
+    price = price if price is not None else F('price')
+    return Round(_discounted_price_expression(price), 2)
+
+
+def final_price_expression(price=None):
+    """SQL equivalent of Product.get_final_price_with_tax, rounded to two places"""
+    price = price if price is not None else F('price')
+    discounted = _discounted_price_expression(price)
+    return Round(Case(
+        When(tax_type='taxable', vat_percentage__gt=0,
+             then=discounted + discounted * F('vat_percentage') * PERCENT),
+        default=discounted,
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    ), 2)
+
+
+# Product columns that price-drop and back-in-stock alerts are derived from
+ALERT_FIELDS = ('effective_price', 'stock_quantity', 'status', 'is_blocked', 'is_deleted')
+
+
+def alert_state(effective_price, stock_quantity, status, is_blocked, is_deleted):
+    """(price, purchasable) of a product, as customer alerts see it"""
+    purchasable = not is_deleted and not is_blocked and status == 'published' and stock_quantity > 0
+    return effective_price, purchasable
+
+
+def product_events(product_id, before, after):
+    """The ProductEvent rows for a product whose alert state went from `before` to `after`"""
+    old_price, was_purchasable = before
+    new_price, purchasable = after
+    if not purchasable:
+        return []
+    if not was_purchasable:
+        kind = ProductEvent.BACK_IN_STOCK
+    elif old_price is not None and new_price < old_price:
+        kind = ProductEvent.PRICE_DROP
+    else:
+        return []
+    return [ProductEvent(product_id=product_id, kind=kind, old_price=old_price, new_price=new_price)]
+
+
+def capture_alerts(products):
+    """
+    Record ProductEvent rows for saved products whose price dropped or that
+    became purchasable since lock_states() read them. Returns how many were
+    recorded.
+    """
+    events = []
+    for product in products:
+        after = product.alert_state()
+        before = getattr(product, '_alert_state', None)
+        if before is not None:
+            events += product_events(product.pk, before, after)
+        product._alert_state = after
+    if events:
+        ProductEvent.objects.bulk_create(events)
+    return len(events)
+
+
+# Product columns the per-category counters are derived from
+COUNT_FIELDS = ('category_id', 'stock_quantity', 'status', 'is_blocked', 'is_deleted')
+
+
+def count_state(category_id, stock_quantity, status, is_blocked, is_deleted):
+    """
+    (category_id, total, published, in_stock) that a product adds to its
+    category's counters: total counts it unless soft-deleted, published when
+    customers can see it, in_stock when it is active and has stock
+    """
+    total = not is_deleted
+    active = total and not is_blocked
+    return category_id, int(total), int(active and status == 'published'), int(active and stock_quantity > 0)
+
+
+def apply_count_changes(changes):
+    """
+    Move Category counters by the difference between each (before, after)
+    count state, where None means the product wasn't counted. Only categories
+    whose counters actually change are written, one UPDATE each, in id order
+    so concurrent transactions lock them consistently.
+    """
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for before, after in changes:
+        for state, sign in ((before, -1), (after, 1)):
+            if state is not None:
+                category_id, *counts = state
+                for position, count in enumerate(counts):
+                    deltas[category_id][position] += sign * count
+    for category_id, (total, published, in_stock) in sorted(deltas.items()):
+        if total or published or in_stock:
+            Category.all_objects.filter(pk=category_id).update(
+                product_count=F('product_count') + total,
+                published_count=F('published_count') + published,
+                in_stock_count=F('in_stock_count') + in_stock,
+            )
+
+
+def capture_counts(products):
+    """Apply the counter changes of saved products since lock_states() read them; unread ones count as new"""
+    changes = []
+    for product in products:
+        after = product.count_state()
+        changes.append((getattr(product, '_count_state', None), after))
+        product._count_state = after
+    apply_count_changes(changes)
+
+
+def lock_states(products):
+    """
+    Lock the rows of saved products and take their current alert and counter
+    state as the before-state for capture_alerts()/capture_counts(), so
+    changes made since the instances were loaded aren't counted twice. Call
+    inside the transaction that writes them.
+    """
+    products = [product for product in products if product.pk is not None]
+    if not products:
+        return
+    fields = list(dict.fromkeys(('pk', *ALERT_FIELDS, *COUNT_FIELDS)))
+    rows = {
+        row['pk']: row
+        for row in Product.all_objects.select_for_update().order_by('pk')
+        .filter(pk__in=[product.pk for product in products]).values(*fields)
+    }
+    for product in products:
+        row = rows.get(product.pk)
+        product._alert_state = alert_state(*[row[f] for f in ALERT_FIELDS]) if row else None
+        product._count_state = count_state(*[row[f] for f in COUNT_FIELDS]) if row else None
+
+
+class ProductQuerySet(models.QuerySet):
+    """Bulk product operations, each issued as a single UPDATE statement"""
+
+    def update_tracked(self, **kwargs):
+        """
+        update() that also keeps what is derived from product state in step:
+        ProductEvent rows for the price drops and restocks it causes, and the
+        category counters of the products it moves. The affected rows are read
+        before and after in the same transaction.
+        """
+        fields = list(dict.fromkeys(('pk', *ALERT_FIELDS, *COUNT_FIELDS)))
+        with transaction.atomic():
+            before = {row['pk']: row for row in self.select_for_update().values(*fields)}
+            count = self.update(**kwargs)
+            if before:
+                after = {row['pk']: row for row in Product.all_objects.filter(pk__in=list(before)).values(*fields)}
+                events = [
+                    event
+                    for pk, row in after.items()
+                    for event in product_events(
+                        pk,
+                        alert_state(*[before[pk][f] for f in ALERT_FIELDS]),
+                        alert_state(*[row[f] for f in ALERT_FIELDS]),
+                    )
+                ]
+                if events:
+                    ProductEvent.objects.bulk_create(events)
+                apply_count_changes(
+                    (count_state(*[before[pk][f] for f in COUNT_FIELDS]), count_state(*[row[f] for f in COUNT_FIELDS]))
+                    for pk, row in after.items()
+                )
+        return count
+
+    def block(self, blocked_by=None):
+        now = timezone.now()
+        return self.update_tracked(
+            is_blocked=True,
+            blocked_at=now,
+            blocked_by=blocked_by or 'Admin',
+            status='blocked',
+            updated_at=now,
+        )
+
+    def unblock(self):
+        """Unblock and restore the stock-derived status, like Product.unblock_product"""
+        return self.update_tracked(
+            is_blocked=False,
+            blocked_at=None,
+            blocked_by=None,
+            status=Case(
+                When(status='blocked', stock_quantity__lte=0, then=Value('out-of-stock')),
+                When(status='blocked', stock_quantity__lte=F('low_stock_threshold'), then=Value('low-stock')),
+                When(status='blocked', then=Value('published')),
+                default=F('status'),
+            ),
+            updated_at=timezone.now(),
+        )
+
+    def soft_delete(self, deleted_by=None):
+        now = timezone.now()
+        return self.update_tracked(
+            is_deleted=True,
+            deleted_at=now,
+            deleted_by=deleted_by or 'Unknown',
+            updated_at=now,
+        )
+
+    def restore(self):
+        return self.update_tracked(
+            is_deleted=False,
+            deleted_at=None,
+            deleted_by=None,
+            status=stock_status_expression(frozen=Q(is_blocked=True)),
+            updated_at=timezone.now(),
+        )
+
+    def set_status(self, status):
+        """Set a status, letting stock levels override it as Product.save would"""
+        if status == 'blocked':
+            raise ValueError("Use the block action to block products.")
+        if status not in dict(Product.STATUS_CHOICES):
+            raise ValueError(f"Unknown status '{status}'.")
+        return self.update_tracked(
+            status=stock_status_expression(status=Value(status)),
+            updated_at=timezone.now(),
+        )
+
+    def with_current_prices(self):
+        """Annotate prices computed from the pricing columns, ignoring the stored copies"""
+        return self.annotate(
+            current_effective_price=effective_price_expression(),
+            current_final_price=final_price_expression(),
+        )
+
+    def refresh_prices(self):
+        """Recompute the stored effective_price and final_price columns"""
+        return self.update_tracked(
+            effective_price=effective_price_expression(),
+            final_price=final_price_expression(),
+        )
+
+    def set_price(self, price):
+        try:
+            price = Decimal(str(price))
+        except InvalidOperation:
+            raise ValueError("Invalid price.")
+        if price <= 0:
+            raise ValueError("Price must be greater than 0.")
+        return self.update_tracked(
+            price=price,
+            effective_price=effective_price_expression(Value(price)),
+            final_price=final_price_expression(Value(price)),
+            updated_at=timezone.now(),
+        )
+
+    def adjust_stock(self, deltas):
+        """
+        Add a quantity per product ({product_id: delta}) to stock_quantity and
+        re-derive the stock status, all in one UPDATE
+        """
+        if not deltas:
+            return 0
+        stock = F('stock_quantity') + Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+            default=Value(0),
+            output_field=models.IntegerField(),
+        )
+        return self.filter(pk__in=list(deltas)).update_tracked(
+            stock_quantity=stock,
+            status=stock_status_expression(stock=stock),
+            updated_at=timezone.now(),
+        )
+
+    def adjust_price(self, percent):
+        """Raise (positive) or cut (negative) prices by a percentage"""
+        try:
+            factor = 1 + Decimal(str(percent)) / 100
+        except InvalidOperation:
+            raise ValueError("Invalid percentage.")
+        if factor <= 0:
+            raise ValueError("Price adjustment must leave a positive price.")
+        price = Round(F('price') * Value(factor), 2)
+        return self.update_tracked(
+            price=price,
+            effective_price=effective_price_expression(price),
+            final_price=final_price_expression(price),
+            updated_at=timezone.now(),
+        )
+
+
 class Product(models.Model):
     
     STATUS_CHOICES = [
@@ -39,15 +376,6 @@ class Product(models.Model):
         ('blocked', 'Blocked'),  
     ]
     
-    CATEGORY_CHOICES = [
-        ('sofa', 'Sofa'),
-        ('chair', 'Chair'),
-        ('table', 'Table'),
-        ('bed', 'Bed'), 
-        ('storage', 'Storage'),
-        ('accessories', 'Accessories'),
-    ]
-    
     DISCOUNT_TYPES = [
         ('none', 'No Discount'),
         ('percentage', 'Percentage'),
@@ -59,9 +387,12 @@ class Product(models.Model):
         ('taxable', 'Taxable'),
     ]
     
+    # Fields that effective_price and final_price are derived from
+    PRICING_FIELDS = {'price', 'discount_type', 'discount_value', 'tax_type', 'vat_percentage'}
+    
     name = models.CharField(max_length=200)
     sku = models.CharField(max_length=50, unique=True)
-    category = models.CharField(max_length=100, choices=CATEGORY_CHOICES, default='sofa')
+    category = models.ForeignKey('Category', on_delete=models.PROTECT, related_name='products')
     brand = models.CharField(max_length=100, blank=True)
     short_description = models.TextField(blank=True)
     detailed_description = models.TextField(blank=True)
@@ -73,6 +404,11 @@ class Product(models.Model):
     tax_type = models.CharField(max_length=20, choices=TAX_TYPES, default='free')
     vat_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0, help_text="VAT percentage (e.g., 18 for 18%)")
     
+    # Stored copies of get_discounted_price()/get_final_price_with_tax(), kept in sync by
+    # save() and the ProductQuerySet bulk updates, so listings can sort and filter on them
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    final_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False, db_index=True)
+    
     stock_quantity = models.IntegerField()
     low_stock_threshold = models.IntegerField(default=5, help_text="Alert when stock falls below this number")
     manage_stock = models.BooleanField(default=True)
@@ -80,7 +416,7 @@ class Product(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
     
     
-    image = models.ImageField(upload_to='products/', blank=True, null=True)
+    image = models.ImageField(upload_to='products/', storage=content_addressed_storage, blank=True, null=True)
     
     
     is_deleted = models.BooleanField(default=False)
@@ -96,10 +432,13 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Decayed sales, cart adds and views, maintained by the rollup_popularity command
+    popularity = models.FloatField(default=0, editable=False)
+    
   
-    objects = SoftDeleteManager() 
-    all_objects = AllObjectsManager()  
-    customer_visible = CustomerVisibleManager() 
+    objects = SoftDeleteManager.from_queryset(ProductQuerySet)()
+    all_objects = AllObjectsManager.from_queryset(ProductQuerySet)()
+    customer_visible = CustomerVisibleManager.from_queryset(ProductQuerySet)()
     
     class Meta:
         indexes = [
@@ -110,6 +449,8 @@ class Product(models.Model):
             models.Index(fields=['is_deleted']),
             models.Index(fields=['is_blocked']),  
             models.Index(fields=['is_blocked', 'status']),  
+            models.Index(fields=['status', 'effective_price']),
+            models.Index(fields=['status', '-popularity'], name='product_status_popularity'),
         ]
         ordering = ['-created_at']
     
@@ -133,7 +474,9 @@ class Product(models.Model):
     
     def hard_delete(self):
         """Permanently delete the product"""
-        super().delete()
+        with transaction.atomic():
+            super().delete()
+            apply_count_changes([(self.count_state(), None)])
     
     def block_product(self, blocked_by=None):
         """Block the product from customer view"""
@@ -166,7 +509,8 @@ class Product(models.Model):
         return (
             not self.is_deleted and 
             not self.is_blocked and 
-            self.status in ['published', 'out-of-stock', 'low-stock']
+            self.status in ['published', 'out-of-stock', 'low-stock'] and
+            self.category.is_visible
         )
     
     def is_available_for_purchase(self):
@@ -175,7 +519,8 @@ class Product(models.Model):
             not self.is_deleted and 
             not self.is_blocked and 
             self.status == 'published' and 
-            self.stock_quantity > 0
+            self.stock_quantity > 0 and
+            self.category.is_visible
         )
     
     def get_status_display_admin(self):
@@ -218,6 +563,14 @@ class Product(models.Model):
             return discounted_price + tax_amount
         return discounted_price
     
+    def apply_pricing(self):
+        """Refresh the stored effective_price and final_price from the pricing fields"""
+        if self.price is None:
+            return
+        cents = Decimal('0.01')
+        self.effective_price = Decimal(self.get_discounted_price()).quantize(cents, rounding=ROUND_HALF_UP)
+        self.final_price = Decimal(self.get_final_price_with_tax()).quantize(cents, rounding=ROUND_HALF_UP)
+    
     def get_discount_amount(self):
         """Get the discount amount"""
         return self.price - self.get_discounted_price()
@@ -226,11 +579,8 @@ class Product(models.Model):
         """Check if product is low on stock"""
         return self.stock_quantity <= self.low_stock_threshold
     
-    # NEW: Override save method for auto status updates
-    def save(self, *args, **kwargs):
-        """Override save to auto-update status based on stock quantity and other conditions"""
-        
-        # First, handle stock-based status changes
+    def apply_stock_status(self):
+        """Derive stock-based status (out-of-stock/low-stock/published) from stock_quantity"""
         if hasattr(self, 'stock_quantity') and self.stock_quantity is not None:
             # Don't change status if product is blocked or soft-deleted
             if not self.is_blocked and not self.is_deleted:
@@ -243,13 +593,62 @@ class Product(models.Model):
                         self.status = 'low-stock'
                 elif self.status in ['out-of-stock', 'low-stock'] and self.stock_quantity > self.low_stock_threshold:
                     self.status = 'published'
-        
-        super().save(*args, **kwargs)
+
+    def alert_state(self):
+        return alert_state(self.effective_price, self.stock_quantity, self.status, self.is_blocked, self.is_deleted)
+
+    def count_state(self):
+        return count_state(self.category_id, self.stock_quantity, self.status, self.is_blocked, self.is_deleted)
+
+    # NEW: Override save method for auto status updates
+    def save(self, *args, **kwargs):
+        """Override save to auto-update status based on stock quantity and other conditions"""
+        self.apply_stock_status()
+        self.apply_pricing()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and self.PRICING_FIELDS.intersection(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'effective_price', 'final_price'}
+        with transaction.atomic():
+            if not self._state.adding:
+                lock_states([self])
+            super().save(*args, **kwargs)
+            capture_alerts([self])
+            capture_counts([self])
+
+
+class ProductEvent(models.Model):
+    """
+    Outbox of price drops and restocks, written in the same transaction as the
+    product change and fanned out to shoppers by send_product_alerts
+    """
+    PRICE_DROP = 'price_drop'
+    BACK_IN_STOCK = 'back_in_stock'
+    KIND_CHOICES = [
+        (PRICE_DROP, 'Price drop'),
+        (BACK_IN_STOCK, 'Back in stock'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    old_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    new_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['id'], condition=Q(processed_at__isnull=True), name='product_event_pending'),
+            models.Index(fields=['processed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.product_id}"
 
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, related_name='images', on_delete=models.CASCADE)
-    image = models.ImageField(upload_to='products/')
+    image = models.ImageField(upload_to='products/', storage=content_addressed_storage)
     is_primary = models.BooleanField(default=False)
     order = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -258,8 +657,10 @@ class ProductImage(models.Model):
         ordering = ['order', 'created_at']
     
     def save(self, *args, **kwargs):
-        """Resize image before saving"""
-        if self.image:
+        """Resize newly uploaded images before saving"""
+        # Files already in storage were processed when first uploaded;
+        # re-encoding them would change their bytes and therefore their name.
+        if self.image and not self.image._committed:
             self.image = self.resize_image(self.image, 800, 600)
         super().save(*args, **kwargs)
     
@@ -287,8 +688,14 @@ class ProductImage(models.Model):
         return f"{self.product.name} - Image {self.order + 1}"
 
 
+# Storefront category facets are cached for this long; category edits clear them
+CATEGORY_FACETS_CACHE_KEY = 'category_facets'
+CATEGORY_FACETS_CACHE_SECONDS = 300
+
+
 class Category(models.Model):
     name = models.CharField(max_length=200, unique=True)
+    slug = models.SlugField(max_length=200, unique=True)
     description = models.TextField(blank=True)
     thumbnail = models.ImageField(upload_to='categories/', blank=True, null=True)
     is_listed = models.BooleanField(default=True)
@@ -300,6 +707,14 @@ class Category(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Denormalized product counts (see count_state), kept in step by product
+    # writes and corrected nightly by reconcile_category_counts
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    published_count = models.PositiveIntegerField(default=0, editable=False)
+    in_stock_count = models.PositiveIntegerField(default=0, editable=False)
+    
+    COUNTER_FIELDS = ('product_count', 'published_count', 'in_stock_count')
+    
     objects = SoftDeleteManager()  
     all_objects = AllObjectsManager()  
     
@@ -315,6 +730,35 @@ class Category(models.Model):
     def __str__(self):
         return self.name
     
+    def unique_slug(self):
+        """slugify(name), suffixed -2, -3, ... past slugs already taken, as migration 0010 assigned them"""
+        slug = base = slugify(self.name) or (f'category-{self.pk}' if self.pk else 'category')
+        taken = set(
+            Category.all_objects.exclude(pk=self.pk).filter(slug__startswith=base).values_list('slug', flat=True)
+        )
+        suffix = 2
+        while slug in taken:
+            slug = f'{base}-{suffix}'
+            suffix += 1
+        return slug
+    
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            self.slug = self.unique_slug()
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # The counters move with F() updates; never write back a stale copy
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+        cache.delete(CATEGORY_FACETS_CACHE_KEY)
+    
+    @property
+    def is_visible(self):
+        """Whether the category's products may be shown to customers"""
+        return self.is_listed and not self.is_deleted
+    
     def soft_delete(self, deleted_by=None):
         """Soft delete the category"""
         from django.utils import timezone
@@ -331,4 +775,53 @@ class Category(models.Model):
         self.save()
 
 
+def category_facets():
+    """
+    The storefront's category filter: every listed category as
+    {'id', 'slug', 'name', 'product_count'} counting its customer-visible
+    products, read from the category counters and cached for
+    CATEGORY_FACETS_CACHE_SECONDS
+    """
+    facets = cache.get(CATEGORY_FACETS_CACHE_KEY)
+    if facets is None:
+        facets = [
+            {'id': pk, 'slug': slug, 'name': name, 'product_count': count}
+            for pk, slug, name, count in Category.objects.filter(is_listed=True).order_by('name')
+            .values_list('pk', 'slug', 'name', 'published_count')
+        ]
+        cache.set(CATEGORY_FACETS_CACHE_KEY, facets, CATEGORY_FACETS_CACHE_SECONDS)
+    return facets
+
+
+def reconcile_category_counts():
+    """
+    Recount every category's products in one aggregate pass and overwrite the
+    counters that drifted; returns [(category, old counts, new counts)].
 
+    The categories are locked first, so product writes that commit while this
+    runs either land in the recount or apply their deltas after it.
+    """
+    active = Q(is_deleted=False, is_blocked=False)
+    with transaction.atomic():
+        categories = list(Category.all_objects.select_for_update().order_by('pk'))
+        actual = {
+            row['category_id']: row
+            for row in Product.all_objects.order_by().values('category_id').annotate(
+                product_count=Count('pk', filter=Q(is_deleted=False)),
+                published_count=Count('pk', filter=active & Q(status='published')),
+                in_stock_count=Count('pk', filter=active & Q(stock_quantity__gt=0)),
+            )
+        }
+        fixed = []
+        for category in categories:
+            old = tuple(getattr(category, field) for field in Category.COUNTER_FIELDS)
+            row = actual.get(category.pk, {})
+            new = tuple(row.get(field, 0) for field in Category.COUNTER_FIELDS)
+            if old != new:
+                for field, value in zip(Category.COUNTER_FIELDS, new):
+                    setattr(category, field, value)
+                fixed.append((category, old, new))
+        Category.all_objects.bulk_update([category for category, _, _ in fixed], Category.COUNTER_FIELDS, batch_size=500)
+    if fixed:
+        cache.delete(CATEGORY_FACETS_CACHE_KEY)
+    return fixed
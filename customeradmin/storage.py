@@ -0,0 +1,51 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that names every file after a hash of its bytes.
+
+    Identical uploads resolve to the same name, so they share one file on
+    disk instead of piling up as `name_AbC123x.jpg` duplicates. Files are
+    never removed when rows are deleted; the `gc_media` command sweeps
+    whatever is no longer referenced.
+    """
+
+    def __init__(self, **kwargs):
+        # The same name always means the same bytes, so an existing file
+        # can be reused (or rewritten by a concurrent upload) safely.
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def hashed_name(self, name, content):
+        """Return `<dir>/<sha256 of content><ext>` for the given upload name"""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+
+        dirname, basename = posixpath.split(name)
+        ext = os.path.splitext(basename)[1].lower()
+        return posixpath.join(dirname, f"{digest.hexdigest()}{ext}")
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Touch the reused file so gc_media treats it as a fresh upload
+            # until the row that references it is committed
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                pass
+        return super()._save(name, content)
+
+
+content_addressed_storage = ContentAddressedStorage()
@@ -1,3 +1,136 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .management.commands.gc_media import Command as GcMediaCommand
+from .models import Category, Product, ProductImage
+from .storage import content_addressed_storage
+
+
+class GcMediaTests(TestCase):
+    """gc_media never deletes a file that an upload reused or a row references"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, content=b'image bytes'):
+        return content_addressed_storage.save('products/photo.jpg', ContentFile(content))
+
+    def age(self, name, hours=48):
+        past = time.time() - hours * 3600
+        os.utime(content_addressed_storage.path(name), (past, past))
+
+    def gc(self):
+        call_command('gc_media', stdout=StringIO())
+
+    def test_deletes_old_orphan(self):
+        name = self.upload()
+        self.age(name)
+        self.gc()
+        self.assertFalse(content_addressed_storage.exists(name))
+
+    def test_reupload_of_orphan_refreshes_it(self):
+        name = self.upload()
+        self.age(name)
+        self.assertEqual(self.upload(), name)
+        self.gc()
+        self.assertTrue(content_addressed_storage.exists(name))
+
+    def test_rechecks_references_before_deleting(self):
+        name = self.upload()
+        self.age(name)
+        product = Product.objects.create(
+            name='Sofa', sku='SOFA-1', price=Decimal('100.00'), stock_quantity=1,
+            category=Category.objects.create(name='Sofa'),
+        )
+        ProductImage.objects.create(product=product, image=name)
+        # A snapshot taken before the row was committed
+        with mock.patch.object(GcMediaCommand, 'referenced_files', return_value=set()):
+            self.gc()
+        self.assertTrue(content_addressed_storage.exists(name))
+
+
+class ImportCatalogTests(TestCase):
+    """import_catalog only attaches products to categories that are not soft-deleted"""
+
+    def setUp(self):
+        Category.objects.create(name='Sofa', slug='sofa')
+        Category.objects.create(name='Lamp', slug='lamp').soft_delete()
+        handle, self.path = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def import_rows(self, *rows):
+        with open(self.path, 'w', encoding='utf-8') as stream:
+            stream.write('sku,name,category,price,stock_quantity\n')
+            stream.writelines(f"{','.join(row)}\n" for row in rows)
+        stderr = StringIO()
+        call_command('import_catalog', self.path, stdout=StringIO(), stderr=stderr)
+        return stderr.getvalue()
+
+    def test_rejects_rows_in_deleted_categories(self):
+        errors = self.import_rows(('SOFA-1', 'Sofa', 'sofa', '100.00', '5'), ('LAMP-1', 'Lamp', 'lamp', '40.00', '5'))
+        self.assertIn('line 3 [LAMP-1]: category:', errors)
+        self.assertEqual(list(Product.all_objects.values_list('sku', flat=True)), ['SOFA-1'])
+
+
+class BulkProductActionTests(TestCase):
+    """bulk_product_action rejects malformed requests with a 400 and applies valid ones"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser(
+            'admin@example.com', 'password', first_name='Admin', last_name='User', phone_number='9876543211',
+        )
+        category = Category.objects.create(name='Sofa')
+        cls.products = [
+            Product.objects.create(name=f'Sofa {index}', sku=f'SOFA-{index}', price=Decimal('100.00'),
+                                   stock_quantity=5, status='published', category=category)
+            for index in range(2)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def post_json(self, payload):
+        return self.client.post(reverse('bulk-product-action'), json.dumps(payload), content_type='application/json')
+
+    def test_rejects_payloads_that_are_not_objects(self):
+        for payload in ([], 'block', 1, None):
+            with self.subTest(payload=payload):
+                response = self.post_json(payload)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'success': False, 'error': 'Invalid request data'})
+
+    def test_rejects_ids_that_are_not_a_list_of_ints(self):
+        for ids in ('1,2', {'id': 1}, ['1'], [1.5], [True], [None]):
+            with self.subTest(ids=ids):
+                response = self.post_json({'action': 'block', 'ids': ids})
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Product.all_objects.filter(is_blocked=True).exists())
+
+    def test_blocks_products_from_json(self):
+        response = self.post_json({'action': 'block', 'ids': [product.pk for product in self.products]})
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual(Product.all_objects.filter(is_blocked=True).count(), 2)
+
+    def test_blocks_products_from_form(self):
+        response = self.client.post(reverse('bulk-product-action'), {'action': 'block', 'ids': [self.products[0].pk]})
+        self.assertEqual(response.json()['updated'], 1)
+        response = self.client.post(reverse('bulk-product-action'), {'action': 'block', 'ids': ['x']})
+        self.assertEqual(response.status_code, 400)
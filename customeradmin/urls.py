@@ -12,6 +12,7 @@ urlpatterns = [
     path('products/soft-delete/<int:product_id>/', views.soft_delete_product, name='soft-delete-product'),
     path('products/restore/<int:product_id>/', views.restore_product, name='restore-product'),
     path('products/deleted/', views.deleted_products_view, name='deleted-products'),
+    path('products/bulk-action/', views.bulk_product_action, name='bulk-product-action'),
     path('customers/', views.customer_view, name='customer-list'),
     path('logout/', views.custom_logout, name='admin_logout'),
     path('categories/', views.category_view, name='category-list'),
@@ -29,6 +30,7 @@ urlpatterns = [
 
 
     path("orders/", views.order_list, name="order-list"),
+    path("orders/bulk-status/", views.bulk_order_status, name="order-bulk-status"),
     path("orders/<int:order_id>/", views.order_detail, name="order-detail"),
     path("orders/<int:order_id>/status", views.order_update_status, name="order-update-status"),
     path("orders/<int:order_id>/cancel", views.order_cancel, name="order-cancel"),
@@ -1,5 +1,6 @@
-from PIL import Image
+from PIL import Image, ImageOps
 import io
+import os
 from django.core.files.uploadedfile import InMemoryUploadedFile
 import sys
 
@@ -7,7 +8,7 @@ import sys
 def process_image(uploaded_file, max_width=800, max_height=600, quality=85, crop=True):
     try:
         img = Image.open(uploaded_file)
-        
+        img = ImageOps.exif_transpose(img)
         
         if img.mode in ('RGBA', 'LA', 'P'):
             img = img.convert('RGB')
@@ -19,7 +20,6 @@ def process_image(uploaded_file, max_width=800, max_height=600, quality=85, crop
             
             img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
         
-        y
         output = io.BytesIO()
         img.save(output, format='JPEG', quality=quality, optimize=True)
         output.seek(0)
@@ -37,6 +37,42 @@ def process_image(uploaded_file, max_width=800, max_height=600, quality=85, crop
         return uploaded_file
 
 
+def process_avatar(uploaded_file, sizes, quality=85):
+    """
+    Build square JPEG variants of an uploaded avatar.
+
+    `sizes` maps a variant name to its edge length in pixels. EXIF orientation
+    is applied and all metadata is dropped on re-encode; small sources are
+    never upscaled.
+    """
+    img = Image.open(uploaded_file)
+    # Let the JPEG decoder downscale large phone photos while reading them
+    largest = max(sizes.values())
+    img.draft('RGB', (largest, largest))
+    img = ImageOps.exif_transpose(img)
+
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    base_name = os.path.splitext(os.path.basename(uploaded_file.name))[0]
+    source_edge = min(img.size)
+
+    variants = {}
+    for key, size in sizes.items():
+        edge = min(size, source_edge)
+        variant = smart_crop_resize(img, target_width=edge, target_height=edge)
+
+        output = io.BytesIO()
+        variant.save(output, format='JPEG', quality=quality, optimize=True)
+        output.seek(0)
+
+        variants[key] = InMemoryUploadedFile(
+            output, 'ImageField', f"{base_name}_{size}.jpg", 'image/jpeg',
+            output.getbuffer().nbytes, None
+        )
+    return variants
+
+
 def smart_crop_resize(img, target_width, target_height):
     original_width, original_height = img.size
     target_ratio = target_width / target_height
@@ -6,11 +6,14 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.cache import cache_control
 from django.core.paginator import Paginator
-from django.db.models import Q, Max, Sum
+from django.db.models import Q, Max, Sum, Count
 from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.contrib.sessions.models import Session
+import json
 import logging
+from datetime import datetime, time, timedelta
 
 from .forms import CustomAuthenticationForm, ProductForm, ProductImageFormSet, OrderStatusForm
 from .models import Product, ProductImage, Category
@@ -62,8 +65,10 @@ def admin_dashboard(request):
         return redirect('/')
 
    
-    total_products = Product.objects.count()
-    published_products = Product.objects.filter(status='published').count()
+    # Per-category counters summed in one query instead of counting the product table
+    product_totals = Category.all_objects.aggregate(total=Sum('product_count'), published=Sum('published_count'))
+    total_products = product_totals['total'] or 0
+    published_products = product_totals['published'] or 0
     low_stock_products = Product.objects.filter(status='low-stock').count()
     draft_products = Product.objects.filter(status='draft').count()
     
@@ -71,9 +76,13 @@ def admin_dashboard(request):
     
     today = timezone.now().date()
     
-    today_orders = Order.objects.filter(created_at__date=today)
-    today_sales = today_orders.aggregate(total=Sum('total_amount'))['total'] or 0
-    today_orders_count = today_orders.count()
+    # Stored order totals, summed and counted in one query over today's range
+    start_of_day = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    today_totals = Order.objects.filter(created_at__gte=start_of_day).aggregate(
+        total=Sum('total_amount'), count=Count('id')
+    )
+    today_sales = today_totals['total'] or 0
+    today_orders_count = today_totals['count']
     
     total_revenue = Order.objects.aggregate(total=Sum('total_amount'))['total'] or 0
     
@@ -120,7 +129,7 @@ def product_view(request):
         messages.error(request, "You do not have permission to view this page.")
         return redirect('/')
     
-    products = Product.objects.all().order_by('-created_at')
+    products = Product.objects.select_related('category').order_by('-created_at')
     
    
     search_query = request.GET.get('search', '').strip()
@@ -129,7 +138,7 @@ def product_view(request):
             Q(name__icontains=search_query) |
             Q(sku__icontains=search_query) |
             Q(brand__icontains=search_query) |
-            Q(category__icontains=search_query)
+            Q(category__name__icontains=search_query)
         )
     
     
@@ -423,6 +432,67 @@ def restore_product(request, product_id):
     
     return redirect('product-list')
 
+@login_required
+@require_POST
+def bulk_product_action(request):
+    """Apply one action to many products with a single UPDATE statement"""
+    if not request.user.is_superuser:
+        return JsonResponse({'success': False, 'error': 'Permission denied'})
+    
+    invalid = JsonResponse({'success': False, 'error': 'Invalid request data'}, status=400)
+    try:
+        if request.content_type == 'application/json':
+            payload = json.loads(request.body or b'{}')
+            if not isinstance(payload, dict):
+                return invalid
+            ids = payload.get('ids') or []
+            # JSON ids must be integers already; bools are ints to Python but not ids
+            if not isinstance(ids, list) or not all(
+                isinstance(product_id, int) and not isinstance(product_id, bool) for product_id in ids
+            ):
+                return invalid
+        else:
+            payload = request.POST
+            ids = [int(product_id) for product_id in request.POST.getlist('ids')]
+    except (ValueError, TypeError):
+        return invalid
+    
+    action = payload.get('action')
+    if not ids:
+        return JsonResponse({'success': False, 'error': 'No products selected'})
+    
+    actor = request.user.email if hasattr(request.user, 'email') else request.user.username
+    products = Product.all_objects.filter(id__in=ids)
+    
+    try:
+        if action == 'block':
+            updated = products.block(blocked_by=actor)
+        elif action == 'unblock':
+            updated = products.unblock()
+        elif action == 'soft_delete':
+            updated = products.filter(is_deleted=False).soft_delete(deleted_by=actor)
+        elif action == 'restore':
+            updated = products.filter(is_deleted=True).restore()
+        elif action == 'set_status':
+            updated = products.filter(is_blocked=False).set_status(payload.get('status'))
+        elif action == 'set_price':
+            updated = products.set_price(payload.get('price'))
+        elif action == 'adjust_price':
+            updated = products.adjust_price(payload.get('percent'))
+        else:
+            return JsonResponse({'success': False, 'error': 'Unknown action'})
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+    except Exception as e:
+        logger.error(f"Error in bulk product action '{action}': {str(e)}")
+        return JsonResponse({'success': False, 'error': str(e)})
+    
+    return JsonResponse({
+        'success': True,
+        'updated': updated,
+        'message': f"{updated} products updated"
+    })
+
 @login_required
 def deleted_products_view(request):
     """View to show all soft-deleted products"""
@@ -430,7 +500,7 @@ def deleted_products_view(request):
         messages.error(request, "You do not have permission to view this page.")
         return redirect('/')
     
-    deleted_products = Product.all_objects.filter(is_deleted=True).order_by('-deleted_at')
+    deleted_products = Product.all_objects.filter(is_deleted=True).select_related('category').order_by('-deleted_at')
     
     paginator = Paginator(deleted_products, 20)
     page_number = request.GET.get('page')
@@ -757,6 +827,14 @@ def unblock_user(request, user_id):
         return JsonResponse({'success': False, 'error': str(e)})
     
 
+def _parse_day(value):
+    """Parse a YYYY-MM-DD filter value, returning None for anything invalid"""
+    try:
+        return parse_date(value) if value else None
+    except ValueError:
+        return None
+
+
 @login_required
 @cache_control(no_cache=True, must_revalidate=True, no_store=True) 
 def order_list(request):
@@ -765,17 +843,22 @@ def order_list(request):
         return redirect("admindashboard")
 
     # Base queryset
-    orders = Order.objects.all().order_by("-created_at")
-
-    # Search by order number or user fields
+    orders = (
+        Order.objects.select_related("user")
+        .annotate(item_count=Count("items"))
+        .order_by("-created_at")
+    )
+
+    # Search by order number or user fields. Matching users are resolved in a
+    # subquery so each side can use its own trigram index instead of a join.
     search = (request.GET.get("search") or "").strip()
     if search:
-        orders = orders.filter(
-            Q(order_number__icontains=search)
-            | Q(user__email__icontains=search)
-            | Q(user__first_name__icontains=search)
-            | Q(user__last_name__icontains=search)
-        )
+        matching_users = User.objects.filter(
+            Q(email__icontains=search)
+            | Q(first_name__icontains=search)
+            | Q(last_name__icontains=search)
+        ).values("pk")
+        orders = orders.filter(Q(order_number__icontains=search) | Q(user__in=matching_users))
 
 
     # Status filter
@@ -786,10 +869,13 @@ def order_list(request):
     # Date range filters
     date_from = request.GET.get("from") or ""
     date_to = request.GET.get("to") or ""
-    if date_from:
-        orders = orders.filter(created_at__date__gte=date_from)
-    if date_to:
-        orders = orders.filter(created_at__date__lte=date_to)
+    # Compare created_at against day boundaries rather than casting it with __date
+    start = _parse_day(date_from)
+    end = _parse_day(date_to)
+    if start:
+        orders = orders.filter(created_at__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    if end:
+        orders = orders.filter(created_at__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)))
 
     # Sorting
     sort = (request.GET.get("sort") or "").strip()
@@ -811,31 +897,16 @@ def order_list(request):
     page_number = request.GET.get("page")
     page_obj = paginator.get_page(page_number)
 
-    # Build a non-empty choices tuple for the list dropdown
-    if hasattr(Order, "Status") and getattr(Order.Status, "choices", None):
-        status_tuple = Order.Status.choices
-    elif hasattr(Order, "ORDERSTATUSCHOICES") and Order.ORDERSTATUSCHOICES:
-        status_tuple = Order.ORDERSTATUSCHOICES
-    else:
-        status_tuple = (
-            ("pending", "Pending"),
-            ("paid", "Paid"),
-            ("shipped", "Shipped"),
-            ("out-for-delivery", "Out for Delivery"),
-            ("delivered", "Delivered"),
-            ("cancelled", "Cancelled"),
-        )
-
     context = {
         "orders": page_obj.object_list,
         "pageobj": page_obj,
         "searchquery": search,
         "currentstatus": status_filter,
-        "statuschoices": status_tuple,
+        "statuschoices": Order.ORDER_STATUS_CHOICES,
         "sort": sort or "datedesc",
         "datefrom": date_from,
         "dateto": date_to,
-        "totalorders": orders.count(),
+        "totalorders": paginator.count,
     }
     return render(request, "orders/order_list.html", context)
 
@@ -856,7 +927,49 @@ def order_detail(request, order_id: int):
 
 @login_required
 @require_POST
-@transaction.atomic
+def bulk_order_status(request):
+    """Move many orders to one status through the order state machine in one transaction"""
+    if not request.user.is_superuser:
+        return JsonResponse({'success': False, 'error': 'Permission denied'})
+
+    try:
+        if request.content_type == 'application/json':
+            payload = json.loads(request.body or b'{}')
+            ids = payload.get('ids') or []
+        else:
+            payload = request.POST
+            ids = request.POST.getlist('ids')
+        ids = [int(order_id) for order_id in ids]
+    except (ValueError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Invalid request data'})
+
+    if not ids:
+        return JsonResponse({'success': False, 'error': 'No orders selected'})
+
+    status = payload.get('status')
+    try:
+        moved, failures = Order.objects.filter(id__in=ids).transition(
+            status, changed_by=request.user.get_username(), notes=payload.get('notes') or None
+        )
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+    except Exception as e:
+        logger.error(f"Error in bulk order status update to '{status}': {str(e)}")
+        return JsonResponse({'success': False, 'error': str(e)})
+
+    for order_id in set(ids) - set(moved) - set(failures):
+        failures[order_id] = "Order not found."
+
+    return JsonResponse({
+        'success': True,
+        'updated': len(moved),
+        'failed': [{'id': order_id, 'error': reason} for order_id, reason in sorted(failures.items())],
+        'message': f"{len(moved)} orders moved to {dict(Order.ORDER_STATUS_CHOICES)[status]}",
+    })
+
+
+@login_required
+@require_POST
 @cache_control(no_cache=True, must_revalidate=True, no_store=True) 
 def order_update_status(request, order_id: int):
     if not request.user.is_superuser:
@@ -869,70 +982,32 @@ def order_update_status(request, order_id: int):
         messages.error(request, "; ".join([str(v[0]) for v in form.errors.values()]))
         return redirect("order-detail", order_id=order.id)
 
-    new_status = form.cleaned_data.get("status")
-    if not new_status:
-        messages.error(request, "Status is required.")
-        return redirect("order-detail", order_id=order.id)
-
-    old_status = order.status
+    # Tracking details let carrier updates find this order later
+    tracking = {
+        field: form.cleaned_data[field].strip()
+        for field in ("tracking_number", "shipping_carrier")
+        if form.cleaned_data.get(field)
+    }
+    if tracking:
+        Order.objects.filter(pk=order.pk).update(**tracking)
 
-    def deduct_for_paid():
-        for item in order.items.select_related("product").all():
-            product = item.product
-            if not getattr(product, "manage_stock", True):
-                continue
-            # Only deduct once: if order is moving from PENDING to PAID
-            if product.stock_quantity < item.quantity:
-                raise ValueError(f"Insufficient stock for {product.name} (SKU {product.sku}).")
-            product.stock_quantity -= item.quantity
-            product.save()  # Product.save updates published/low-stock/out-of-stock
-
-    def restock_for_cancel():
-        for item in order.items.select_related("product").all():
-            product = item.product
-            if not getattr(product, "manage_stock", True):
-                continue
-            remaining = item.remaining_qty  # quantity - delivered - cancelled
-            if remaining > 0:
-                product.stock_quantity += remaining
-                item.cancelled_qty += remaining
-                product.save()
-                item.save(update_fields=["cancelled_qty", "updated_at"])
-
-    def mark_shipped_full():
-        for item in order.items.all():
-            # If partial shipments are planned, replace with item-level qty UI and mark_shipped(qty)
-            if item.remaining_qty > 0:
-                item.mark_shipped_full()
-
-    def mark_delivered_full():
-        for item in order.items.all():
-            if item.remaining_qty > 0:
-                item.mark_delivered_full()
+    new_status = form.cleaned_data["status"]
+    if new_status == order.status:
+        if tracking:
+            messages.success(request, f"Tracking details saved for order {order.order_number}.")
+        return redirect("order-list")
 
     try:
-        # Stock effects
-        if old_status == "pending" and new_status == "paid":
-            deduct_for_paid()
-
-        if new_status == "cancelled":
-            restock_for_cancel()
-
-        # Persist order status and timestamp
-        print(order.status)
-        order.status =new_status
-        order.updated_at = timezone.now() 
-        order.save()
-    except Exception as e:
-        print(e)
-        transaction.set_rollback(True)
+        # Stock effects, timestamps and the history row are applied by the state machine
+        order.transition_to(new_status, changed_by=request.user.get_username())
+        messages.success(request, f"Order {order.order_number} moved to {order.get_status_display()}.")
+    except ValueError as e:
         messages.error(request, f"Error updating order: {e}")
     return redirect("order-list")
 
 
 @login_required
 @require_POST
-@transaction.atomic
 @cache_control(no_cache=True, must_revalidate=True, no_store=True) 
 def order_cancel(request, order_id: int):
     if not request.user.is_superuser:
@@ -940,28 +1015,9 @@ def order_cancel(request, order_id: int):
         return redirect("order-list")
 
     order = get_object_or_404(Order, id=order_id)
-    if not order.can_be_cancelled():
-        messages.error(request, "Order cannot be cancelled in its current status.")
-        return redirect("order-detail", order_id=order.id)
-
     try:
-        # Restock only the remaining, not yet delivered or previously cancelled
-        for item in order.items.select_related("product").all():
-            product = item.product
-            if not getattr(product, "manage_stock", True):
-                continue
-            remaining = item.remaining_qty
-            if remaining > 0:
-                product.stock_quantity += remaining
-                item.cancelled_qty += remaining
-                product.save()
-                item.save(update_fields=["cancelled_qty", "updated_at"])
-
-        order.set_status("cancelled")
-        order.save()
-        messages.success(request, f"Order {order.order_id} has been cancelled and stock restored.")
-    except Exception as e:
-        transaction.set_rollback(True)
-        messages.error(request, f"Order {order.order_id} could not be cancelled: {e}")
+        order.transition_to("cancelled", changed_by=request.user.get_username(), notes="Cancelled by staff")
+        messages.success(request, f"Order {order.order_number} has been cancelled and stock restored.")
+    except ValueError as e:
+        messages.error(request, f"Order {order.order_number} could not be cancelled: {e}")
     return redirect("order-detail", order_id=order.id)
-
@@ -200,6 +200,9 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 
 LOGOUT_REDIRECT_URL = 'home'
 
+# Shared secret carriers send in the X-Carrier-Token header; the webhook is disabled when empty
+CARRIER_WEBHOOK_TOKEN = config('CARRIER_WEBHOOK_TOKEN', default='')
+
 CSRF_TRUSTED_ORIGINS = [
     "http://127.0.0.1:8000",
     "http://localhost:8000",